@@ -0,0 +1,58 @@
+"""Per-grain feature tables, compared with the regionprops loop they
+replaced in `GrainPlots`."""
+import numpy as np
+from skimage import measure
+
+from napari_defdap._features import (
+        grain_table_timepoint, shear_statistics_timepoint,
+        )
+
+from .common import grain_map, shear_map
+
+
+class GrainTable:
+    params = ([512, 2048], [100, 2000])
+    param_names = ['size', 'n_grains']
+
+    def setup(self, size, n_grains):
+        self.grains = grain_map((size, size), n_grains).clip(0, None)
+        self.shear = shear_map(self.grains)
+
+    def time_grain_table_timepoint(self, size, n_grains):
+        grain_table_timepoint(self.grains, self.shear)
+
+    def peakmem_grain_table_timepoint(self, size, n_grains):
+        grain_table_timepoint(self.grains, self.shear)
+
+    def time_regionprops(self, size, n_grains):
+        props = measure.regionprops(self.grains, self.shear)
+        for prop in props:
+            prop.bbox, prop.centroid, prop.intensity_mean
+
+    def peakmem_regionprops(self, size, n_grains):
+        props = measure.regionprops(self.grains, self.shear)
+        for prop in props:
+            prop.bbox, prop.centroid, prop.intensity_mean
+
+
+class ShearStatistics:
+    params = ([512, 2048], [100, 2000])
+    param_names = ['size', 'n_grains']
+
+    def setup(self, size, n_grains):
+        self.grains = grain_map((size, size), n_grains).clip(0, None)
+        self.shear = shear_map(self.grains)
+
+    def time_shear_statistics_timepoint(self, size, n_grains):
+        shear_statistics_timepoint(self.grains, self.shear,
+                                   thresholds=(0.02,))
+
+    def peakmem_shear_statistics_timepoint(self, size, n_grains):
+        shear_statistics_timepoint(self.grains, self.shear,
+                                   thresholds=(0.02,))
+
+    def time_regionprops(self, size, n_grains):
+        props = measure.regionprops(self.grains, self.shear)
+        for prop in props:
+            values = prop.image_intensity[prop.image]
+            np.percentile(values, (50, 90, 99)), np.mean(values > 0.02)
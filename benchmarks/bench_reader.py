@@ -0,0 +1,102 @@
+"""Post-processing of the timepoints read by `read_defdap`.
+
+Reading the raw DefDAP files needs real data, so these benchmarks start
+from synthetic grain and shear maps, and time the relabelling, stacking
+and grain table steps that `read_defdap` applies to each timepoint.
+"""
+import tempfile
+import types
+
+import numpy as np
+
+from napari_defdap._quantiles import HistogramQuantiles, contrast_limits
+from napari_defdap._reader import (
+        _add_non_indexed, _contrast_limits, _relabel_non_indexed,
+        _stack_timepoints,
+        )
+
+from .common import drifting_stack, grain_map
+
+
+class RelabelNonIndexed:
+    params = ([512, 2048], [100, 2000])
+    param_names = ['size', 'n_grains']
+
+    def setup(self, size, n_grains):
+        self.grains = grain_map((size, size), n_grains)
+
+    def time_relabel_non_indexed(self, size, n_grains):
+        _relabel_non_indexed(self.grains, min_size=10)
+
+    def peakmem_relabel_non_indexed(self, size, n_grains):
+        _relabel_non_indexed(self.grains, min_size=10)
+
+
+class AddNonIndexed:
+    params = ([1, 4, 16],)
+    param_names = ['n_timepoints']
+
+    def setup(self, n_timepoints):
+        self.grains, _ = drifting_stack((1024, 1024), 500, n_timepoints)
+
+    def time_add_non_indexed(self, n_timepoints):
+        _add_non_indexed(self.grains, min_size=10)
+
+    def peakmem_add_non_indexed(self, n_timepoints):
+        _add_non_indexed(self.grains, min_size=10)
+
+
+class StackTimepoints:
+    """The eager loop at the end of `read_defdap`."""
+    params = ([1, 4, 16], ['memory', 'memmap'])
+    param_names = ['n_timepoints', 'storage']
+
+    def setup(self, n_timepoints, storage):
+        grains, shear = drifting_stack((1024, 1024), 500, n_timepoints)
+        # the maps are only passed through, so placeholders will do
+        dicmap, ebsdmap = types.SimpleNamespace(), types.SimpleNamespace()
+        self.results = [(dicmap, ebsdmap, g, m, (g > 0).astype(np.uint8))
+                        for g, m in zip(grains, shear)]
+        self.directory = tempfile.gettempdir() if storage == 'memmap' else None
+
+    def _stack(self):
+        outputs = _stack_timepoints(
+                self.results, len(self.results), 10,
+                memmap_dir=self.directory,
+                )
+        _contrast_limits(outputs[-1])
+        return outputs
+
+    def time_stack_timepoints(self, n_timepoints, storage):
+        self._stack()
+
+    def peakmem_stack_timepoints(self, n_timepoints, storage):
+        self._stack()
+
+
+class ContrastLimits:
+    """Exact percentiles of the stack against streamed histograms."""
+    params = ([4, 16],)
+    param_names = ['n_timepoints']
+
+    def setup(self, n_timepoints):
+        _, shear = drifting_stack((1024, 1024), 500, n_timepoints)
+        self.shear = shear
+
+    def time_quantile(self, n_timepoints):
+        np.quantile(self.shear, [0.01, 0.99])
+
+    def peakmem_quantile(self, n_timepoints):
+        np.quantile(self.shear, [0.01, 0.99])
+
+    def time_histogram(self, n_timepoints):
+        histogram = HistogramQuantiles()
+        for frame in self.shear:
+            histogram.merge(HistogramQuantiles().update(frame))
+        contrast_limits(histogram)
+
+    def peakmem_histogram(self, n_timepoints):
+        histogram = HistogramQuantiles()
+        for frame in self.shear:
+            histogram.merge(HistogramQuantiles().update(frame))
+        contrast_limits(histogram)
@@ -0,0 +1,51 @@
+"""Slip band angle detection on a single grain and on a whole frame."""
+from napari_defdap._features import GrainCrop, grain_table_timepoint
+from napari_defdap._slips import compute_radon, radon_timepoint, sb_angle
+
+from .common import grain_map, shear_map
+
+
+class ComputeRadon:
+    params = ([32, 128, 256], ['skimage', 'projection'])
+    param_names = ['grain_size', 'engine']
+
+    def setup(self, grain_size, engine):
+        # about 4 grains along each axis, so that grains are ~grain_size wide
+        size = 4 * grain_size
+        grains = grain_map((size, size), 16, non_indexed=0).clip(0, None)
+        shear = shear_map(grains)
+        table = grain_table_timepoint(grains)
+        row = table.iloc[table['area'].argmax()]
+        bbox = row[['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']]
+        self.crop = GrainCrop.from_arrays(grains, shear, row['label'], bbox)
+
+    def time_compute_radon(self, grain_size, engine):
+        compute_radon(self.crop, engine=engine)
+
+    def peakmem_compute_radon(self, grain_size, engine):
+        compute_radon(self.crop, engine=engine)
+
+    def time_sb_angle(self, grain_size, engine):
+        sb_angle(self.crop.intensity_image, threshold=0.02,
+                 median_filter=3, engine=engine)
+
+
+class RadonTimepoint:
+    params = ([256, 1024], ['per_grain', 'timepoint'])
+    param_names = ['size', 'method']
+
+    def setup(self, size, method):
+        self.grains = grain_map((size, size), size // 8,
+                                non_indexed=0).clip(0, None)
+        self.shear = shear_map(self.grains)
+        self.table = grain_table_timepoint(self.grains)
+
+    def time_radon_all_grains(self, size, method):
+        if method == 'timepoint':
+            radon_timepoint(self.grains, self.shear, self.table,
+                            engine='projection')
+            return
+        bbox = self.table[['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']]
+        for lab, box in zip(self.table['label'], bbox.to_numpy()):
+            crop = GrainCrop.from_arrays(self.grains, self.shear, lab, box)
+            compute_radon(crop, engine='projection')
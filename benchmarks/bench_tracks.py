@@ -0,0 +1,22 @@
+"""Grain centroids and tracking over time."""
+from napari_defdap._tracks import points_from_seg, tracks_from_seg
+
+from .common import drifting_stack
+
+
+class Tracks:
+    params = ([4, 16], [200, 2000], ['trackpy', 'overlap'])
+    param_names = ['n_timepoints', 'n_grains', 'linker']
+
+    def setup(self, n_timepoints, n_grains, linker):
+        grains, _ = drifting_stack((1024, 1024), n_grains, n_timepoints)
+        self.grains = grains.clip(0, None)
+
+    def time_points_from_seg(self, n_timepoints, n_grains, linker):
+        points_from_seg(self.grains)
+
+    def time_tracks_from_seg(self, n_timepoints, n_grains, linker):
+        tracks_from_seg(self.grains, linker=linker)
+
+    def peakmem_tracks_from_seg(self, n_timepoints, n_grains, linker):
+        tracks_from_seg(self.grains, linker=linker)
@@ -0,0 +1,61 @@
+"""Synthetic DIC/EBSD-like data for the benchmarks.
+
+Grains are Voronoi cells of random seeds, with a sprinkling of small
+non-indexed (<= 0) regions as in DefDAP grain maps, and the shear map has
+parallel slip bands at a random angle in each grain on top of lognormal
+noise.
+"""
+import numpy as np
+from scipy import ndimage as ndi
+
+
+def voronoi_grains(shape, n_grains, seed=0):
+    """Label each pixel with its nearest of ``n_grains`` random seeds."""
+    rng = np.random.default_rng(seed)
+    markers = np.zeros(shape, dtype=np.int32)
+    coords = tuple(rng.integers(0, s, size=n_grains) for s in shape)
+    markers[coords] = np.arange(1, n_grains + 1)
+    _, indices = ndi.distance_transform_edt(
+            markers == 0, return_indices=True
+            )
+    return markers[tuple(indices)]
+
+
+def grain_map(shape, n_grains, non_indexed=0.02, seed=0):
+    """Voronoi grains with non-indexed regions labelled -1."""
+    rng = np.random.default_rng(seed)
+    grains = voronoi_grains(shape, n_grains, seed=seed)
+    holes = ndi.binary_dilation(rng.random(shape) < non_indexed / 9)
+    grains[holes] = -1
+    return grains
+
+
+def shear_map(grains, period=8, seed=0):
+    """Lognormal noise plus slip bands at a random angle in each grain."""
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(0, np.pi, size=int(grains.max()) + 1)
+    theta = angles[np.clip(grains, 0, None)]
+    y, x = np.indices(grains.shape, dtype=np.float32)
+    s = x * np.cos(theta) - y * np.sin(theta)
+    bands = np.sin(2 * np.pi * s / period) > 0.8
+    noise = rng.lognormal(-5, 0.5, size=grains.shape)
+    return (noise + 0.05 * bands).astype(np.float32)
+
+
+def drifting_stack(shape, n_grains, n_timepoints, seed=0):
+    """Grains and shear over time, drifting one pixel per timepoint.
+
+    Labels are shuffled at every timepoint, as they are when each
+    timepoint's EBSD map is segmented independently.
+    """
+    rng = np.random.default_rng(seed)
+    big = (shape[0] + n_timepoints, shape[1])
+    grains0 = grain_map(big, n_grains, seed=seed)
+    shear0 = shear_map(grains0, seed=seed)
+    grains, shear = [], []
+    for t in range(n_timepoints):
+        crop = slice(t, t + shape[0])
+        perm = np.concatenate([[-1, 0], rng.permutation(n_grains) + 1])
+        grains.append(perm[grains0[crop] + 1])
+        shear.append(shear0[crop])
+    return np.stack(grains), np.stack(shear)
@@ -1,6 +1,5 @@
 import napari
-import pandas as pd
-from napari_defdap._tracks import tracks_from_seg
+from napari_defdap._tracks import tracks_with_shear
 
 viewer = napari.Viewer()
 shear_layer, grains_layer, phase_layer = viewer.open(
@@ -23,11 +22,10 @@ eg = g.ebsd_grain
 
 seg = grains_layer.data
 
-tracks = tracks_from_seg(seg, time_axis=0)
-tracks_data = pd.DataFrame(
-    tracks,
-    columns=['track_id', 't', 'y', 'x'],
-)
+# per-grain shear statistics at each timepoint, joined to the tracks
+tracks, tracks_data = tracks_with_shear(
+        seg, shear_layer.data, time_axis=0, thresholds=(0.02,)
+        )
 
 pts_layer = viewer.add_points(tracks[:, 1:], size=3, scale=grains_layer.scale)
 trk_layer = viewer.add_tracks(
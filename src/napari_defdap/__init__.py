@@ -4,12 +4,30 @@ try:
 except ImportError:
     __version__ = "unknown"
 
-from ._reader import napari_get_reader
-from ._sample_data import make_sample_data
-from ._widget import GrainPlots
+from ._get_reader import napari_get_reader
 
 __all__ = (
     "napari_get_reader",
     "make_sample_data",
     "GrainPlots",
 )
+
+# imported on first access, so that importing the package (as napari does
+# to find the readers) doesn't import DefDAP, Qt or matplotlib
+_LAZY_ATTRIBUTES = {
+    "make_sample_data": "._sample_data",
+    "GrainPlots": "._widget",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,233 @@
+"""On-disk cache of processed timepoints.
+
+Processing a timepoint (parsing the DIC and EBSD files, finding grains,
+computing Schmid factors and warping the EBSD map to the DIC frame) is by
+far the slowest part of opening a project. Its output only depends on the
+contents of the data files and on the ``dic`` and ``ebsd`` parameter blocks,
+so we store it on disk under a hash of those inputs.
+
+The entries are pickles of the DefDAP maps, and loading a pickle can run
+arbitrary code, so the cache is off unless enabled, and it only ever
+lives in a directory chosen by the user. It is enabled with the ``cache``
+key of the YAML file, which can be ``false`` (default), ``true``,
+``refresh`` (recompute and overwrite entries), or a mapping with optional
+``max_size`` and ``mode`` keys, or with the ``NAPARI_DEFDAP_CACHE``
+environment variable, which overrides it. The cache directory is
+`default_cache_dir`, or the ``NAPARI_DEFDAP_CACHE_DIR`` environment
+variable; a project file cannot choose it. The directory is created
+private to the user, and the cache is disabled, with a warning, if the
+directory can be written by other users. ``NAPARI_DEFDAP_CACHE_SIZE``
+overrides ``max_size``.
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle
+import stat
+import tempfile
+import warnings
+from importlib.metadata import version
+
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE = 5 * 2**30  # 5GiB
+_SUFFIX = '.defdap-cache.pkl'
+_UNITS = {'': 1, 'k': 2**10, 'm': 2**20, 'g': 2**30, 't': 2**40}
+
+
+def default_cache_dir():
+    """Return the per-user cache directory for napari-defdap."""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        home_cache = os.path.join(os.path.expanduser('~'), '.cache')
+        base = os.environ.get('XDG_CACHE_HOME', home_cache)
+    return os.path.join(base, 'napari-defdap')
+
+
+def _parse_size(size):
+    """Parse a size in bytes, optionally with a suffix, such as '500M'."""
+    if isinstance(size, (int, float)):
+        return int(size)
+    size = size.strip().lower().removesuffix('b').removesuffix('i')
+    unit = size[-1] if size and size[-1] in _UNITS else ''
+    return int(float(size.removesuffix(unit)) * _UNITS[unit])
+
+
+def _hash_file(hasher, filename, blocksize=2**20):
+    with open(filename, 'rb') as fin:
+        while block := fin.read(blocksize):
+            hasher.update(block)
+
+
+class TimepointCache:
+    """A directory of pickled `read_timepoint` results.
+
+    Parameters
+    ----------
+    path : str
+        The cache directory. It is created if it doesn't exist.
+    max_size : int
+        The maximum total size of the cache, in bytes. When it is exceeded,
+        the least recently used entries are deleted.
+    refresh : bool
+        If True, never load entries from the cache, but still save them.
+    """
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, refresh=False):
+        self.path = os.fspath(path)
+        self.max_size = max_size
+        self.refresh = refresh
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.path, name) for name in names
+                if name.endswith(_SUFFIX)]
+
+    def key(self, data, directory):
+        """Hash the files and parameters of a timepoint into a cache key."""
+        hasher = hashlib.sha256()
+        params = {'version': CACHE_VERSION, 'defdap': version('defdap'),
+                  'dic': data['dic'], 'ebsd': data['ebsd']}
+        hasher.update(json.dumps(params, sort_keys=True, default=str).encode())
+        _hash_file(hasher, os.path.join(directory, data['dic']['file']))
+        ebsd_fn = os.path.join(directory, data['ebsd']['file'])
+        for filename in sorted(glob.glob(glob.escape(ebsd_fn) + '.*')):
+            hasher.update(os.path.splitext(filename)[1].encode())
+            _hash_file(hasher, filename)
+        return hasher.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def load(self, key):
+        """Return the cached result for ``key``, or None if there is none.
+
+        Entries that can't be loaded, for example because they are corrupt,
+        or were saved by an incompatible version of DefDAP, are deleted and
+        treated as missing.
+        """
+        if self.refresh:
+            return None
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as fin:
+                result = pickle.load(fin)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self.invalidate(key)
+            return None
+        # mark the entry as recently used for eviction
+        os.utime(filename)
+        return result
+
+    def save(self, key, result):
+        """Store ``result`` under ``key``, atomically."""
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                pickle.dump(result, fout, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._filename(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def invalidate(self, key):
+        """Remove the entry for ``key``, if present."""
+        try:
+            os.remove(self._filename(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits."""
+        entries = []
+        for filename in self._entries():
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        total = sum(size for _, size, _ in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Delete all entries in the cache."""
+        for filename in self._entries():
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+
+def _is_private(path):
+    """Whether only the current user can write to ``path``, if it exists."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return True
+    if os.name == 'nt':
+        return True
+    return (st.st_uid == os.getuid()
+            and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+
+
+def cache_from_config(data):
+    """Build a `TimepointCache` from the project settings, or return None.
+
+    Parameters
+    ----------
+    data : dict
+        The parsed YAML project file.
+
+    Returns
+    -------
+    cache : TimepointCache or None
+        The cache, or None if caching is disabled.
+    """
+    config = data.get('cache', False)
+    if not isinstance(config, dict):
+        config = {'mode': config}
+    if 'dir' in config:
+        warnings.warn(
+                'The cache directory can not be set in the project file; '
+                'ignoring it. Use the NAPARI_DEFDAP_CACHE_DIR environment '
+                'variable instead.'
+                )
+    mode = os.environ.get('NAPARI_DEFDAP_CACHE', config.get('mode', False))
+    if isinstance(mode, str):
+        mode = mode.lower()
+        if mode != 'refresh':
+            mode = mode in ('1', 'true', 'yes', 'on')
+    if not mode:
+        return None
+    path = os.path.expanduser(
+            os.environ.get('NAPARI_DEFDAP_CACHE_DIR', default_cache_dir())
+            )
+    if not _is_private(path):
+        warnings.warn(
+                f'Not using the cache in {path}, as other users can write '
+                'to it.'
+                )
+        return None
+    max_size = config.get('max_size', DEFAULT_MAX_SIZE)
+    max_size = os.environ.get('NAPARI_DEFDAP_CACHE_SIZE', max_size)
+    return TimepointCache(
+            path, max_size=_parse_size(max_size), refresh=mode == 'refresh'
+            )
+
+
+def clear_cache(path=None):
+    """Delete all cached timepoints in ``path`` (default: user cache dir)."""
+    TimepointCache(path or default_cache_dir()).clear()
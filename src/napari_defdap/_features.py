@@ -0,0 +1,252 @@
+"""Per-grain feature tables.
+
+The reader computes one row per (timepoint, grain) with the bounding box,
+area, centroid and shear statistics of each grain, using labelled
+reductions over whole frames instead of one `RegionProperties` object per
+grain. The widget and the tracking code look grains up in this table and
+only crop the grain image out of the arrays when they need it.
+
+`shear_statistics` computes more detailed shear statistics (percentiles,
+area above thresholds) in the same way, to follow tracked grains over time
+(see `napari_defdap._tracks.tracks_with_shear`).
+"""
+import numpy as np
+import pandas as pd
+from scipy import ndimage as ndi
+
+
+def _flat_labels(labels):
+    """Return labels raveled and castable to intp, for use with bincount."""
+    if labels.dtype.kind != 'u':
+        labels = np.clip(labels, 0, None)
+    if labels.dtype.itemsize >= np.dtype(np.intp).itemsize:
+        labels = labels.astype(np.intp)
+    return labels.ravel()
+
+
+def grain_table_timepoint(grains, shear=None, t=0):
+    """Compute the features of every grain in a single timepoint.
+
+    Parameters
+    ----------
+    grains : np.ndarray of int, shape (M, N)
+        The grain labels. Labels <= 0 are ignored.
+    shear : np.ndarray of float, shape (M, N), optional
+        The max shear map. If given, the mean and max shear of each grain
+        are included in the table.
+    t : int
+        The timepoint, recorded in the 't' column.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        One row per grain, sorted by label, with columns 't', 'label',
+        'area', 'bbox-0' ... 'bbox-3' (as in `skimage.measure.regionprops`,
+        with the first two being the offsets of the grain crop),
+        'centroid-0', 'centroid-1' and, if ``shear`` is given,
+        'mean_shear' and 'max_shear'.
+    """
+    grains = np.asarray(grains)
+    flat = _flat_labels(grains)
+    area = np.bincount(flat)
+    labels = np.flatnonzero(area)
+    labels = labels[labels > 0]
+    area = area[labels]
+    objects = ndi.find_objects(flat.reshape(grains.shape))
+    bbox = np.array(
+            [[s.start for s in objects[lab - 1]]
+             + [s.stop for s in objects[lab - 1]] for lab in labels],
+            dtype=np.intp,
+            ).reshape((len(labels), 2 * grains.ndim))
+    columns = {
+            't': np.full(len(labels), t, dtype=np.int32),
+            'label': labels.astype(grains.dtype),
+            'area': area,
+            }
+    for i in range(bbox.shape[1]):
+        columns[f'bbox-{i}'] = bbox[:, i]
+    for ax in range(grains.ndim):
+        coords = np.arange(grains.shape[ax], dtype=float)
+        shape = [1] * grains.ndim
+        shape[ax] = -1
+        weights = np.broadcast_to(coords.reshape(shape), grains.shape)
+        sums = np.bincount(flat, weights=weights.ravel())
+        columns[f'centroid-{ax}'] = sums[labels] / area
+    if shear is not None:
+        shear = np.asarray(shear)
+        sums = np.bincount(flat, weights=shear.ravel())
+        columns['mean_shear'] = sums[labels] / area
+        columns['max_shear'] = np.asarray(
+                ndi.maximum(shear, flat.reshape(grains.shape), labels),
+                dtype=float,
+                ).reshape(-1)
+    return pd.DataFrame(columns)
+
+
+def grain_table(grains, shear=None, time_axis=0):
+    """Compute the features of every grain in every timepoint of a stack.
+
+    Parameters
+    ----------
+    grains : np.ndarray of int, shape (T, M, N)
+        The grain labels.
+    shear : np.ndarray of float, shape (T, M, N), optional
+        The max shear map.
+    time_axis : int
+        The axis of ``grains`` (and ``shear``) indexing time.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        The concatenation of `grain_table_timepoint` for each timepoint.
+    """
+    tables = []
+    for t in range(grains.shape[time_axis]):
+        grains_t = np.take(grains, t, axis=time_axis)
+        shear_t = None if shear is None else np.take(shear, t, axis=time_axis)
+        tables.append(grain_table_timepoint(grains_t, shear_t, t=t))
+    return pd.concat(tables, ignore_index=True)
+
+
+def shear_statistics_timepoint(
+        grains, shear, t=0, percentiles=(50, 90, 99), thresholds=(),
+        ):
+    """Compute shear statistics of every grain in a single timepoint.
+
+    The sums are labelled reductions with `np.bincount`. For the
+    percentiles, the pixels are sorted once by label, then shear, with
+    `np.lexsort`, so that each grain's values are a contiguous, sorted run
+    in which percentiles are read off by position.
+
+    Parameters
+    ----------
+    grains : np.ndarray of int, shape (M, N)
+        The grain labels. Labels <= 0 are ignored.
+    shear : np.ndarray of float, shape (M, N)
+        The max shear map.
+    t : int
+        The timepoint, recorded in the 't' column.
+    percentiles : sequence of float
+        The percentiles of the shear of each grain to compute, between 0
+        and 100. They are interpolated linearly, as in `np.percentile`.
+    thresholds : sequence of float
+        For each threshold, the fraction of each grain's area where the
+        shear is above it.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        One row per grain, sorted by label, with columns 't', 'label',
+        'area', 'mean_shear', 'std_shear', 'max_shear', one 'p<q>_shear'
+        column per percentile (for example, 'p90_shear') and one
+        'fraction_above_<threshold>' column per threshold.
+    """
+    flat = _flat_labels(np.asarray(grains))
+    values = np.asarray(shear, dtype=float).ravel()
+    counts = np.bincount(flat)
+    labels = np.flatnonzero(counts)
+    labels = labels[labels > 0]
+    area = counts[labels]
+    mean = np.bincount(flat, weights=values)[labels] / area
+    mean_sq = np.bincount(flat, weights=values * values)[labels] / area
+    columns = {
+            't': np.full(len(labels), t, dtype=np.int32),
+            'label': labels.astype(np.asarray(grains).dtype),
+            'area': area,
+            'mean_shear': mean,
+            'std_shear': np.sqrt(np.maximum(mean_sq - mean * mean, 0)),
+            }
+    sorted_values = values[np.lexsort((values, flat))]
+    starts = (np.cumsum(counts) - counts)[labels]
+    columns['max_shear'] = sorted_values[starts + area - 1]
+    for q in percentiles:
+        position = starts + q / 100 * (area - 1)
+        low = np.floor(position).astype(np.intp)
+        high = np.minimum(low + 1, starts + area - 1)
+        fraction = position - low
+        columns[f'p{q:g}_shear'] = (
+                sorted_values[low] * (1 - fraction)
+                + sorted_values[high] * fraction
+                )
+    for threshold in thresholds:
+        above = np.bincount(flat, weights=values > threshold)[labels]
+        columns[f'fraction_above_{threshold:g}'] = above / area
+    return pd.DataFrame(columns)
+
+
+def shear_statistics(
+        grains, shear, time_axis=0, percentiles=(50, 90, 99), thresholds=(),
+        ):
+    """Compute shear statistics of every grain in every timepoint.
+
+    Parameters
+    ----------
+    grains : array of int, shape (T, M, N)
+        The grain labels. It can be a lazy (dask) array, read one timepoint
+        at a time.
+    shear : array of float, shape (T, M, N)
+        The max shear map.
+    time_axis : int
+        The axis of ``grains`` and ``shear`` indexing time.
+    percentiles, thresholds
+        See `shear_statistics_timepoint`.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        The concatenation of `shear_statistics_timepoint` for each
+        timepoint, sorted by timepoint, then label.
+    """
+    tables = []
+    for t in range(grains.shape[time_axis]):
+        tables.append(shear_statistics_timepoint(
+                np.take(grains, t, axis=time_axis),
+                np.take(shear, t, axis=time_axis),
+                t=t, percentiles=percentiles, thresholds=thresholds,
+                ))
+    return pd.concat(tables, ignore_index=True)
+
+
+def split_by_timepoint(table, n_timepoints):
+    """Split a grain table sorted by 't' into one table per timepoint."""
+    t = table['t'].to_numpy()
+    bounds = np.searchsorted(t, np.arange(n_timepoints + 1))
+    return [table.iloc[start:stop]
+            for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+class GrainCrop:
+    """A single grain cropped out of the grains and shear arrays.
+
+    This provides the attributes of `skimage.measure.RegionProperties`
+    used by `compute_radon` and the plotting functions.
+
+    Parameters
+    ----------
+    label : int
+        The grain label.
+    bbox : tuple of int
+        The bounding box (min_row, min_col, max_row, max_col).
+    image : np.ndarray of bool
+        The grain mask within the bounding box.
+    intensity_image : np.ndarray of float
+        The shear within the bounding box, 0 outside the grain.
+    """
+    def __init__(self, label, bbox, image, intensity_image):
+        self.label = label
+        self.bbox = bbox
+        self.image = image
+        self.intensity_image = intensity_image
+
+    @classmethod
+    def from_arrays(cls, grains, shear, label, bbox):
+        """Crop grain ``label`` out of (possibly lazy) 2D arrays."""
+        bbox = tuple(int(b) for b in bbox)
+        ndim = len(bbox) // 2
+        crop = tuple(slice(start, stop)
+                     for start, stop in zip(bbox[:ndim], bbox[ndim:]))
+        image = np.asarray(grains[crop]) == label
+        intensity_image = np.where(
+                image, np.asarray(shear[crop], dtype=float), 0
+                )
+        return cls(label, bbox, image, intensity_image)
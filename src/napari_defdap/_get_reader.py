@@ -0,0 +1,48 @@
+"""Reader contributions that only import the readers when they are used.
+
+napari calls the ``get_reader`` functions of the manifest for every file
+that matches their filename patterns, just to find out whether the plugin
+can read it. Reading needs DefDAP, scipy, pandas and more, which take
+seconds to import, so these functions only check the path, and import the
+actual reader when they return it. This module must not import anything
+beyond the standard library.
+"""
+import os
+
+YAML_SUFFIX = '.defdap.yml'
+ZARR_SUFFIX = '.defdap.zarr'
+
+
+def _all_end_with(path, suffix):
+    paths = path if isinstance(path, list) else [path]
+    return all(os.fspath(p).rstrip('/\\').endswith(suffix) for p in paths)
+
+
+def napari_get_reader(path):
+    """Return `read_defdap` if ``path`` is a .defdap.yml file, else None.
+
+    Parameters
+    ----------
+    path : str or list of str
+        Path to file, or list of paths.
+
+    Returns
+    -------
+    function or None
+        If the path is a recognized format, return a function that accepts the
+        same path or list of paths, and returns a list of layer data tuples.
+    """
+    if not _all_end_with(path, YAML_SUFFIX):
+        return None
+    from ._reader import read_defdap
+
+    return read_defdap
+
+
+def napari_get_zarr_reader(path):
+    """Return `read_zarr` if ``path`` is a .defdap.zarr store, else None."""
+    if not _all_end_with(path, ZARR_SUFFIX):
+        return None
+    from ._zarr import read_zarr
+
+    return read_zarr
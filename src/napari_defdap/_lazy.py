@@ -0,0 +1,145 @@
+"""Lazy, timepoint-by-timepoint access to the reader outputs.
+
+`read_defdap` uses these classes when the ``lazy`` option is set, so that
+napari can display the first timepoint of a long series right away and
+read the others as the user moves the time slider.
+"""
+import functools
+import threading
+import uuid
+from collections.abc import Mapping
+
+import numpy as np
+
+try:
+    import dask.array as da
+    dask_available = True
+except ImportError:
+    dask_available = False
+
+
+class LazyTimepoints:
+    """Sequence of timepoints read on demand and memoised.
+
+    Timepoints can be read from several threads, as dask does. Reads of
+    different timepoints run concurrently, while a thread asking for a
+    timepoint that is being read waits for that read rather than repeating
+    it.
+
+    Parameters
+    ----------
+    read : callable
+        Function taking a timepoint index and returning the tuple of
+        outputs for that timepoint.
+    n : int
+        The number of timepoints.
+    maxsize : int
+        The maximum number of timepoints to keep in memory.
+    """
+    def __init__(self, read, n, maxsize=4):
+        self._read = functools.lru_cache(maxsize=maxsize)(read)
+        # one lock per timepoint, created on first use
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._n:
+            raise IndexError(f'timepoint {i} out of range for {self._n}')
+        i = int(i)
+        with self._locks_lock:
+            lock = self._locks.setdefault(i, threading.Lock())
+        with lock:
+            return self._read(i)
+
+
+class LazyStack:
+    """Array-like stack of one of the outputs of `LazyTimepoints`.
+
+    Parameters
+    ----------
+    timepoints : LazyTimepoints
+        The timepoints to stack.
+    index : int
+        The position of the array to stack in each timepoint's outputs.
+    frame_shape : tuple of int
+        The shape of the array in each timepoint.
+    dtype : numpy dtype
+        The data type of the stack.
+    """
+    def __init__(self, timepoints, index, frame_shape, dtype):
+        self.timepoints = timepoints
+        self.index = index
+        self.shape = (len(timepoints),) + tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.ndim = len(self.shape)
+
+    def _frame(self, t, key):
+        frame = self.timepoints[t][self.index][key]
+        return np.asarray(frame, dtype=self.dtype)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        t, rest = key[0], key[1:]
+        if isinstance(t, (int, np.integer)):
+            return self._frame(t, rest)
+        frames = [self._frame(i, rest)
+                  for i in range(*t.indices(self.shape[0]))]
+        return np.stack(frames)
+
+
+def lazy_stack(timepoints, index, frame):
+    """Return a dask array with one chunk per timepoint.
+
+    Parameters
+    ----------
+    timepoints : LazyTimepoints
+        The timepoints to stack.
+    index : int
+        The position of the array to stack in each timepoint's outputs.
+    frame : np.ndarray
+        An example frame, giving the shape and dtype of each timepoint.
+
+    Returns
+    -------
+    stack : dask.array.Array
+        The lazy stack.
+    """
+    if not dask_available:
+        raise ImportError('Lazy loading requires dask to be installed.')
+    stack = LazyStack(timepoints, index, frame.shape, frame.dtype)
+    return da.from_array(
+            stack,
+            chunks=(1,) + frame.shape,
+            name=f'napari-defdap-{index}-{uuid.uuid4().hex}',
+            asarray=False,
+            )
+
+
+class LazyMaps(Mapping):
+    """Read-only mapping from (t,) to one of the outputs of `LazyTimepoints`.
+
+    This stands in for the ``dicmap`` and ``ebsdmap`` metadata dictionaries
+    so that the maps are only read when they are needed.
+    """
+    def __init__(self, timepoints, index):
+        self.timepoints = timepoints
+        self.index = index
+
+    def __getitem__(self, key):
+        try:
+            (t,) = key
+        except (TypeError, ValueError):
+            raise KeyError(key) from None
+        if not 0 <= t < len(self.timepoints):
+            raise KeyError(key)
+        return self.timepoints[t][self.index]
+
+    def __iter__(self):
+        return ((t,) for t in range(len(self.timepoints)))
+
+    def __len__(self):
+        return len(self.timepoints)
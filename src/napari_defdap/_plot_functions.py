@@ -1,27 +1,33 @@
 import numpy as np
-from ._slips import get_slipsystem_info2
+from ._slips import slip_system_table
 
-def plot_slip_detection_plot(dicmap, grain_id, max_shear_along_angles, *, ax):
+def plot_slip_detection_plot(
+        dicmap, grain_id, max_shear_along_angles, *, ax, slip_system_df=None,
+        ):
     max_shear_along_angles_periodic = np.concatenate(
             [max_shear_along_angles] * 2 + [max_shear_along_angles[0:1]]
             )
-    angles = np.linspace(0, 2*np.pi, 361, endpoint=True)
+    n_angles = len(max_shear_along_angles)
+    angles = np.linspace(0, 2*np.pi, 2 * n_angles + 1, endpoint=True)
     ax.plot(angles, max_shear_along_angles_periodic)
-    slip_system_df = get_slipsystem_info2(grain_id, dicmap)
-    slip_system_df['angle_deg_180'] = (slip_system_df['angle_deg'] + 180) % 360
-    for row in slip_system_df.itertuples(index=False):
-        ax.vlines(
-                np.radians([row.angle_deg, row.angle_deg_180]),
-                ymin=0, ymax=1.05 * np.max(max_shear_along_angles),
-                colors=row.color,
-                )
+    if slip_system_df is None and dicmap is not None:
+        slip_system_df = slip_system_table(dicmap).grain(grain_id)
+    if slip_system_df is not None:
+        # a dict of arrays from SlipSystemTable.grain, or a DataFrame
+        ymax = 1.05 * np.max(max_shear_along_angles)
+        for angle, color in zip(slip_system_df['angle_deg'],
+                                slip_system_df['color']):
+            ax.vlines(
+                    np.radians([angle, (angle + 180) % 360]),
+                    ymin=0, ymax=ymax, colors=color,
+                    )
     ax.set_title('Band angle distribution')
     ax.set_xlabel('Angle in degrees')
 
 
 def plot_shear(prop, *, ax):
     minr, minc, maxr, maxc = prop.bbox
-    ax.imshow(prop.intensity_image,
+    ax.imshow(np.where(prop.image, prop.intensity_image, np.nan),
               aspect='equal',
               extent=[minc - 0.5, maxc + 0.5, maxr + 0.5, minr - 0.5])
     ax.set_aspect('equal')
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""Opt-in timing and memory instrumentation of the reader stages.
+
+Set ``profile: true`` in the YAML file, or ``NAPARI_DEFDAP_PROFILE=1``, to
+record the wall time and peak memory of each stage of `read_timepoint` and
+`read_defdap` (reading the DIC file, finding EBSD grain boundaries, linking
+the maps, stacking...), for each timepoint. The records are logged to the
+``napari_defdap.profile`` logger, stored in the layer metadata under
+'profile', and, if ``profile`` is a file name, written to that file as
+JSON.
+
+In lazy mode, timepoints are only read, and profiled, as they are
+displayed, so the report written when the layers are created covers the
+first timepoint only, and says so. Later reads are still recorded: call
+``layer.metadata['profile'].report()`` to log and save an updated report.
+
+Memory is measured with `tracemalloc`, which numpy reports its buffers to,
+and is the peak of traced memory during the stage above the memory in use
+when the stage started. Tracing slows down allocation-heavy code, so
+profiled times are somewhat pessimistic. The peak of traced memory is
+shared by all threads, so stages started in different threads, such as
+lazy reads of different timepoints, run one at a time. When profiling
+is disabled, the reader uses `stage` with ``profiler=None``, which
+returns a shared null context and does nothing else.
+"""
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+logger = logging.getLogger('napari_defdap.profile')
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class StageProfiler:
+    """Record the wall time and peak memory of nested, named stages.
+
+    Parameters
+    ----------
+    n_timepoints : int, optional
+        The number of timepoints of the series, so that reports can say
+        whether they cover all of them.
+    filename : str, optional
+        The file `report` saves the records to by default.
+
+    Attributes
+    ----------
+    records : list of dict
+        One record per completed stage, with keys 'stage', 't' (the
+        timepoint, or None), 'depth' (the nesting level), 'pid',
+        'wall_time' (in seconds) and 'peak_memory' (in bytes).
+    """
+    def __init__(self, n_timepoints=None, filename=None):
+        self.n_timepoints = n_timepoints
+        self.filename = filename
+        self.records = []
+        self._local = threading.local()
+        # held by the thread running the outermost stage
+        self._lock = threading.RLock()
+        # one [start memory, max peak seen] pair per open stage
+        self._stack = []
+        self._started_tracing = False
+
+    @property
+    def t(self):
+        """The timepoint the current thread's stages are tagged with."""
+        return getattr(self._local, 't', None)
+
+    @t.setter
+    def t(self, t):
+        self._local.t = t
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Context manager timing the stage ``name``."""
+        with self._lock:
+            with self._stage(name):
+                yield
+
+    @contextlib.contextmanager
+    def _stage(self, name):
+        if not self._stack and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            elif self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+            record = {
+                    'stage': name, 't': self.t, 'depth': len(self._stack),
+                    'pid': os.getpid(), 'wall_time': wall_time,
+                    'peak_memory': peak - frame[0],
+                    }
+            self.records.append(record)
+            logger.debug(_format(record))
+
+    @contextlib.contextmanager
+    def timepoint(self, t):
+        """Context manager tagging the stages it contains with ``t``."""
+        previous, self.t = self.t, t
+        try:
+            yield
+        finally:
+            self.t = previous
+
+    def extend(self, records):
+        """Add records from another profiler, such as a worker's."""
+        self.records.extend(records)
+        for record in records:
+            logger.debug(_format(record))
+
+    def to_dataframe(self):
+        """Return the records as a `pandas.DataFrame`."""
+        return pd.DataFrame(
+                self.records,
+                columns=['stage', 't', 'depth', 'pid', 'wall_time',
+                         'peak_memory'],
+                )
+
+    def summary(self):
+        """Total wall time and largest peak memory of each stage."""
+        df = self.to_dataframe()
+        return df.groupby('stage', sort=False).agg(
+                count=('wall_time', 'size'),
+                wall_time=('wall_time', 'sum'),
+                peak_memory=('peak_memory', 'max'),
+                )
+
+    def timepoints(self):
+        """The sorted timepoints that records were made for."""
+        return sorted({r['t'] for r in self.records if r['t'] is not None})
+
+    def report(self, filename=None):
+        """Log a summary of the records and optionally save them as JSON.
+
+        ``filename`` defaults to the profiler's. If the records don't cover
+        all ``n_timepoints`` timepoints, the report is marked as partial.
+        """
+        filename = filename or self.filename
+        timepoints = self.timepoints()
+        partial = (self.n_timepoints is not None
+                   and len(timepoints) < self.n_timepoints)
+        if self.records:
+            title = 'read_defdap profile'
+            if partial:
+                title += (f' (partial: {len(timepoints)} of '
+                          f'{self.n_timepoints} timepoints read)')
+            logger.info('%s:\n%s', title, self.summary())
+        if filename is not None:
+            with open(filename, 'w') as fout:
+                json.dump({
+                        'n_timepoints': self.n_timepoints,
+                        'timepoints': timepoints,
+                        'partial': partial,
+                        'records': self.records,
+                        }, fout, indent=2)
+
+
+def _format(record):
+    return (f"{'  ' * record['depth']}{record['stage']} "
+            f"(t={record['t']}): {record['wall_time']:.3f}s, "
+            f"{record['peak_memory'] / 2**20:.1f}MiB")
+
+
+def stage(profiler, name):
+    """Return ``profiler.stage(name)``, or a null context if it is None."""
+    if profiler is None:
+        return _NULL_CONTEXT
+    return profiler.stage(name)
+
+
+def timepoint(profiler, t):
+    """Return ``profiler.timepoint(t)``, or a null context if it is None."""
+    if profiler is None:
+        return _NULL_CONTEXT
+    return profiler.timepoint(t)
@@ -0,0 +1,245 @@
+"""Multiscale pyramids of the shear, grains and phase maps.
+
+Each level halves the size of the last two (spatial) axes of the previous
+one. Intensity images are downsampled by block averaging, and label images
+by nearest-neighbour (strided) sampling or by taking the most common label
+in each block, so that no new labels are created. `multiscale` builds the
+levels of dask arrays lazily, one timepoint chunk at a time, and those of
+numpy arrays one timepoint at a time, so that downsampling a memory-mapped
+stack never loads all of it into memory.
+"""
+import functools
+import tempfile
+
+import numpy as np
+
+
+def full_resolution(layer):
+    """Return the data of a layer, or its first level if it is multiscale."""
+    return layer.data[0] if layer.multiscale else layer.data
+
+
+def empty_stack(shape, dtype, directory=None):
+    """Allocate an array, memory-mapped in ``directory`` if given.
+
+    The memory map is backed by an anonymous temporary file, which is
+    deleted when the array is.
+    """
+    if directory is None:
+        return np.empty(shape, dtype=dtype)
+    # the file is deleted when closed, and the mapping keeps it alive
+    with tempfile.TemporaryFile(dir=directory) as fout:
+        return np.memmap(fout, dtype=dtype, mode='w+', shape=shape)
+
+
+def n_levels(shape, min_size=512, factor=2):
+    """Return the number of levels needed to fit the last two axes.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        The shape of the full resolution array.
+    min_size : int
+        The pyramid stops at the first level whose spatial axes are both at
+        most ``min_size`` pixels long.
+    factor : int
+        The downsampling factor between levels.
+
+    Returns
+    -------
+    n : int
+        The number of levels, including the full resolution.
+    """
+    size = max(shape[-2:])
+    n = 1
+    while size > min_size:
+        size = -(-size // factor)
+        n += 1
+    return n
+
+
+def level_shape(shape, level, factor=2):
+    """Return the shape of the array at ``level`` of the pyramid."""
+    scale = factor**level
+    return tuple(shape[:-2]) + tuple(-(-s // scale) for s in shape[-2:])
+
+
+def downsample_mean(image, factor=2):
+    """Downsample the last two axes of ``image`` by block averaging.
+
+    Blocks at the edges, which are cut off by the image boundary, are
+    averaged over the pixels they contain.
+
+    Parameters
+    ----------
+    image : np.ndarray of float
+        The image to downsample.
+    factor : int
+        The size of the blocks.
+
+    Returns
+    -------
+    downsampled : np.ndarray of float
+        The downsampled image, with spatial shape ``ceil(shape / factor)``.
+    """
+    image = np.asarray(image)
+    *lead, h, w = image.shape
+    oh, ow = level_shape((h, w), 1, factor)
+    pad = [(0, 0)] * len(lead) + [(0, oh * factor - h), (0, ow * factor - w)]
+    padded = np.pad(image, pad)
+    blocks = padded.reshape(tuple(lead) + (oh, factor, ow, factor))
+    sums = blocks.sum(axis=(-3, -1), dtype=np.float64)
+    counts = np.outer(
+            np.minimum(factor, h - factor * np.arange(oh)),
+            np.minimum(factor, w - factor * np.arange(ow)),
+            )
+    dtype = image.dtype if image.dtype.kind == 'f' else np.float64
+    return (sums / counts).astype(dtype, copy=False)
+
+
+def downsample_mode(labels, factor=2):
+    """Downsample the last two axes of ``labels`` to the most common label.
+
+    Ties are broken in favour of the smallest label. Blocks at the edges are
+    padded by repeating the edge pixels.
+
+    Parameters
+    ----------
+    labels : np.ndarray of int
+        The label image to downsample.
+    factor : int
+        The size of the blocks.
+
+    Returns
+    -------
+    downsampled : np.ndarray of int
+        The downsampled labels, with spatial shape ``ceil(shape / factor)``.
+    """
+    labels = np.asarray(labels)
+    *lead, h, w = labels.shape
+    oh, ow = level_shape((h, w), 1, factor)
+    pad = [(0, 0)] * len(lead) + [(0, oh * factor - h), (0, ow * factor - w)]
+    padded = np.pad(labels, pad, mode='edge')
+    blocks = padded.reshape(tuple(lead) + (oh, factor, ow, factor))
+    blocks = np.moveaxis(blocks, -3, -2).reshape(
+            tuple(lead) + (oh, ow, factor * factor)
+            )
+    blocks = np.sort(blocks, axis=-1)
+    # number of occurrences of each value in its block; factor**2 is small
+    counts = np.sum(blocks[..., :, np.newaxis] == blocks[..., np.newaxis, :],
+                    axis=-1)
+    best = np.argmax(counts, axis=-1)[..., np.newaxis]
+    return np.take_along_axis(blocks, best, axis=-1)[..., 0]
+
+
+def downsample_labels(labels, factor=2, method='nearest'):
+    """Downsample the last two axes of ``labels``.
+
+    With the default 'nearest' method, this returns a strided view of
+    ``labels``. With 'mode', each block is replaced by its most common
+    label (see `downsample_mode`). Either way, the spatial shape of the
+    result is ``ceil(shape / factor)``.
+    """
+    if method == 'nearest':
+        return labels[..., ::factor, ::factor]
+    elif method == 'mode':
+        return downsample_mode(labels, factor)
+    raise ValueError(
+            f"method must be 'nearest' or 'mode', got {method!r}"
+            )
+
+
+def pyramid(image, levels, labels=False, factor=2, method='nearest'):
+    """Build a multiscale pyramid of ``image``.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        The full resolution image.
+    levels : int
+        The number of levels, including the full resolution.
+    labels : bool
+        Whether ``image`` is a label image, to be downsampled with
+        `downsample_labels` rather than `downsample_mean`.
+    factor : int
+        The downsampling factor between levels.
+    method : {'nearest', 'mode'}
+        The label downsampling method, see `downsample_labels`.
+
+    Returns
+    -------
+    pyramid : list of np.ndarray
+        The levels, from full to lowest resolution.
+    """
+    result = [image]
+    for _ in range(levels - 1):
+        if labels:
+            result.append(downsample_labels(result[-1], factor, method))
+        else:
+            result.append(downsample_mean(result[-1], factor))
+    return result
+
+
+def _pyramid_by_frame(image, levels, labels, method, directory):
+    """`pyramid`, downsampling one frame of the leading axes at a time."""
+    if labels and method == 'nearest':
+        return pyramid(image, levels, labels=True)
+    if labels:
+        downsample = functools.partial(downsample_labels, method=method)
+        dtype = image.dtype
+    else:
+        downsample = downsample_mean
+        dtype = image.dtype if image.dtype.kind == 'f' else np.float64
+    result = [image]
+    for level in range(1, levels):
+        previous = result[-1]
+        current = empty_stack(
+                level_shape(image.shape, level), dtype, directory
+                )
+        for index in np.ndindex(previous.shape[:-2]):
+            current[index] = downsample(previous[index])
+        result.append(current)
+    return result
+
+
+def multiscale(image, levels, labels=False, method='nearest',
+               directory=None):
+    """Build a pyramid of a numpy or dask array, for a napari layer.
+
+    Numpy arrays are downsampled right away, one frame at a time, with the
+    label levels being views of ``image`` if ``method`` is 'nearest'. For
+    dask arrays whose chunks span whole frames, as returned by
+    `read_defdap` in lazy mode, each level is a lazy array computed chunk
+    by chunk, when displayed.
+
+    Parameters
+    ----------
+    image : np.ndarray or dask.array.Array
+        The full resolution image or stack.
+    levels, labels, method
+        As for `pyramid`, with a factor of 2.
+    directory : str, optional
+        If given, the downsampled levels of numpy arrays are memory-mapped
+        temporary files in this directory (see `empty_stack`).
+
+    Returns
+    -------
+    pyramid : list of arrays
+        The levels, from full to lowest resolution.
+    """
+    if not hasattr(image, 'map_blocks'):
+        return _pyramid_by_frame(image, levels, labels, method, directory)
+    if labels:
+        downsample = functools.partial(downsample_labels, method=method)
+        dtype = image.dtype
+    else:
+        downsample = downsample_mean
+        dtype = image.dtype if image.dtype.kind == 'f' else np.float64
+    result = [image]
+    for level in range(1, levels):
+        shape = level_shape(image.shape, level)
+        chunks = image.chunks[:-2] + ((shape[-2],), (shape[-1],))
+        result.append(result[-1].map_blocks(
+                downsample, chunks=chunks, dtype=dtype,
+                ))
+    return result
@@ -0,0 +1,145 @@
+"""Streaming, mergeable quantile estimates for contrast limits.
+
+Computing the contrast limits of a stack with `np.quantile` sorts a copy
+of the whole stack, and needs all of it in memory. `HistogramQuantiles`
+instead accumulates a histogram of the values, one timepoint at a time,
+and estimates quantiles from it.
+
+The bins are logarithmic: bin ``i`` holds the values whose magnitude is in
+``(gamma**(i - 1), gamma**i]``, with the same bins for negative values,
+and one bin for values too close to zero. So every estimate is within a
+fixed relative error of the exact quantile, whatever the range of the
+values: a few outliers, even at 1e308, only fill bins of their own,
+instead of widening the bins of all the other values. The bins do not
+depend on the values either, so the histograms of separate timepoints
+(possibly computed in separate processes) merge exactly into the
+histogram of the stack. Only the bins that hold values are stored.
+"""
+import math
+
+import numpy as np
+
+
+class HistogramQuantiles:
+    """Approximate quantiles of a stream of values.
+
+    Each estimated quantile lies in the same bin as the exact one (with the
+    'lower' method of `np.quantile`), so its relative error is at most
+    ``relative_accuracy``. Values smaller than ``min_value`` in magnitude
+    are estimated as 0.
+
+    Parameters
+    ----------
+    relative_accuracy : float
+        The maximum relative error of the estimates, between 0 and 1.
+    min_value : float
+        The smallest magnitude distinguished from 0.
+    """
+    def __init__(self, relative_accuracy=0.005, min_value=1e-12):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                    'relative_accuracy must be between 0 and 1, got '
+                    f'{relative_accuracy}'
+                    )
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        # bins whose upper edge is at most min_value are merged into bin 0
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        # the sorted keys of the non-empty bins, negative for negative
+        # values, and their counts
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def count(self):
+        """The number of values added."""
+        return int(self.counts.sum())
+
+    def _keys(self, values):
+        """The bin key of each value, increasing with the value."""
+        magnitude = np.maximum(np.abs(values), self.min_value)
+        keys = np.ceil(np.log(magnitude) / self._log_gamma).astype(np.int64)
+        keys -= self._offset
+        np.maximum(keys, 0, out=keys)
+        if values.min() < 0:
+            keys[values < 0] *= -1
+        return keys
+
+    def _add(self, keys, counts):
+        keys = np.concatenate([self.keys, keys])
+        counts = np.concatenate([self.counts, counts])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(
+                inverse.ravel(), weights=counts, minlength=len(self.keys)
+                ).astype(np.int64)
+
+    def update(self, values):
+        """Add the finite values of an array to the histogram.
+
+        Returns the histogram, so that it can be created and filled in one
+        line.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        finite = np.isfinite(values)
+        if not finite.all():
+            values = values[finite]
+        if values.size == 0:
+            return self
+        keys = self._keys(values)
+        low = keys.min()
+        counts = np.bincount(keys - low)
+        nonzero = np.flatnonzero(counts)
+        self._add(nonzero + low, counts[nonzero])
+        return self
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same bins.
+
+        Returns the histogram.
+        """
+        if (other.relative_accuracy != self.relative_accuracy
+                or other.min_value != self.min_value):
+            raise ValueError('Can only merge histograms with the same bins.')
+        self._add(other.keys, other.counts)
+        return self
+
+    def quantile(self, q):
+        """Estimate the quantiles ``q`` of the values added so far.
+
+        Parameters
+        ----------
+        q : float or array of float
+            The quantiles to estimate, between 0 and 1.
+
+        Returns
+        -------
+        estimate : float or np.ndarray of float
+            The estimated quantiles, NaN if no values were added.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        total = self.count
+        if total == 0:
+            return np.full(q.shape, np.nan)[()]
+        cumulative = np.cumsum(self.counts)
+        # 0-based rank of the 'lower' quantile, as in np.quantile
+        rank = np.floor(q * (total - 1))
+        keys = self.keys[np.searchsorted(cumulative, rank, side='right')]
+        # the point of the bin with the smallest relative error to all of
+        # its values
+        exponent = np.abs(keys) + self._offset
+        magnitude = 2 * self.gamma ** exponent / (self.gamma + 1)
+        return np.where(keys == 0, 0., np.sign(keys) * magnitude)[()]
+
+
+def contrast_limits(histogram, quantiles=(0.01, 0.99)):
+    """Return the contrast limits of a histogram as a length 2 array.
+
+    If the limits are equal, 1 is added to the upper one, as napari needs
+    a non-empty range.
+    """
+    clim = np.asarray(histogram.quantile(quantiles), dtype=np.float64)
+    if clim[1] == clim[0]:
+        clim[1] += 1
+    return clim
@@ -5,33 +5,121 @@ It implements the Reader specification, but your plugin may choose to
 implement multiple readers or even other plugin contributions. see:
 https://napari.org/stable/plugins/guides.html?#readers
 """
+import copy
+import functools
+import json
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+import pandas as pd
 from scipy import ndimage as ndi
-from skimage.morphology import remove_small_objects
 import yaml
 from defdap import hrdic, ebsd
+from defdap.experiment import Frame
 
+from ._cache import cache_from_config
+from ._features import grain_table_timepoint
+from ._get_reader import napari_get_reader  # noqa: F401
+from ._lazy import LazyMaps, LazyTimepoints, lazy_stack
+from ._profiling import StageProfiler, stage, timepoint
+from ._pyramid import empty_stack, multiscale, n_levels
+from ._quantiles import HistogramQuantiles, contrast_limits
 
-def _add_non_indexed(seg, time_axis=0, min_size=0):
-    ndim = seg.ndim
+
+def _label_dtype(max_label):
+    """Return the smallest unsigned integer dtype that can hold max_label."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_label <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def _relabel_non_indexed(seg, min_size=0, dtype=None):
+    """Give each connected non-indexed region of one timepoint its own label.
+
+    Non-indexed pixels (with value <= 0) are labelled by connected component,
+    starting after the largest grain label. Components smaller than
+    ``min_size`` pixels are set to 0.
+
+    Parameters
+    ----------
+    seg : np.ndarray of int
+        The grains array for a single timepoint.
+    min_size : int
+        The minimum size of a non-indexed region to keep.
+    dtype : numpy dtype, optional
+        The output dtype. By default, the smallest unsigned integer type that
+        can hold all the output labels.
+
+    Returns
+    -------
+    relabeled : np.ndarray
+        The relabelled grains array.
+    """
     non_indexed = seg <= 0
-    axes = tuple(i for i in range(ndim) if i != time_axis)
-    max_label = np.max(seg, axis=axes)
-    labeled = np.zeros_like(seg)
+    offset = max(int(seg.max(initial=0)), 0)
+    labeled, n = ndi.label(non_indexed)
+    if min_size > 0:
+        too_small = np.bincount(labeled.ravel()) < min_size
+        too_small[0] = False
+        labeled[too_small[labeled]] = 0
+    if dtype is None:
+        dtype = _label_dtype(offset + n)
+    relabeled = seg.astype(dtype)
+    np.copyto(relabeled, 0, where=non_indexed)
+    np.add(labeled, offset, out=relabeled, where=labeled > 0,
+           casting='unsafe')
+    return relabeled
+
+
+def _stack_labels(frames, axis=0):
+    """Stack label frames using the smallest dtype that holds all of them."""
+    return np.stack(frames, axis=axis, dtype=np.result_type(*frames))
+
+
+class _FrameStack:
+    """A stack of frames, allocated when the first frame is added.
+
+    Frames are written straight into their slot as they are read, rather
+    than kept in a list until `np.stack` copies them at the end. If
+    ``directory`` is given, the stack is an `np.memmap` of an anonymous
+    temporary file in that directory, so that it is paged to disk rather
+    than held in memory.
+
+    If a frame needs a larger dtype than the previous ones, as labels can,
+    the stack is reallocated with that dtype and the previous frames are
+    copied over.
+    """
+    def __init__(self, n, directory=None):
+        self.n = n
+        self.directory = directory
+        self.array = None
+
+    def _allocate(self, shape, dtype):
+        return empty_stack(shape, dtype, self.directory)
+
+    def __setitem__(self, i, frame):
+        frame = np.asarray(frame)
+        if self.array is None:
+            self.array = self._allocate((self.n,) + frame.shape, frame.dtype)
+        dtype = np.result_type(self.array.dtype, frame.dtype)
+        if dtype != self.array.dtype:
+            array = self._allocate(self.array.shape, dtype)
+            array[:i] = self.array[:i]
+            self.array = array
+        self.array[i] = frame
+
+
+def _add_non_indexed(seg, time_axis=0, min_size=0):
+    """Apply `_relabel_non_indexed` to each timepoint of a stack."""
+    frames = []
     for i in range(seg.shape[time_axis]):
-        idx_ = [slice(None),] * ndim
-        idx_[time_axis] = i
-        idx = tuple(idx_)
-        labeled_i = ndi.label(non_indexed[idx])[0] + max_label[i]
-        if min_size > 0:
-            remove_small_objects(
-                    labeled_i, min_size=min_size, out=labeled[idx]
-                    )
-        else:
-            labeled[idx] = labeled_i
-    output = np.where(non_indexed, labeled, seg)
-    return output
+        idx = [slice(None),] * seg.ndim
+        idx[time_axis] = i
+        frames.append(_relabel_non_indexed(seg[tuple(idx)], min_size))
+    return _stack_labels(frames, axis=time_axis)
 
 
 def _look_for_ebsd(path):
@@ -42,46 +130,402 @@ def _look_for_ebsd(path):
     return files[0]
 
 
-def _ends_with_any(string, list_of_suffixes):
-    return any(string.endswith(suf) for suf in list_of_suffixes)
+def _get_option(data, name, default=None):
+    """Get a reader option from the environment or the YAML file.
 
+    The ``NAPARI_DEFDAP_<NAME>`` environment variable takes precedence over
+    the ``name`` key at the top level of the YAML file.
+    """
+    return os.environ.get(
+            'NAPARI_DEFDAP_' + name.upper(), data.get(name, default)
+            )
 
-def napari_get_reader(path):
-    """A basic implementation of a Reader contribution.
 
-    Parameters
-    ----------
-    path : str or list of str
-        Path to file, or list of paths.
+def _get_flag(data, name, default=False):
+    value = _get_option(data, name, default)
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
 
-    Returns
-    -------
-    function or None
-        If the path is a recognized format, return a function that accepts the
-        same path or list of paths, and returns a list of layer data tuples.
-    """
-    ALLOWED_EXTENSIONS = '.defdap.yml'
-    if isinstance(path, list):
-        if not all(p.endswith(ALLOWED_EXTENSIONS) for p in path):
-            return None
-    elif not path.endswith(ALLOWED_EXTENSIONS):
+
+def _multiscale_levels(value, shape):
+    """Number of pyramid levels for the ``multiscale`` option.
+
+    ``true`` (or 1) chooses the number of levels from ``shape`` (see
+    `napari_defdap._pyramid.n_levels`), an integer N > 1 sets it, and
+    ``false`` disables multiscale output (a single level).
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+        value = (int(value) if value.isdigit()
+                 else value in ('true', 'yes', 'on'))
+    if value is True or value == 1:
+        return n_levels(shape)
+    return max(1, int(value or 1))
+
+
+def _profiler_from_config(data, directory):
+    """Return a `StageProfiler` and report file name, if profiling is on.
+
+    The ``profile`` option can be a boolean, or the name of a JSON file,
+    relative to the YAML file, in which to save the records. The profiler
+    also saves to that file by default.
+    """
+    value = _get_option(data, 'profile', False)
+    filename = None
+    if isinstance(value, str):
+        flag = value.strip().lower()
+        if flag in ('1', 'true', 'yes', 'on'):
+            value = True
+        elif flag in ('', '0', 'false', 'no', 'off'):
+            value = False
+        else:
+            filename = os.path.join(directory, os.path.expanduser(value))
+    if not value:
+        return None, None
+    n_timepoints = len(data.get('time', [data]))
+    return StageProfiler(n_timepoints, filename), filename
+
+
+def _compact_dtype(data):
+    """Shear dtype for the ``compact`` option, or None if it is off.
+
+    ``compact: true`` stores the labels in the smallest integer dtypes that
+    hold them, and keeps the shear as float64. ``compact: float32`` also
+    stores the shear as float32.
+    """
+    value = _get_option(data, 'compact', False)
+    if isinstance(value, str):
+        flag = value.strip().lower()
+        if flag in ('1', 'true', 'yes', 'on'):
+            value = True
+        elif flag in ('', '0', 'false', 'no', 'off'):
+            value = False
+    if value is False or value is None:
         return None
+    if value is True:
+        return np.dtype(np.float64)
+    dtype = np.dtype(value)
+    if dtype.kind != 'f':
+        raise ValueError(
+                "compact must be a boolean or a float dtype such as "
+                f"'float32', got {value!r}"
+                )
+    return dtype
+
+
+def _compact_result(result, shear_dtype):
+    """Downcast the arrays of one `read_timepoint` output.
+
+    The grains are stored in the smallest integer dtype that holds their
+    range (they can be negative in non-indexed regions), the phase in the
+    smallest unsigned dtype (uint8 unless there are more than 255 phases),
+    and the shear in ``shear_dtype``.
+    """
+    dicmap, ebsdmap, grains, max_shear, phase = result
+    low, high = int(grains.min(initial=0)), int(grains.max(initial=0))
+    if low >= 0:
+        grains_dtype = _label_dtype(high)
+    else:
+        grains_dtype = next(
+                dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max
+                )
+    grains = grains.astype(grains_dtype, copy=False)
+    phase = np.rint(phase).astype(
+            _label_dtype(int(phase.max(initial=0))), copy=False
+            )
+    max_shear = max_shear.astype(shear_dtype, copy=False)
+    return dicmap, ebsdmap, grains, max_shear, phase
+
+
+def _memmap_directory(data, directory):
+    """Directory for memory-mapped stacks, or None to keep them in memory.
+
+    ``memmap: true`` uses the system's temporary directory, which may be
+    a RAM-backed tmpfs, and any other string is a directory, relative to
+    the YAML file.
+    """
+    value = _get_option(data, 'memmap', False)
+    if isinstance(value, str):
+        flag = value.strip().lower()
+        if flag in ('1', 'true', 'yes', 'on'):
+            value = True
+        elif flag in ('', '0', 'false', 'no', 'off'):
+            value = False
+        else:
+            return os.path.join(directory, os.path.expanduser(value))
+    return tempfile.gettempdir() if value else None
+
+
+def _n_workers(data, n_timepoints):
+    """Number of worker processes to load timepoints with.
+
+    The ``NAPARI_DEFDAP_WORKERS`` environment variable takes precedence over
+    the ``workers`` key of the YAML file. A value of 0 or 'auto' means one
+    worker per CPU. The result is never larger than the number of timepoints.
+    """
+    workers = _get_option(data, 'workers', 1)
+    if workers in ('auto', None):
+        workers = 0
+    workers = int(workers)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, n_timepoints))
+
+
+# EBSD parameters that affect the processed map. Homolog points and the
+# transform type only matter when linking to a DIC map, so timepoints that
+# differ only in those can share the same processed EBSD map.
+_EBSD_MAP_PARAMS = (
+        'file', 'misorientation_tolerance', 'min_grain_size', 'load_vector'
+        )
+
+
+def _ebsd_key(ebsd_params):
+    shared = {k: ebsd_params.get(k) for k in _EBSD_MAP_PARAMS}
+    return json.dumps(shared, sort_keys=True, default=str)
+
+
+def _read_timepoint_cached(
+        data, directory, cache=None, ebsdmaps=None, profiler=None,
+        compact=None,
+        ):
+    """Like `read_timepoint`, but look up and store results in ``cache``.
+
+    If ``ebsdmaps`` is given, it is used as a dictionary of processed EBSD
+    maps to reuse across calls, keyed by `_ebsd_key`. If ``compact`` is a
+    dtype, the arrays are downcast with `_compact_result`, after saving the
+    full precision result to the cache.
+    """
+    result = None
+    if cache is not None:
+        with stage(profiler, 'cache_load'):
+            key = cache.key(data, directory)
+            result = cache.load(key)
+    if result is None:
+        ebsdmap = None
+        if ebsdmaps is not None:
+            ebsd_key = _ebsd_key(data['ebsd'])
+            if ebsd_key not in ebsdmaps:
+                ebsdmaps[ebsd_key] = read_ebsd(
+                        data['ebsd'], directory, profiler=profiler
+                        )
+            ebsdmap = ebsdmaps[ebsd_key]
+        result = read_timepoint(
+                data, directory, ebsdmap=ebsdmap, profiler=profiler
+                )
+        if cache is not None:
+            with stage(profiler, 'cache_save'):
+                cache.save(key, result)
+    if compact is not None:
+        with stage(profiler, 'compact'):
+            result = _compact_result(result, compact)
+    return result
+
+
+def _iter_batch(
+        timepoints, directory, cache=None, profiler=None, indices=None,
+        compact=None,
+        ):
+    """Yield `read_timepoint` output for timepoints sharing EBSD maps.
+
+    ``indices`` are the positions of ``timepoints`` in the project, used to
+    tag the profiler records.
+    """
+    ebsdmaps = {}
+    if indices is None:
+        indices = range(len(timepoints))
+    for i, dat in zip(indices, timepoints):
+        with timepoint(profiler, i), stage(profiler, 'read_timepoint'):
+            result = _read_timepoint_cached(
+                    dat, directory, cache, ebsdmaps, profiler, compact
+                    )
+        yield result
+
+
+def _read_batch(
+        timepoints, directory, cache=None, indices=None, profile=False,
+        compact=None,
+        ):
+    """Read a batch of timepoints in a worker process.
+
+    Returns the list of results, and the profiler records of the batch (an
+    empty list unless ``profile`` is True). Results are compacted here,
+    with ``compact``, so that only the compact arrays are sent back.
+    """
+    profiler = StageProfiler() if profile else None
+    results = list(_iter_batch(
+            timepoints, directory, cache, profiler, indices, compact
+            ))
+    return results, ([] if profiler is None else profiler.records)
+
+
+def _batches(timepoints, workers):
+    """Split timepoint indices into batches for ``workers`` processes.
 
-    # otherwise we return the *function* that can read ``path``.
-    return read_defdap
+    Timepoints with the same EBSD configuration go in the same batch where
+    possible, so that their EBSD map is processed only once.
+    """
+    groups = {}
+    for i, dat in enumerate(timepoints):
+        groups.setdefault(_ebsd_key(dat['ebsd']), []).append(i)
+    size = -(-len(timepoints) // workers)  # ceiling division
+    return [group[j:j + size]
+            for group in groups.values()
+            for j in range(0, len(group), size)]
+
+
+def _read_timepoints(
+        timepoints, directory, workers=1, cache=None, profiler=None,
+        compact=None,
+        ):
+    """Yield the output of `read_timepoint` for each timepoint, in order.
+
+    Timepoints that use the same EBSD file and parameters share a single
+    processed EBSD map. With more than one worker, the timepoints are read
+    in a process pool. If a cache is given, timepoints are looked up in and
+    added to it. If a profiler is given, the stages of each timepoint are
+    recorded in it, including those run in worker processes. If
+    ``compact`` is a dtype, each timepoint is compacted as soon as it is
+    read (see `_compact_result`).
+    """
+    if workers == 1:
+        yield from _iter_batch(
+                timepoints, directory, cache, profiler, compact=compact
+                )
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batch_of = {}
+            for batch in _batches(timepoints, workers):
+                future = executor.submit(
+                        _read_batch,
+                        [timepoints[i] for i in batch], directory, cache,
+                        batch, profiler is not None, compact,
+                        )
+                for j, i in enumerate(batch):
+                    batch_of[i] = (future, j)
+            merged = set()
+            for i in range(len(timepoints)):
+                future, j = batch_of.pop(i)
+                results, records = future.result()
+                if profiler is not None and future not in merged:
+                    profiler.extend(records)
+                    merged.add(future)
+                yield results[j]
+    if cache is not None:
+        cache.evict()
 
 
-def read_defdap(path):
+def _read_timepoint_relabeled(
+        i, timepoints, directory, cache, ebsdmaps, min_size, profiler=None,
+        compact=None,
+        ):
+    """Read timepoint ``i`` and label its non-indexed regions.
+
+    Returns the outputs of `read_timepoint`, followed by the contrast limits
+    of the timepoint's shear.
+    """
+    with timepoint(profiler, i):
+        with stage(profiler, 'read_timepoint'):
+            dicmap, ebsdmap, grains, max_shear, phase = (
+                    _read_timepoint_cached(
+                            timepoints[i], directory, cache, ebsdmaps,
+                            profiler, compact,
+                            )
+                    )
+        # lazy stacks need the same dtype in every timepoint
+        with stage(profiler, 'relabel'):
+            grains = _relabel_non_indexed(
+                    grains, min_size=min_size, dtype=np.uint32
+                    )
+        with stage(profiler, 'contrast_limits'):
+            clim = contrast_limits(HistogramQuantiles().update(max_shear))
+    return dicmap, ebsdmap, grains, max_shear, phase, clim
+
+
+def _ends_with_any(string, list_of_suffixes):
+    return any(string.endswith(suf) for suf in list_of_suffixes)
+
+
+def read_defdap(path, multiscale_output=None):
     """Take a path or list of paths and return a list of LayerData tuples.
 
     Readers are expected to return data as a list of tuples, where each tuple
     is (data, [add_kwargs, [layer_type]]), "add_kwargs" and "layer_type" are
     both optional.
 
+    Timepoints are independent of each other, so they can be read in
+    parallel: set ``workers: N`` at the top level of the YAML file, or the
+    ``NAPARI_DEFDAP_WORKERS`` environment variable, to use N processes (0 or
+    'auto' uses all available CPUs).
+
+    With ``cache: true`` (or ``NAPARI_DEFDAP_CACHE=1``), processed
+    timepoints are cached on disk, so that reopening a project whose files
+    and parameters haven't changed is fast. See `napari_defdap._cache` for
+    the available settings.
+
+    The metadata of each layer contains the DIC and EBSD maps of each
+    timepoint under 'dicmap' and 'ebsdmap', the contrast limits of the
+    shear of each timepoint under 'timepoint_contrast_limits', and, unless
+    loading lazily, a table of per-grain features under 'grain_table' (see
+    `napari_defdap._features.grain_table`).
+
+    The contrast limits are the 1st and 99th percentiles of the finite
+    values of the shear, estimated to within 0.5% from logarithmic
+    histograms updated as each timepoint is read (see
+    `napari_defdap._quantiles`), rather than by sorting the whole stack.
+
+    With ``lazy: true`` in the YAML file, or ``NAPARI_DEFDAP_LAZY=1``, only
+    the first timepoint is read up front, and the layers contain dask
+    arrays with one chunk per timepoint that are read as they are
+    displayed. The contrast limits are then estimated from the first
+    timepoint only. Lazy loading requires dask.
+
+    With ``multiscale: true`` (or ``NAPARI_DEFDAP_MULTISCALE=1``), the
+    layers are multiscale: each level halves the resolution of the
+    previous one, until the image fits in 512x512 pixels, or
+    ``multiscale: N`` sets the number of levels. The shear is averaged,
+    and the labels are subsampled, or, with ``multiscale_labels: mode``,
+    take the most common label of each block. In lazy mode, the levels are
+    computed as they are displayed. See `napari_defdap._pyramid`.
+
+    With ``profile: true`` (or ``NAPARI_DEFDAP_PROFILE=1``), the wall time
+    and peak memory of each stage of reading each timepoint are recorded
+    in a `StageProfiler` under 'profile' in the metadata, and summarised in
+    the log. ``profile: report.json`` also saves the records to that file.
+    In lazy mode, that report only covers the first timepoint, and is
+    marked as partial: later timepoints are recorded as they are read, and
+    ``metadata['profile'].report()`` updates the report. See
+    `napari_defdap._profiling`.
+
+    With ``compact: true`` (or ``NAPARI_DEFDAP_COMPACT=1``), each
+    timepoint is converted to compact dtypes as soon as it is read, before
+    the timepoints are stacked: the grains use the smallest integer dtype
+    that holds their labels, and the phase uint8. ``compact: float32``
+    also stores the shear as float32, which halves its size. In lazy mode,
+    the grains are still uint32, so that all timepoints share a dtype.
+
+    With ``memmap: true`` (or ``NAPARI_DEFDAP_MEMMAP=1``), the stacked
+    shear, grains and phase arrays are memory-mapped temporary files,
+    which are deleted when the layers are. This only moves the stacks out
+    of memory: the DIC and EBSD maps of every timepoint, with all of their
+    data, are still kept in the metadata, so memory use still grows with
+    the number of timepoints, and series whose maps don't fit in memory
+    need lazy mode. The system's temporary directory is often a tmpfs,
+    itself held in memory, so use ``memmap: some/directory`` to put the
+    files in a directory on disk, relative to the YAML file. Each
+    timepoint is written to its slot as it is read. With ``multiscale``,
+    the lower resolution levels are also memory-mapped, and are computed
+    one timepoint at a time. This has no effect in lazy mode.
+
     Parameters
     ----------
     path : str or list of str
         Path to file, or list of paths.
+    multiscale_output : bool or int, optional
+        Override the ``multiscale`` option of the project. Pass False to
+        always get full resolution arrays, as the batch tools do.
 
     Returns
     -------
@@ -101,48 +545,194 @@ def read_defdap(path):
 
     timepoints = data.get('time', [data])
     n = len(timepoints)
+    workers = _n_workers(data, n)
+    cache = cache_from_config(data)
+    min_grain_size = timepoints[0]['ebsd']['min_grain_size']
+    profiler, report_file = _profiler_from_config(data, directory)
+    compact = _compact_dtype(data)
+    memmap_dir = _memmap_directory(data, directory)
+    metadata = {'project': {'path': os.path.abspath(path), 'data': data}}
+    if profiler is not None:
+        metadata['profile'] = profiler
+    if _get_flag(data, 'lazy') and n > 1:
+        if cache is not None:
+            cache.evict()
+        lazy_timepoints = LazyTimepoints(
+                functools.partial(
+                        _read_timepoint_relabeled,
+                        timepoints=timepoints, directory=directory,
+                        cache=cache, ebsdmaps={}, min_size=min_grain_size,
+                        profiler=profiler, compact=compact,
+                        ),
+                n,
+                )
+        dicmap, ebsdmap, _g, _m, _p, clim = lazy_timepoints[0]
+        grains = lazy_stack(lazy_timepoints, 2, _g)
+        max_shear = lazy_stack(lazy_timepoints, 3, _m)
+        phase = lazy_stack(lazy_timepoints, 4, _p)
+        dicmaps = LazyMaps(lazy_timepoints, 0)
+        ebsdmaps = LazyMaps(lazy_timepoints, 1)
+        clims = LazyMaps(lazy_timepoints, 5)
+    else:
+        timepoint_results = _read_timepoints(
+                timepoints, directory, workers, cache, profiler, compact
+                )
+        dicmaps, ebsdmaps, grains, max_shear, phase, table, histograms = (
+                _stack_timepoints(
+                        timepoint_results, n, min_grain_size, profiler,
+                        memmap_dir,
+                        )
+                )
+        metadata['grain_table'] = table
+        dicmap, ebsdmap = dicmaps[(0,) * (n > 1)], ebsdmaps[(0,) * (n > 1)]
+        clim, clims = _contrast_limits(histograms)
+
+    metadata.update({
+            'dicmap': dicmaps,
+            'ebsdmap': ebsdmaps,
+            'timepoint_contrast_limits': clims,
+            })
+    layer_data = _layer_data(
+            data, max_shear, grains, phase, clim, metadata, dicmap, ebsdmap,
+            multiscale_output=multiscale_output, profiler=profiler,
+            memmap_dir=memmap_dir,
+            )
+    if profiler is not None:
+        profiler.report(report_file)
+    return layer_data
+
+
+def _stack_timepoints(
+        results, n, min_grain_size, profiler=None, memmap_dir=None,
+        ):
+    """Relabel and stack the outputs of `read_timepoint`.
+
+    Parameters
+    ----------
+    results : iterable of tuple
+        The (dicmap, ebsdmap, grains, max_shear, phase) of each timepoint.
+    n : int
+        The number of timepoints. If 1, the arrays are not stacked.
+    min_grain_size : int
+        The minimum size of non-indexed regions to keep.
+    profiler : StageProfiler, optional
+        If given, the time and memory of each stage are recorded in it.
+    memmap_dir : str, optional
+        If given, the stacks are memory-mapped temporary files in this
+        directory. See `_FrameStack`.
+
+    Returns
+    -------
+    dicmaps, ebsdmaps : dict
+        The maps of each timepoint, keyed by (t,), or () if n is 1.
+    grains, max_shear, phase : np.ndarray
+        The stacked arrays.
+    table : pandas.DataFrame
+        The grain table of the stack.
+    histograms : dict
+        The `HistogramQuantiles` of the shear of each timepoint, keyed like
+        ``dicmaps``.
+    """
     dicmaps = {}
     ebsdmaps = {}
-    grains_list = []
-    max_shear_list = []
-    phase_list = []
-    for i, dat in enumerate(timepoints):
-        dicmap, ebsdmap, _g, _m, _p = read_timepoint(dat, directory)
+    grains = _FrameStack(n, memmap_dir)
+    max_shear = _FrameStack(n, memmap_dir)
+    phase = _FrameStack(n, memmap_dir)
+    tables = []
+    histograms = {}
+    for i, (dicmap, ebsdmap, _g, _m, _p) in enumerate(results):
         dicmaps[(i,) * (n > 1)] = dicmap
         ebsdmaps[(i,) * (n > 1)] = ebsdmap
-        grains_list.append(_g)
-        max_shear_list.append(_m)
-        phase_list.append(_p)
-    min_grain_size = timepoints[0]['ebsd']['min_grain_size']
+        with timepoint(profiler, i):
+            with stage(profiler, 'relabel'):
+                _g = _relabel_non_indexed(_g, min_grain_size)
+            with stage(profiler, 'grain_table'):
+                tables.append(grain_table_timepoint(_g, _m, t=i))
+            with stage(profiler, 'contrast_limits'):
+                histograms[(i,) * (n > 1)] = HistogramQuantiles().update(_m)
+            with stage(profiler, 'stack'):
+                grains[i] = _g
+                max_shear[i] = _m
+                phase[i] = _p
     squeeze = 0 if n == 1 else slice(None)
-    grains = _add_non_indexed(
-            np.stack(grains_list), min_size=min_grain_size
-            )[squeeze]
-    max_shear = np.stack(max_shear_list)[squeeze]
-    phase = np.stack(phase_list)[squeeze]
+    grains = grains.array[squeeze]
+    max_shear = max_shear.array[squeeze]
+    phase = phase.array[squeeze]
+    table = pd.concat(tables, ignore_index=True)
+    return dicmaps, ebsdmaps, grains, max_shear, phase, table, histograms
+
+
+def _contrast_limits(histograms):
+    """Return the contrast limits of the whole stack and of each timepoint.
 
+    Parameters
+    ----------
+    histograms : dict
+        The `HistogramQuantiles` of each timepoint, as returned by
+        `_stack_timepoints`.
+
+    Returns
+    -------
+    clim : np.ndarray
+        The 1st and 99th percentiles of the stack.
+    clims : dict
+        The same percentiles for each timepoint, with the same keys as
+        ``histograms``.
+    """
+    total = HistogramQuantiles()
+    for histogram in histograms.values():
+        total.merge(histogram)
+    clims = {key: contrast_limits(histogram)
+             for key, histogram in histograms.items()}
+    return contrast_limits(total), clims
+
+
+def _layer_data(
+        data, max_shear, grains, phase, clim, metadata, dicmap, ebsdmap,
+        multiscale_output=None, profiler=None, memmap_dir=None,
+        ):
+    """Build the LayerData tuples of `read_defdap` from the stacked arrays.
+
+    Each layer's metadata is a copy of ``metadata``, with the name of the
+    layer under 'defdap_layer', so that the layers can be found again when
+    the project is reloaded (see `napari_defdap._reload`). If
+    ``memmap_dir`` is given, the lower resolution levels are memory-mapped
+    in it, like the stacks.
+    """
     ndim = max_shear.ndim
-    clim = np.quantile(max_shear, [0.01, 0.99])
     if clim[1] == clim[0]:
         clim[1] += 1
+    if multiscale_output is None:
+        multiscale_output = _get_option(data, 'multiscale', False)
+    levels = _multiscale_levels(multiscale_output, max_shear.shape)
+    if levels > 1:
+        method = _get_option(data, 'multiscale_labels', 'nearest')
+        with stage(profiler, 'multiscale'):
+            max_shear = multiscale(max_shear, levels, directory=memmap_dir)
+            grains = multiscale(grains, levels, labels=True, method=method,
+                                directory=memmap_dir)
+            phase = multiscale(phase, levels, labels=True, method=method,
+                               directory=memmap_dir)
     # optional kwargs for the corresponding viewer.add_* method
     joint_kwargs = {
             'scale': (1,) * (ndim - 2) + (dicmap.scale, dicmap.scale),
-            'metadata': {'dicmap': dicmaps, 'ebsdmap': ebsdmaps},
             }
     max_shear_kwargs = {
             **joint_kwargs,
+            'metadata': {**metadata, 'defdap_layer': 'max_shear'},
             'contrast_limits': clim,
             'colormap': 'viridis',
             'name': 'max_shear',
             }
     label_kwargs = {
             **joint_kwargs,
+            'metadata': {**metadata, 'defdap_layer': 'grains'},
             'name': 'grains',
             'blending': 'translucent_no_depth',
             }
     phase_kwargs = {
             **joint_kwargs,
+            'metadata': {**metadata, 'defdap_layer': 'phase'},
             'name': 'phase',
             'blending': 'translucent_no_depth',
             'features': {
@@ -156,7 +746,44 @@ def read_defdap(path):
             (phase, phase_kwargs, 'labels'),]
 
 
-def read_timepoint(data, directory):
+def read_ebsd(ebsd_params, directory, profiler=None):
+    """Read an EBSD map and find its grains and their Schmid factors.
+
+    Parameters
+    ----------
+    ebsd_params : dict
+        The ``ebsd`` block of a timepoint's loading parameters.
+    directory : pathlib.Path | str
+        Where to look for the image data files.
+    profiler : StageProfiler, optional
+        If given, the time and memory of each stage are recorded in it.
+
+    Returns
+    -------
+    ebsdmap : defdap.ebsd.Map
+        The processed EBSD map.
+    """
+    ebsd_fn = os.path.join(directory, ebsd_params['file'])
+    with stage(profiler, 'read_ebsd_file'):
+        ebsdmap = ebsd.Map(ebsd_fn)
+    with stage(profiler, 'ebsd_grain_boundaries'):
+        ebsdmap.data.generate(
+            'grain_boundaries',
+            misori_tol=ebsd_params.get('misorientation_tolerance', 10)
+        )
+    # ebsdmap.data.grain_boundaries = ebsdmap.find_boundaries(
+    #         misori_tol=ebsd_params.get('misorientation_tolerance', 10)
+    #         )[0]
+    with stage(profiler, 'ebsd_find_grains'):
+        ebsdmap.find_grains(min_grain_size=ebsd_params['min_grain_size'])
+    # ebsdmap.calcGrainMisOri(calcAxis=False)
+    with stage(profiler, 'schmid_factors'):
+        ebsdmap.calc_average_grain_schmid_factors(
+            load_vector=np.array(ebsd_params['load_vector']))
+    return ebsdmap
+
+
+def read_timepoint(data, directory, ebsdmap=None, profiler=None):
     """Read a single timepoint containing both DIC and EBSD data.
 
     Parameters
@@ -167,6 +794,12 @@ def read_timepoint(data, directory):
         DIC frame.
     directory : pathlib.Path | str
         Where to look for the image data files.
+    ebsdmap : defdap.ebsd.Map, optional
+        An EBSD map already processed with `read_ebsd` from the same ``ebsd``
+        parameters. If given, it is shared with this timepoint instead of
+        being read again.
+    profiler : StageProfiler, optional
+        If given, the time and memory of each stage are recorded in it.
 
     Returns
     -------
@@ -184,34 +817,49 @@ def read_timepoint(data, directory):
     dic_params = data['dic']
     ebsd_params = data['ebsd']
     scale = dic_params['scale']
-    dicmap = hrdic.Map(os.path.join(directory, dic_params['file']))
-    xcrop, ycrop = (crop := dic_params['crop'])['x'], crop['y']
-    dicmap.set_crop(left=xcrop[0], right=xcrop[1],
-                    top=ycrop[0], bottom=ycrop[1])
+    with stage(profiler, 'read_dic_file'):
+        dicmap = hrdic.Map(os.path.join(directory, dic_params['file']))
+    _set_crop(dicmap, dic_params['crop'])
     dicmap.set_scale(scale)
-    ebsd_fn = os.path.join(directory, ebsd_params['file'])
-    ebsdmap = ebsd.Map(ebsd_fn)
-    ebsdmap.data.generate(
-        'grain_boundaries',
-        misori_tol=ebsd_params.get('misorientation_tolerance', 10)
-    )
-    # ebsdmap.data.grain_boundaries = ebsdmap.find_boundaries(
-    #         misori_tol=ebsd_params.get('misorientation_tolerance', 10)
-    #         )[0]
-    ebsdmap.find_grains(min_grain_size=ebsd_params['min_grain_size'])
-    # ebsdmap.calcGrainMisOri(calcAxis=False)
-    ebsdmap.calc_average_grain_schmid_factors(
-        load_vector=np.array(ebsd_params['load_vector']))
+    if ebsdmap is None:
+        ebsdmap = read_ebsd(ebsd_params, directory, profiler=profiler)
+    else:
+        # DefDAP estimates the EBSD-to-DIC transform from the homolog points
+        # of the two frames whenever it is used, so each timepoint needs its
+        # own frame. The shallow copy shares the data, grains and Schmid
+        # factors with the original map.
+        ebsdmap = copy.copy(ebsdmap)
+        ebsdmap.frame = Frame()
     dicmap.frame.homog_points = np.array(dic_params['homolog_points'])
     ebsdmap.frame.homog_points = np.array(ebsd_params['homolog_points'])
-    dicmap.link_ebsd_map(ebsdmap, transform_type=ebsd_params['transform_type'])
-    grains_raw = dicmap.find_grains(
-        algorithm=ebsd_params['find_grains_algorithm']
-    )
+    with stage(profiler, 'link_ebsd_map'):
+        dicmap.link_ebsd_map(
+                ebsdmap, transform_type=ebsd_params['transform_type']
+                )
+    grains, max_shear, phase = _crop_outputs(
+            dicmap, ebsdmap, ebsd_params, profiler
+            )
+    return dicmap, ebsdmap, grains, max_shear, phase
+
+
+def _set_crop(dicmap, crop):
+    xcrop, ycrop = crop['x'], crop['y']
+    dicmap.set_crop(left=xcrop[0], right=xcrop[1],
+                    top=ycrop[0], bottom=ycrop[1])
+
+
+def _crop_outputs(dicmap, ebsdmap, ebsd_params, profiler=None):
+    """Find the grains of a linked DIC map, and crop the output arrays."""
+    with stage(profiler, 'find_grains'):
+        grains_raw = dicmap.find_grains(
+            algorithm=ebsd_params['find_grains_algorithm']
+        )
     # dicmap.data.grains = grains_raw
-    max_shear = np.nan_to_num(dicmap.crop(dicmap.data.max_shear))
+    with stage(profiler, 'max_shear'):
+        max_shear = np.nan_to_num(dicmap.crop(dicmap.data.max_shear))
     grains = dicmap.crop(grains_raw)
-    phase = dicmap.crop(dicmap.warp_to_dic_frame(
-            ebsdmap.data.phase, order=0, preserve_range=True
-            ))
-    return dicmap, ebsdmap, grains, max_shear, phase
+    with stage(profiler, 'warp_phase'):
+        phase = dicmap.crop(dicmap.warp_to_dic_frame(
+                ebsdmap.data.phase, order=0, preserve_range=True
+                ))
+    return grains, max_shear, phase
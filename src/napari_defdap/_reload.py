@@ -0,0 +1,263 @@
+"""Incremental reload of a DefDAP project after its YAML file is edited.
+
+`read_defdap` stores the parsed project under 'project' in the layer
+metadata. `reload_layers` reads the YAML file again, compares each
+timepoint's ``dic`` and ``ebsd`` blocks with the previous ones, and only
+redoes the work affected by the changes:
+
+- 'same': the timepoint is reused as is.
+- 'scale': only the DIC scale changed; the maps are kept and rescaled.
+- 'crop': only the DIC crop (and possibly the scale) changed; the grains
+  and phases are found again in the already parsed and linked DIC map,
+  without reading any file.
+- 'read': the timepoint is read again, reusing the processed EBSD map of
+  the previous load if the EBSD file and its parameters are unchanged.
+
+The existing layers are then updated in place. If other settings of the
+project changed, or the layers were loaded lazily, the whole project is
+read again, and the layers are still updated in place.
+"""
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+import yaml
+from magicgui import magic_factory
+
+from ._cache import cache_from_config
+from ._reader import (
+        _compact_dtype, _compact_result, _contrast_limits, _crop_outputs,
+        _ebsd_key, _layer_data, _memmap_directory, _read_timepoint_cached,
+        _set_crop, _stack_timepoints, read_defdap,
+        )
+from ._pyramid import full_resolution
+
+if TYPE_CHECKING:
+    import napari
+
+_ROLES = ('max_shear', 'grains', 'phase')
+
+
+def _timepoints(data):
+    return data.get('time', [data])
+
+
+def _options(data):
+    """The project settings that are not part of a timepoint."""
+    return {k: v for k, v in data.items() if k not in ('time', 'dic', 'ebsd')}
+
+
+def _without(params, *keys):
+    return {k: v for k, v in params.items() if k not in keys}
+
+
+def timepoint_change(old, new):
+    """Classify the change between two versions of a timepoint's blocks.
+
+    Parameters
+    ----------
+    old, new : dict or None
+        The timepoint, with 'dic' and 'ebsd' blocks. ``old`` is None for a
+        new timepoint.
+
+    Returns
+    -------
+    change : {'same', 'scale', 'crop', 'read'}
+        The least amount of work needed to update the timepoint. 'crop'
+        includes a change of scale, if any.
+    """
+    if old is None:
+        return 'read'
+    if old['dic'] == new['dic'] and old['ebsd'] == new['ebsd']:
+        return 'same'
+    if (old['ebsd'] != new['ebsd']
+            or _without(old['dic'], 'scale', 'crop')
+            != _without(new['dic'], 'scale', 'crop')):
+        return 'read'
+    if old['dic']['crop'] == new['dic']['crop']:
+        return 'scale'
+    return 'crop'
+
+
+def plan_reload(old_data, new_data):
+    """Return the change of each timepoint of ``new_data``, or None.
+
+    None means that the project settings changed (for example, the
+    workers, cache or multiscale options, or the minimum grain size used to
+    label non-indexed regions), so the whole project must be read again.
+    """
+    old_timepoints = _timepoints(old_data)
+    new_timepoints = _timepoints(new_data)
+    if (_options(old_data) != _options(new_data)
+            or (len(old_timepoints) == 1) != (len(new_timepoints) == 1)
+            or old_timepoints[0]['ebsd']['min_grain_size']
+            != new_timepoints[0]['ebsd']['min_grain_size']):
+        return None
+    return [timepoint_change(
+                    old_timepoints[i] if i < len(old_timepoints) else None,
+                    new,
+                    )
+            for i, new in enumerate(new_timepoints)]
+
+
+def _layers_by_role(layers):
+    by_role = {}
+    for layer in layers:
+        role = layer.metadata.get('defdap_layer')
+        if role in _ROLES:
+            by_role[role] = layer
+    missing = set(_ROLES) - set(by_role)
+    if missing:
+        raise ValueError(
+                f'Could not find the {", ".join(sorted(missing))} layer(s) '
+                'of the project.'
+                )
+    return by_role
+
+
+def _frames(layer, n):
+    data = full_resolution(layer)
+    return [data] if n == 1 else [data[t] for t in range(n)]
+
+
+def _rescale_cache_entry(cache, old, new, directory, dicmap, ebsdmap):
+    """Store the cached result of ``old`` under the key of ``new``.
+
+    The scale is part of the cache key, so that the next time the project
+    is opened, the rescaled timepoint is found in the cache. If the entry
+    of ``old`` is missing, the outputs are found again from the maps.
+    """
+    cached = cache.load(cache.key(old, directory))
+    if cached is None:
+        outputs = _crop_outputs(dicmap, ebsdmap, new['ebsd'])
+    else:
+        outputs = cached[2:]
+    cache.save(cache.key(new, directory), (dicmap, ebsdmap, *outputs))
+
+
+def _reload_timepoints(layers, project, new_data, plan):
+    """Update the previous load according to ``plan``; see the module."""
+    path = project['path']
+    directory = os.path.split(path)[0]
+    old_timepoints = _timepoints(project['data'])
+    new_timepoints = _timepoints(new_data)
+    n_old = len(old_timepoints)
+    metadata = layers['grains'].metadata
+    old_dicmaps = metadata['dicmap']
+    old_ebsdmaps = metadata['ebsdmap']
+    old_frames = list(zip(*(_frames(layers[role], n_old)
+                            for role in _ROLES)))
+    cache = cache_from_config(new_data)
+    compact = _compact_dtype(new_data)
+    # processed EBSD maps of the previous load, to share with re-read
+    # timepoints whose EBSD blocks match
+    ebsdmaps = {}
+    for i, old in enumerate(old_timepoints):
+        ebsdmaps.setdefault(
+                _ebsd_key(old['ebsd']), old_ebsdmaps[(i,) * (n_old > 1)]
+                )
+    results = []
+    for i, (change, new) in enumerate(zip(plan, new_timepoints)):
+        if change == 'read':
+            results.append(_read_timepoint_cached(
+                    new, directory, cache, ebsdmaps, compact=compact,
+                    ))
+            continue
+        dicmap = old_dicmaps[(i,) * (n_old > 1)]
+        ebsdmap = old_ebsdmaps[(i,) * (n_old > 1)]
+        if change in ('scale', 'crop'):
+            dicmap.set_scale(new['dic']['scale'])
+        if change == 'crop':
+            _set_crop(dicmap, new['dic']['crop'])
+            grains, max_shear, phase = _crop_outputs(
+                    dicmap, ebsdmap, new['ebsd']
+                    )
+            result = (dicmap, ebsdmap, grains, max_shear, phase)
+            if cache is not None:
+                cache.save(cache.key(new, directory), result)
+            if compact is not None:
+                result = _compact_result(result, compact)
+        else:
+            max_shear, grains, phase = old_frames[i]
+            result = (dicmap, ebsdmap, np.asarray(grains),
+                      np.asarray(max_shear), np.asarray(phase))
+            if change == 'scale' and cache is not None:
+                _rescale_cache_entry(
+                        cache, old_timepoints[i], new, directory, dicmap,
+                        ebsdmap,
+                        )
+        results.append(result)
+    if cache is not None:
+        cache.evict()
+    n = len(new_timepoints)
+    min_grain_size = new_timepoints[0]['ebsd']['min_grain_size']
+    memmap_dir = _memmap_directory(new_data, directory)
+    dicmaps, ebsdmaps, grains, max_shear, phase, table, histograms = (
+            _stack_timepoints(
+                    results, n, min_grain_size, memmap_dir=memmap_dir,
+                    )
+            )
+    clim, clims = _contrast_limits(histograms)
+    new_metadata = {
+            **{k: v for k, v in metadata.items() if k != 'defdap_layer'},
+            'project': {'path': path, 'data': new_data},
+            'dicmap': dicmaps,
+            'ebsdmap': ebsdmaps,
+            'grain_table': table,
+            'timepoint_contrast_limits': clims,
+            }
+    dicmap, ebsdmap = dicmaps[(0,) * (n > 1)], ebsdmaps[(0,) * (n > 1)]
+    return _layer_data(
+            new_data, max_shear, grains, phase, clim, new_metadata, dicmap,
+            ebsdmap, memmap_dir=memmap_dir,
+            )
+
+
+def _update_layers(layers, layer_data):
+    """Update the layers in place with new LayerData tuples."""
+    for data, kwargs, _ in layer_data:
+        layer = layers[kwargs['metadata']['defdap_layer']]
+        # metadata first: listeners to data events, like GrainPlots, read it
+        layer.metadata = kwargs['metadata']
+        layer.data = data
+        layer.scale = kwargs['scale']
+        if 'contrast_limits' in kwargs:
+            layer.contrast_limits = kwargs['contrast_limits']
+        if 'features' in kwargs:
+            layer.features = kwargs['features']
+
+
+def reload_layers(layers):
+    """Reload the DefDAP project of ``layers`` and update them in place.
+
+    Parameters
+    ----------
+    layers : list of napari.layers.Layer
+        Layers including the max_shear, grains and phase layers read from
+        a .defdap.yml file by `read_defdap`.
+
+    Returns
+    -------
+    plan : list of str or None
+        The change of each timepoint (see `timepoint_change`), or None if
+        the whole project was read again.
+    """
+    layers = _layers_by_role(layers)
+    project = layers['grains'].metadata['project']
+    with open(project['path']) as fin:
+        new_data = yaml.safe_load(fin)
+    plan = plan_reload(project['data'], new_data)
+    lazy = not isinstance(full_resolution(layers['grains']), np.ndarray)
+    if plan is None or lazy:
+        layer_data = read_defdap(project['path'])
+        plan = None
+    else:
+        layer_data = _reload_timepoints(layers, project, new_data, plan)
+    _update_layers(layers, layer_data)
+    return plan
+
+
+@magic_factory(call_button='Reload project')
+def reload_project(viewer: 'napari.viewer.Viewer'):
+    """Reload the DefDAP project displayed in the viewer after editing it."""
+    reload_layers(list(viewer.layers))
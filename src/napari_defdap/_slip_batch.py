@@ -0,0 +1,313 @@
+"""Batch slip band angle analysis over all grains and timepoints.
+
+`slip_band_angles` computes the radon profile of every grain of every
+timepoint, as `compute_radon` does. The grains of each timepoint are
+thresholded and median filtered together (see `ThresholdedFrame`), then
+their radon transforms are computed in blocks in a process pool. Each block
+is written to its own file in the output directory as soon as it is done,
+so an interrupted run can be resumed by calling it again with the same
+arguments: blocks that are already on disk are skipped. The manifest of the
+output directory records the parameters, the shape and dtypes of the
+input, and a hash of the grain table and max shear of each timepoint, so
+that results are never resumed from a different input.
+
+The same engine is available from the command line::
+
+    napari-defdap-slipbands project.defdap.yml results/ --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+
+from ._features import grain_table_timepoint, split_by_timepoint
+from ._reader import read_defdap
+from ._slips import ThresholdedFrame, sb_angle
+
+_MANIFEST = 'manifest.json'
+_BBOX = ['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']
+
+
+def find_profile_peaks(profile, prominence=0.1):
+    """Find the peaks of a periodic radon profile.
+
+    Parameters
+    ----------
+    profile : np.ndarray of float, shape (n_angles,)
+        The maximum of the radon transform at each angle, covering 180°.
+    prominence : float
+        The minimum prominence of a peak, as a fraction of the profile
+        maximum.
+
+    Returns
+    -------
+    peaks : np.ndarray of int
+        The indices of the peaks in ``profile``.
+    """
+    n = len(profile)
+    tiled = np.concatenate([profile] * 3)
+    peaks, _ = find_peaks(tiled, prominence=prominence * np.max(profile))
+    return peaks[(peaks >= n) & (peaks < 2 * n)] - n
+
+
+def _analyse_block(filename, t, labels, crops, engine, prominence):
+    """Compute and save the profiles and peaks of one block of grains."""
+    profiles = np.stack(
+            [sb_angle(crop, engine=engine) for crop in crops]
+            ).astype(np.float32)
+    peaks = [find_profile_peaks(p, prominence) for p in profiles]
+    n_angles = profiles.shape[1]
+    directory = os.path.dirname(filename)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            np.savez(
+                    fout,
+                    t=np.full(len(crops), t, dtype=np.int32),
+                    label=labels,
+                    profile=profiles,
+                    peak_offsets=np.cumsum([0] + [len(p) for p in peaks]),
+                    peak_angles=np.concatenate(peaks) * (180 / n_angles),
+                    )
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return filename
+
+
+def _remove_partial(out_dir):
+    """Remove the temporary files of blocks left by a killed run."""
+    for fn in os.listdir(out_dir):
+        if fn.endswith('.tmp'):
+            os.remove(os.path.join(out_dir, fn))
+
+
+def _timepoint_digest(table, shear):
+    """Hash the grain table and max shear of one timepoint."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(
+            table[['label'] + _BBOX].to_numpy(np.int64)
+            ).data)
+    digest.update(np.ascontiguousarray(shear).data)
+    return digest.hexdigest()
+
+
+def _write_manifest(out_dir, manifest):
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as fout:
+        json.dump(manifest, fout, indent=2)
+    os.replace(tmp, os.path.join(out_dir, _MANIFEST))
+
+
+def _check_manifest(out_dir, params, inputs):
+    """Return the manifest of ``out_dir``, creating it if needed.
+
+    Raises a ValueError if the directory holds results computed with
+    different parameters or from an input of a different shape or dtype.
+    """
+    manifest = {'params': params, 'input': inputs, 'timepoints': {}}
+    filename = os.path.join(out_dir, _MANIFEST)
+    if not os.path.exists(filename):
+        _write_manifest(out_dir, manifest)
+        return manifest
+    with open(filename) as fin:
+        previous = json.load(fin)
+    for key, name in [('params', 'parameters'), ('input', 'input')]:
+        if previous.get(key) != manifest[key]:
+            raise ValueError(
+                    f'{out_dir} contains results computed with different '
+                    f'{name}: {previous.get(key)}. Use a new output '
+                    'directory to compute them again.'
+                    )
+    manifest['timepoints'] = previous['timepoints']
+    return manifest
+
+
+def _check_timepoint(out_dir, manifest, t, digest):
+    """Record the input digest of timepoint ``t``, or check it.
+
+    The digest is written before any block of the timepoint, so every
+    block on disk was computed from the recorded input.
+    """
+    previous = manifest['timepoints'].get(str(t))
+    if previous is None:
+        manifest['timepoints'][str(t)] = digest
+        _write_manifest(out_dir, manifest)
+    elif previous != digest:
+        raise ValueError(
+                f'{out_dir} contains results of timepoint {t} computed '
+                'from a different grain table or max shear. Use a new '
+                'output directory to compute them again.'
+                )
+
+
+def slip_band_angles(
+        grains, shear, out_dir, *, table=None, workers=None, block_size=256,
+        prominence=0.1, threshold_multiplier=1.6, minimum_threshold=0.013,
+        engine='skimage',
+        ):
+    """Compute slip band angle profiles of every grain in every timepoint.
+
+    Parameters
+    ----------
+    grains : array of int, shape (T, M, N) or (M, N)
+        The grains stack, such as the data of the grains layer.
+    shear : array of float, same shape as ``grains``
+        The max shear stack.
+    out_dir : str
+        Directory in which to write the results. If it contains results from
+        a previous, interrupted run with the same parameters and input, the
+        run is resumed. If the parameters or input differ, a ValueError is
+        raised.
+    table : pandas.DataFrame, optional
+        The grain table of ``grains`` (see `napari_defdap._features`). It is
+        computed one timepoint at a time if not given.
+    workers : int, optional
+        The number of worker processes. Defaults to the number of CPUs.
+    block_size : int
+        The number of grains per output file.
+    prominence : float
+        The minimum peak prominence as a fraction of the profile maximum.
+    threshold_multiplier, minimum_threshold : float
+        Passed on to `grain_thresholds`.
+    engine : {'skimage', 'projection'}
+        The radon engine, passed on to `sb_angle`.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        The results, as returned by `load_results`.
+    profiles : np.ndarray of float, shape (n_grains, n_angles)
+        The profiles, in the same order as ``table``.
+    """
+    if grains.ndim == 2:
+        grains, shear = grains[np.newaxis], shear[np.newaxis]
+    n_timepoints = grains.shape[0]
+    radon_kwargs = {'threshold_multiplier': threshold_multiplier,
+                    'minimum_threshold': minimum_threshold,
+                    'engine': engine}
+    params = {'block_size': block_size, 'prominence': prominence,
+              **radon_kwargs}
+    inputs = {'shape': list(grains.shape),
+              'grains_dtype': str(grains.dtype),
+              'shear_dtype': str(shear.dtype)}
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _check_manifest(out_dir, params, inputs)
+    _remove_partial(out_dir)
+    tables = ([None] * n_timepoints if table is None
+              else split_by_timepoint(table, n_timepoints))
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for t, table_t in enumerate(tables):
+            grains_t = np.asarray(grains[t])
+            shear_t = np.asarray(shear[t])
+            if table_t is None:
+                table_t = grain_table_timepoint(grains_t, t=t)
+            _check_timepoint(
+                    out_dir, manifest, t, _timepoint_digest(table_t, shear_t)
+                    )
+            labels = table_t['label'].to_numpy()
+            bboxes = table_t[_BBOX].to_numpy()
+            frame = ThresholdedFrame(
+                    grains_t, shear_t, threshold_multiplier, minimum_threshold
+                    )
+            for b, start in enumerate(range(0, len(labels), block_size)):
+                filename = os.path.join(out_dir, f't{t:05d}_b{b:05d}.npz')
+                if os.path.exists(filename):
+                    continue
+                block = slice(start, start + block_size)
+                crops = frame.crops(labels[block], bboxes[block])
+                # bound the number of blocks held in memory
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(
+                        _analyse_block,
+                        filename, t, labels[block], crops, engine,
+                        prominence,
+                        ))
+        for future in pending:
+            future.result()
+    return load_results(out_dir)
+
+
+def load_results(out_dir):
+    """Load the output of `slip_band_angles`.
+
+    Parameters
+    ----------
+    out_dir : str
+        The output directory of `slip_band_angles`.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        One row per grain with columns 't', 'label' and 'peak_angles' (an
+        array of angles, in degrees, for each grain).
+    profiles : np.ndarray of float, shape (n_grains, n_angles)
+        The radon profile of each grain, in the same order as ``table``.
+    """
+    filenames = sorted(fn for fn in os.listdir(out_dir) if fn.endswith('.npz'))
+    ts, labels, profiles, peak_angles = [], [], [], []
+    for fn in filenames:
+        with np.load(os.path.join(out_dir, fn)) as block:
+            ts.append(block['t'])
+            labels.append(block['label'])
+            profiles.append(block['profile'])
+            peak_angles.extend(np.split(
+                    block['peak_angles'], block['peak_offsets'][1:-1]
+                    ))
+    if not filenames:
+        table = pd.DataFrame({'t': [], 'label': [], 'peak_angles': []})
+        return table, np.zeros((0, 0), dtype=np.float32)
+    table = pd.DataFrame({
+            't': np.concatenate(ts),
+            'label': np.concatenate(labels),
+            'peak_angles': peak_angles,
+            })
+    return table, np.concatenate(profiles)
+
+
+def main(argv=None):
+    """Command line entry point for `slip_band_angles`."""
+    parser = argparse.ArgumentParser(
+            description='Compute slip band angle profiles for every grain '
+                        'in every timepoint of a DefDAP project.'
+            )
+    parser.add_argument('project', help='The .defdap.yml project file.')
+    parser.add_argument('out_dir', help='The output directory.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--prominence', type=float, default=0.1)
+    parser.add_argument('--threshold-multiplier', type=float, default=1.6)
+    parser.add_argument('--minimum-threshold', type=float, default=0.013)
+    parser.add_argument(
+            '--engine', choices=('skimage', 'projection'), default='skimage'
+            )
+    args = parser.parse_args(argv)
+    (shear, shear_kwargs, _), (grains, _, _), _ = read_defdap(
+            args.project, multiscale_output=False
+            )
+    slip_band_angles(
+            grains, shear, args.out_dir,
+            table=shear_kwargs['metadata'].get('grain_table'),
+            workers=args.workers,
+            block_size=args.block_size,
+            prominence=args.prominence,
+            threshold_multiplier=args.threshold_multiplier,
+            minimum_threshold=args.minimum_threshold,
+            engine=args.engine,
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,96 @@
+import weakref
+
 import numpy as np
 import pandas as pd
 from scipy import ndimage
 from skimage.transform import radon
 from skimage import filters
 
+from ._features import _flat_labels, grain_table_timepoint
+
+_BBOX = ['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']
+
+
+def projection_max(image, theta, max_block_size=2**22):
+    """Compute the maximum of the radon transform of an image at each angle.
+
+    Instead of rotating the whole (padded) image for every angle, as
+    `skimage.transform.radon` does, this projects the coordinates of the
+    nonzero pixels onto each angle's axis and accumulates them into
+    linearly-interpolated bins with `np.bincount`. This is much faster for
+    sparse images such as thresholded shear maps.
+
+    Parameters
+    ----------
+    image : numpy ndarray, shape (M, N)
+        The input image.
+    theta : array of float
+        The projection angles, in degrees, with the same convention as
+        `skimage.transform.radon`.
+    max_block_size : int
+        The maximum number of (pixel, angle) pairs processed at once, which
+        bounds the memory used.
+
+    Returns
+    -------
+    profile : numpy ndarray of float, shape (len(theta),)
+        The maximum of the projection at each angle.
+    """
+    rows, cols = np.nonzero(image)
+    weights = np.asarray(image[rows, cols], dtype=float)
+    y = rows - (image.shape[0] - 1) / 2
+    x = cols - (image.shape[1] - 1) / 2
+    half = int(np.ceil(np.hypot(*image.shape) / 2)) + 1
+    n_bins = 2 * half + 2
+    angles = np.deg2rad(theta)
+    profile = np.zeros(len(angles))
+    if len(weights) == 0:
+        return profile
+    block = max(1, max_block_size // len(weights))
+    for start in range(0, len(angles), block):
+        a = angles[start:start + block]
+        size = len(a) * n_bins
+        position = np.outer(x, np.cos(a)) - np.outer(y, np.sin(a)) + half
+        lower = np.floor(position)
+        upper_weight = position - lower
+        idx = (lower.astype(np.intp) + np.arange(len(a)) * n_bins).ravel()
+        sums = np.bincount(
+                idx, weights=(weights[:, None] * (1 - upper_weight)).ravel(),
+                minlength=size + 1,
+                )
+        sums[1:] += np.bincount(
+                idx, weights=(weights[:, None] * upper_weight).ravel(),
+                minlength=size,
+                )
+        profile[start:start + len(a)] = sums[:size].reshape(
+                len(a), n_bins
+                ).max(axis=1)
+    return profile
+
+
+def _refined_projection_max(image, theta, coarse_step):
+    """Evaluate `projection_max` coarsely, then refine around the peaks.
+
+    The profile is computed at every ``coarse_step``-th angle of ``theta``,
+    linearly interpolated (periodically, over 180°) to all of ``theta``,
+    then computed exactly within ``coarse_step`` angles of every local
+    maximum of the coarse profile.
+    """
+    coarse_theta = theta[::coarse_step]
+    coarse = projection_max(image, coarse_theta)
+    profile = np.interp(theta, coarse_theta, coarse, period=180)
+    peaks = np.flatnonzero(
+            (coarse >= np.roll(coarse, 1)) & (coarse >= np.roll(coarse, -1))
+            )
+    near = (peaks[:, None] * coarse_step
+            + np.arange(-coarse_step + 1, coarse_step)) % len(theta)
+    near = np.unique(near)
+    profile[near] = projection_max(image, theta[near])
+    return profile
+
 
-def sb_angle(shear_map, threshold=None, median_filter=None):
+def sb_angle(shear_map, threshold=None, median_filter=None, *,
+             engine='skimage', n_angles=180, coarse_step=None):
     """Compute slip band angles based on shear map.
 
     Uses a threshold to reduce noise, optionally followed by a median filter,
@@ -20,8 +105,16 @@ def sb_angle(shear_map, threshold=None, median_filter=None):
     median_filter : int or None
         The size of the median filter to apply for denoising. None means no
         median filter is applied.
-    plot : bool or str
-        False, or a path to a file in which to save the plot.
+    engine : {'skimage', 'projection'}
+        Compute the full radon transform with `skimage.transform.radon`, or
+        only its maximum at each angle with `projection_max`, which is
+        faster and gives a close approximation.
+    n_angles : int
+        The number of angles, evenly spaced over 180°, at which to compute
+        the profile.
+    coarse_step : int, optional
+        With the 'projection' engine, compute the profile at every
+        ``coarse_step``-th angle only, and refine it near the peaks.
 
     Returns
     -------
@@ -39,24 +132,474 @@ def sb_angle(shear_map, threshold=None, median_filter=None):
         shear_map_filt = ndimage.median_filter(shear_map_filt,
                                                size=median_filter)
 
-    sin_map = radon(shear_map_filt, circle=False)
-    profile_filt = np.max(sin_map, axis=0)
+    theta = np.arange(n_angles) * (180 / n_angles)
+    if engine == 'skimage':
+        sin_map = radon(shear_map_filt, theta=theta, circle=False)
+        profile_filt = np.max(sin_map, axis=0)
+    elif engine == 'projection':
+        if coarse_step is not None and coarse_step > 1:
+            profile_filt = _refined_projection_max(
+                    shear_map_filt, theta, coarse_step
+                    )
+        else:
+            profile_filt = projection_max(shear_map_filt, theta)
+    else:
+        raise ValueError(
+                f"engine must be 'skimage' or 'projection', got {engine!r}"
+                )
 
     return profile_filt.tolist()
 
 
 def compute_radon(regionprop, threshold_func=filters.threshold_mean,
-                  threshold_multiplier=1.6, minimum_threshold=0.013):
-    grain_map = regionprop.intensity_image
-    grain_map[~regionprop.image] = np.nan
+                  threshold_multiplier=1.6, minimum_threshold=0.013,
+                  **sb_angle_kwargs):
+    grain_map = np.where(
+            regionprop.image, regionprop.intensity_image, np.nan
+            )
     values = grain_map[np.isfinite(grain_map)]
     threshold_value = max(threshold_multiplier * threshold_func(values),
                           minimum_threshold)
     angle_list = sb_angle(grain_map, threshold=threshold_value,
-                          median_filter=3)
+                          median_filter=3, **sb_angle_kwargs)
     return np.asarray(angle_list)
 
 
+def grain_thresholds(grains, shear, threshold_multiplier=1.6,
+                     minimum_threshold=0.013):
+    """Compute the slip band threshold of every grain of a timepoint.
+
+    This is the threshold used by `compute_radon` with the default
+    `skimage.filters.threshold_mean`, computed for all grains at once from
+    labelled sums of the shear.
+
+    Parameters
+    ----------
+    grains : np.ndarray of int, shape (M, N)
+        The grain labels. Labels <= 0 are ignored.
+    shear : np.ndarray of float, shape (M, N)
+        The max shear map.
+    threshold_multiplier, minimum_threshold : float
+        The threshold of a grain is the mean of its finite shear values
+        times ``threshold_multiplier``, but at least ``minimum_threshold``.
+
+    Returns
+    -------
+    thresholds : np.ndarray of float, shape (grains.max() + 1,)
+        The threshold of each label, NaN for labels without finite values.
+    """
+    flat = _flat_labels(np.asarray(grains))
+    shear = np.asarray(shear, dtype=float).ravel()
+    finite = np.isfinite(shear)
+    count = np.bincount(flat[finite])
+    total = np.bincount(flat[finite], weights=shear[finite],
+                        minlength=len(count))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+    thresholds = np.maximum(threshold_multiplier * mean, minimum_threshold)
+    thresholds[count == 0] = np.nan
+    return np.pad(thresholds, (0, flat.max(initial=0) + 1 - len(thresholds)),
+                  constant_values=np.nan)
+
+
+def _reflect(index, size):
+    """Map indices into [0, size) as `ndimage` does with mode='reflect'."""
+    if np.all(index >= 0) and np.all(index < size):
+        return index
+    index = index % (2 * size)
+    return np.where(index < size, index, 2 * size - 1 - index)
+
+
+def _window_count(padded, values, size):
+    """Count the pixels of each window of ``padded`` equal to ``values``."""
+    shape = (padded.shape[0] - size + 1, padded.shape[1] - size + 1)
+    count = np.zeros(shape, dtype=np.uint8 if size < 16 else np.intp)
+    for dr in range(size):
+        for dc in range(size):
+            count += padded[dr:dr + shape[0], dc:dc + shape[1]] == values
+    return count
+
+
+class ThresholdedFrame:
+    """The thresholded, median filtered grains of a whole timepoint.
+
+    `compute_radon` thresholds each grain at its own threshold (see
+    `grain_thresholds`), sets the rest of its crop to NaN, and median
+    filters the crop. For all the grains at once, this thresholds the
+    frame, and computes its median filter as the label of the grain whose
+    thresholded pixels fill most of each window (which is the median of a
+    binary window). Crops of this frame are the same as the crops filtered
+    one by one, except near the crop edges, which are reflected rather than
+    extended with their surroundings; `crops` recomputes the pixels there.
+
+    Parameters
+    ----------
+    grains : np.ndarray of int, shape (M, N)
+        The grain labels. Labels <= 0 are ignored.
+    shear : np.ndarray of float, shape (M, N)
+        The max shear map.
+    threshold_multiplier, minimum_threshold : float
+        See `grain_thresholds`.
+    median_filter : int or None
+        The size of the median filter, which must be odd. None means no
+        filtering.
+
+    Attributes
+    ----------
+    codes : np.ndarray of int, shape (M, N)
+        The label of each pixel above its grain's threshold, 0 elsewhere.
+    filtered : np.ndarray of int, shape (M, N)
+        The label of the grain in the majority of each pixel's window, 0
+        if there is none.
+    """
+    def __init__(self, grains, shear, threshold_multiplier=1.6,
+                 minimum_threshold=0.013, median_filter=3):
+        grains = np.asarray(grains)
+        labels = _flat_labels(grains).reshape(grains.shape)
+        thresholds = grain_thresholds(
+                grains, shear, threshold_multiplier, minimum_threshold
+                )
+        with np.errstate(invalid='ignore'):
+            above = np.asarray(shear) > thresholds[labels]
+        self.codes = np.where(above & (labels > 0), labels, 0)
+        self.size = median_filter or 1
+        if self.size % 2 == 0:
+            raise ValueError(
+                    f'median_filter must be odd, got {median_filter}'
+                    )
+        self.needed = (self.size * self.size + 1) // 2
+        radius = self.size // 2
+        padded = np.pad(self.codes, radius)
+        own = _window_count(padded, labels, self.size)
+        own[labels == 0] = 0
+        self._coded = _window_count(padded, 0, self.size)
+        self._coded = self.size * self.size - self._coded
+        self.filtered = np.where(own >= self.needed, labels, 0)
+        # pixels in the majority of the window of another grain are rare,
+        # so their median is computed from their sorted windows
+        others = np.flatnonzero(self._coded - own >= self.needed)
+        rows, cols = np.divmod(others, self.codes.shape[1])
+        window = np.stack([padded[rows + dr, cols + dc]
+                           for dr in range(self.size)
+                           for dc in range(self.size)], axis=1)
+        median = np.sort(window, axis=1)[:, self.needed - 1]
+        majority = (window == median[:, None]).sum(axis=1) >= self.needed
+        self.filtered.ravel()[others[majority]] = median[majority]
+
+    def _edges(self, labels, bboxes):
+        """Recompute the crop edges that may be True, reflecting the crops.
+
+        Returns the crop, row, column and value of the edge pixels that
+        differ from the filtered frame, sorted by crop.
+        """
+        radius = self.size // 2
+        heights = bboxes[:, 2] - bboxes[:, 0]
+        widths = bboxes[:, 3] - bboxes[:, 1]
+        index = np.arange(len(bboxes))
+        strips = []
+        for rows, cols in [
+                (np.minimum(radius, heights), widths),  # top
+                (np.minimum(radius, heights), widths),  # bottom
+                (heights, np.minimum(radius, widths)),  # left
+                (heights, np.minimum(radius, widths)),  # right
+                ]:
+            n = rows * cols
+            crop = np.repeat(index, n)
+            pixel = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+            row, col = np.divmod(pixel, cols[crop])
+            strips.append([crop, row, col])
+        strips[1][1] = heights[strips[1][0]] - 1 - strips[1][1]
+        strips[3][2] = widths[strips[3][0]] - 1 - strips[3][2]
+        crop, row, col = (np.concatenate(a) for a in zip(*strips))
+        # reflection counts a pixel at most twice along each axis if the
+        # crop is wider than the filter radius; a crop side of at most the
+        # radius can be reflected onto the same pixel up to size times
+        repeats = np.where(
+                np.minimum(heights, widths) > radius, 4, self.size ** 2
+                )
+        n_cols = self.codes.shape[1]
+        top, left = bboxes[crop, 0], bboxes[crop, 1]
+        position = (top + row) * n_cols + left + col
+        keep = self._coded.ravel()[position] * repeats[crop] >= self.needed
+        crop, row, col = crop[keep], row[keep], col[keep]
+        top, left, position = top[keep], left[keep], position[keep]
+        label = labels[crop]
+        heights, widths = heights[crop], widths[crop]
+        flat_codes = self.codes.ravel()
+        cols = [_reflect(col + dc, widths)
+                for dc in range(-radius, radius + 1)]
+        count = np.zeros(len(crop), dtype=np.intp)
+        for dr in range(-radius, radius + 1):
+            r = (top + _reflect(row + dr, heights)) * n_cols + left
+            for c in cols:
+                count += flat_codes[r + c] == label
+        value = count >= self.needed
+        differ = value != (self.filtered.ravel()[position] == label)
+        order = np.argsort(crop[differ], kind='stable')
+        return tuple(a[differ][order] for a in (crop, row, col, value))
+
+    def crops(self, labels, bboxes):
+        """Crop the filtered, thresholded grains.
+
+        Parameters
+        ----------
+        labels : array of int, shape (n,)
+            The labels of the grains to crop.
+        bboxes : array of int, shape (n, 4)
+            The bounding box of each grain, as in the grain table.
+
+        Returns
+        -------
+        crops : list of np.ndarray of bool
+            The crop of each grain, the same as the thresholded, median
+            filtered crop of `compute_radon`.
+        """
+        labels = np.asarray(labels)
+        bboxes = np.asarray(bboxes, dtype=np.intp).reshape((len(labels), 4))
+        if self.size > 1:
+            crop, row, col, value = self._edges(labels, bboxes)
+        else:
+            crop = row = col = value = np.zeros(0, dtype=np.intp)
+        split = np.searchsorted(crop, np.arange(len(labels) + 1))
+        crops = []
+        for i, (lab, (r0, c0, r1, c1)) in enumerate(zip(labels, bboxes)):
+            image = self.filtered[r0:r1, c0:c1] == lab
+            if split[i + 1] > split[i]:
+                fix = slice(split[i], split[i + 1])
+                image[row[fix], col[fix]] = value[fix]
+            crops.append(image)
+        return crops
+
+
+def radon_timepoint(grains, shear, table=None, *, threshold_multiplier=1.6,
+                    minimum_threshold=0.013, median_filter=3,
+                    **sb_angle_kwargs):
+    """Compute the radon profiles of all the grains of a timepoint.
+
+    This gives the same profiles as calling `compute_radon` on each grain,
+    but thresholds and median filters all the grains together (see
+    `ThresholdedFrame`). Only the radon transform is computed one grain at
+    a time.
+
+    Parameters
+    ----------
+    grains : np.ndarray of int, shape (M, N)
+        The grain labels. Labels <= 0 are ignored.
+    shear : np.ndarray of float, shape (M, N)
+        The max shear map.
+    table : pandas.DataFrame, optional
+        The grain table, or the rows of the grains to analyse (see
+        `napari_defdap._features.grain_table_timepoint`). Defaults to all
+        the grains.
+    threshold_multiplier, minimum_threshold : float
+        See `grain_thresholds`.
+    median_filter : int or None
+        The size of the median filter.
+    **sb_angle_kwargs
+        Passed on to `sb_angle`, for example the radon engine.
+
+    Returns
+    -------
+    profiles : np.ndarray of float, shape (n_grains, n_angles)
+        The profile of each grain, in the order of ``table``.
+    """
+    grains = np.asarray(grains)
+    if table is None:
+        table = grain_table_timepoint(grains)
+    frame = ThresholdedFrame(
+            grains, shear, threshold_multiplier, minimum_threshold,
+            median_filter,
+            )
+    crops = frame.crops(table['label'].to_numpy(), table[_BBOX].to_numpy())
+    n_angles = sb_angle_kwargs.get('n_angles', 180)
+    profiles = np.empty((len(crops), n_angles))
+    for i, crop in enumerate(crops):
+        profiles[i] = sb_angle(crop, **sb_angle_kwargs)
+    return profiles
+
+
+# colours of the slip trace lines of each plane, in the order of the planes
+# of the phase, repeating if there are more planes than colours
+PLANE_COLORS = ('blue', 'green', 'red', 'purple', 'orange', 'brown', 'pink',
+                'gray', 'olive', 'cyan')
+
+# dicmap -> (its grain list, SlipSystemTable), rebuilt when grains change
+_slip_tables = weakref.WeakKeyDictionary()
+
+
+def _rotation_matrices(quat_coefs):
+    """Rotation matrices of an (n, 4) array of quaternion coefficients.
+
+    ``R[i] @ v`` is ``Quat(*quat_coefs[i]).transform_vector(v)``, see
+    `defdap.quat.Quat.rot_matrix`.
+    """
+    q0, q1, q2, q3 = np.moveaxis(np.asarray(quat_coefs, dtype=float), -1, 0)
+    qbar = q0**2 - q1**2 - q2**2 - q3**2
+    return np.stack([
+            np.stack([qbar + 2 * q1**2, 2 * (q1*q2 - q0*q3),
+                      2 * (q1*q3 + q0*q2)], axis=-1),
+            np.stack([2 * (q1*q2 + q0*q3), qbar + 2 * q2**2,
+                      2 * (q2*q3 - q0*q1)], axis=-1),
+            np.stack([2 * (q1*q3 - q0*q2), 2 * (q2*q3 + q0*q1),
+                      qbar + 2 * q3**2], axis=-1),
+            ], axis=-2)
+
+
+def slip_trace_angles(quat_coefs, plane_normals):
+    """Slip trace angles of each plane in each grain, in degrees.
+
+    This is a vectorised `defdap.ebsd.Grain.calc_slip_traces`: the angle
+    of the intersection of each slip plane with the sample surface,
+    counter clockwise from vertical.
+
+    Parameters
+    ----------
+    quat_coefs : np.ndarray of float, shape (n, 4)
+        The average orientation of each grain.
+    plane_normals : np.ndarray of float, shape (m, 3)
+        The slip plane normals, in crystal coordinates.
+
+    Returns
+    -------
+    angles : np.ndarray of float, shape (n, m)
+        The trace angles, in [0, 180].
+    """
+    rot = _rotation_matrices(quat_coefs)
+    # the screen plane normal (0, 0, 1) in crystal coordinates
+    screen_normal = rot[:, :, 2]
+    crystal = np.cross(screen_normal[:, np.newaxis, :],
+                       np.asarray(plane_normals, dtype=float)[np.newaxis])
+    # back to sample coordinates, with the transposed rotation
+    sample = np.einsum('nji,nmj->nmi', rot, crystal)
+    sample /= np.linalg.norm(sample, axis=-1, keepdims=True)
+    sample[sample[..., 0] > 0] *= -1
+    return np.rad2deg(np.arccos(np.clip(sample[..., 1], -1, 1)))
+
+
+class SlipSystemTable:
+    """Slip planes, Schmid factors and trace angles of all grains of a map.
+
+    The values are stored in arrays with one row per DIC grain and one
+    column per slip plane, padded with NaN for grains whose phase has
+    fewer planes than the others, so that looking up a grain is cheap and
+    any number of planes is supported.
+
+    Parameters
+    ----------
+    dicmap : defdap.hrdic.Map
+        A DIC map linked to a processed EBSD map, with its grains found.
+
+    Attributes
+    ----------
+    phases : list of defdap.crystal.Phase
+        The phases of the grains.
+    phase_index : np.ndarray of int, shape (n_grains,)
+        The index in `phases` of each grain's phase, -1 for grains without
+        an EBSD grain or slip systems.
+    plane_labels : list of list of str
+        The slip plane labels of each phase.
+    sf : np.ndarray of float, shape (n_grains, max_planes)
+        The maximum average Schmid factor of the slip systems of each plane.
+    angle_deg : np.ndarray of float, shape (n_grains, max_planes)
+        The slip trace angle of each plane, in degrees.
+    """
+    def __init__(self, dicmap):
+        ebsd_grains = [grain.ebsd_grain for grain in dicmap.grains]
+        n = len(ebsd_grains)
+        self.phases = []
+        self.plane_labels = []
+        self.phase_index = np.full(n, -1, dtype=np.intp)
+        phase_ids = {}
+        for i, ebsd_grain in enumerate(ebsd_grains):
+            phase = getattr(ebsd_grain, 'phase', None)
+            if phase is None or phase.slip_systems is None:
+                continue
+            if id(phase) not in phase_ids:
+                phase_ids[id(phase)] = len(self.phases)
+                self.phases.append(phase)
+                self.plane_labels.append([group[0].slip_plane_label
+                                          for group in phase.slip_systems])
+            self.phase_index[i] = phase_ids[id(phase)]
+        max_planes = max(map(len, self.plane_labels), default=0)
+        self.sf = np.full((n, max_planes), np.nan)
+        self.angle_deg = np.full((n, max_planes), np.nan)
+        for p, phase in enumerate(self.phases):
+            rows = np.flatnonzero(self.phase_index == p)
+            m = len(phase.slip_systems)
+            quats = []
+            for i in rows:
+                ebsd_grain = ebsd_grains[i]
+                if ebsd_grain.ref_ori is None:
+                    ebsd_grain.calc_average_ori()
+                quats.append(ebsd_grain.ref_ori.quat_coef)
+                if ebsd_grain.average_schmid_factors is not None:
+                    self.sf[i, :m] = [max(group) for group in
+                                      ebsd_grain.average_schmid_factors]
+            normals = [group[0].slip_plane for group in phase.slip_systems]
+            self.angle_deg[rows, :m] = slip_trace_angles(
+                    np.reshape(quats, (-1, 4)), normals
+                    )
+
+    def __len__(self):
+        return len(self.phase_index)
+
+    def n_planes(self, grain_id):
+        """The number of slip planes of grain ``grain_id``."""
+        p = self.phase_index[grain_id]
+        return 0 if p < 0 else len(self.plane_labels[p])
+
+    def grain(self, grain_id):
+        """The slip systems of grain ``grain_id`` (0-based), by plane.
+
+        Returns
+        -------
+        slip_systems : dict of np.ndarray
+            With keys 'slip_plane' (numbered from 1), 'sp_label', 'sf',
+            'angle_deg' and 'color', each with one element per plane.
+        """
+        m = self.n_planes(grain_id)
+        labels = self.plane_labels[self.phase_index[grain_id]] if m else []
+        return {
+                'slip_plane': np.arange(1, m + 1),
+                'sp_label': np.asarray(labels, dtype=object),
+                'sf': self.sf[grain_id, :m],
+                'angle_deg': self.angle_deg[grain_id, :m],
+                'color': np.asarray([PLANE_COLORS[i % len(PLANE_COLORS)]
+                                     for i in range(m)], dtype=object),
+                }
+
+    def to_dataframe(self):
+        """Return the table in long form, with one row per grain and plane.
+
+        The 'grain' column is the 0-based grain id, and the other columns
+        are those of `grain`.
+        """
+        rows, cols = np.nonzero(np.isfinite(self.angle_deg))
+        labels = [self.plane_labels[self.phase_index[r]][c]
+                  for r, c in zip(rows, cols)]
+        return pd.DataFrame({
+                'grain': rows,
+                'slip_plane': cols + 1,
+                'sp_label': labels,
+                'sf': self.sf[rows, cols],
+                'angle_deg': self.angle_deg[rows, cols],
+                })
+
+
+def slip_system_table(dicmap):
+    """Return the `SlipSystemTable` of ``dicmap``, building it on first use.
+
+    Tables are cached per map, and rebuilt if the grains of the map are
+    found again, for example after changing its crop.
+    """
+    grains = dicmap.grains
+    cached = _slip_tables.get(dicmap)
+    if cached is None or cached[0] is not grains:
+        cached = (grains, SlipSystemTable(dicmap))
+        _slip_tables[dicmap] = cached
+    return cached[1]
+
+
 def get_slipsystem_info2(grainID, DicMap):
     """Grab slip system for a specific grain.
 
@@ -69,30 +612,8 @@ def get_slipsystem_info2(grainID, DicMap):
 
     Returns
     -------
-    info_frame : list of lists
-        Contains Slip plane labels, schmid factors, and slip trace angles.
+    info_frame : pandas.DataFrame
+        Contains slip plane labels, schmid factors, and slip trace angles,
+        with one row per slip plane. See `SlipSystemTable.grain`.
     """
-
-    #Load the slip systems for the current phase
-    ssGroup = DicMap[grainID].ebsd_grain.phase.slip_systems
-
-    #Calculate the schmid factor of each slip system
-    schmidFactor = DicMap[grainID].ebsd_grain.average_schmid_factors
-
-    #Calculate the slip trace angles
-    DicMap[grainID].ebsd_grain.calc_slip_traces()
-    ST_Angle = np.rad2deg(DicMap[grainID].ebsd_grain.slip_trace_angles) % 360
-
-    ids = np.arange(1, 5)
-    labels = [ssGroup[i][0].slip_plane_label for i in range(4)]
-    sfs = [max(schmidFactor[i]) for i in range(4)]
-    angles = [ST_Angle[i] for i in range(4)]
-    frame = pd.DataFrame({
-        'slip_plane': ids,
-        'sp_label': labels,
-        'sf': sfs,
-        'angle_deg': angles,
-        'color': ['blue', 'green', 'red', 'purple'],
-    })
-    return frame
-
+    return pd.DataFrame(slip_system_table(DicMap).grain(grainID))
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from napari_defdap._cache import (
+        TimepointCache, _parse_size, cache_from_config, default_cache_dir,
+        )
+
+
+def _timepoint(tmp_path):
+    (tmp_path / 'dic.txt').write_text('dic data')
+    (tmp_path / 'map.cpr').write_text('ebsd header')
+    (tmp_path / 'map.crc').write_bytes(b'ebsd data')
+    return {
+            'dic': {'file': 'dic.txt', 'scale': 0.1},
+            'ebsd': {'file': 'map', 'min_grain_size': 10},
+            }
+
+
+def test_cache_key(tmp_path):
+    data = _timepoint(tmp_path)
+    cache = TimepointCache(tmp_path / 'cache')
+    key = cache.key(data, tmp_path)
+    assert cache.key(data, tmp_path) == key
+    data['ebsd']['min_grain_size'] = 20
+    key2 = cache.key(data, tmp_path)
+    assert key2 != key
+    (tmp_path / 'map.crc').write_bytes(b'other ebsd data')
+    assert cache.key(data, tmp_path) not in (key, key2)
+
+
+def test_cache_roundtrip_and_evict(tmp_path):
+    cache = TimepointCache(tmp_path, max_size=2500)
+    assert cache.load('a') is None
+    cache.save('a', ('a', np.zeros(1000, dtype=np.uint8)))
+    result = cache.load('a')
+    assert result[0] == 'a'
+    np.testing.assert_array_equal(result[1], 0)
+    cache.save('b', ('b', np.zeros(1000, dtype=np.uint8)))
+    os.utime(cache._filename('a'), (0, 0))
+    cache.save('c', ('c', np.zeros(1000, dtype=np.uint8)))
+    cache.evict()
+    assert cache.load('a') is None
+    assert cache.load('c') is not None
+    cache.clear()
+    assert cache.load('c') is None
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = TimepointCache(tmp_path)
+    with open(cache._filename('a'), 'wb') as fout:
+        # a pickle of a missing module, like entries of an older DefDAP
+        fout.write(b'cnot_a_module\nMap\n.')
+    assert cache.load('a') is None
+    assert not os.path.exists(cache._filename('a'))
+
+
+def test_cache_from_config(tmp_path, monkeypatch):
+    for var in ('', '_DIR', '_SIZE'):
+        monkeypatch.delenv('NAPARI_DEFDAP_CACHE' + var, raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'user'))
+    assert cache_from_config({}) is None
+    assert cache_from_config({'cache': False}) is None
+    with pytest.warns(UserWarning, match='NAPARI_DEFDAP_CACHE_DIR'):
+        cache = cache_from_config(
+                {'cache': {'dir': 'cache', 'max_size': '1M', 'mode': True}}
+                )
+    assert cache.path == default_cache_dir()
+    assert cache.max_size == _parse_size('1MiB') == 2**20
+    assert not cache.refresh
+    assert cache_from_config({'cache': 'refresh'}).refresh
+    monkeypatch.setenv('NAPARI_DEFDAP_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('NAPARI_DEFDAP_CACHE', '1')
+    cache = cache_from_config({})
+    assert cache.path == str(tmp_path / 'cache')
+    cache.save('a', 1)
+    assert os.stat(cache.path).st_mode & 0o777 == 0o700
+    if os.name != 'nt':
+        os.chmod(cache.path, 0o777)
+        with pytest.warns(UserWarning, match='other users'):
+            assert cache_from_config({}) is None
+    monkeypatch.setenv('NAPARI_DEFDAP_CACHE', '0')
+    assert cache_from_config({'cache': True}) is None
@@ -0,0 +1,75 @@
+import numpy as np
+from skimage import measure
+
+from napari_defdap._features import (
+        GrainCrop, grain_table, grain_table_timepoint, shear_statistics,
+        split_by_timepoint,
+        )
+from napari_defdap._tracks import points_from_seg
+
+
+def _random_grains(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    grains = measure.label(rng.random(shape) > 0.4)
+    shear = rng.random(shape)
+    return grains, shear
+
+
+def test_grain_table_matches_regionprops():
+    grains, shear = _random_grains((60, 50))
+    table = grain_table_timepoint(grains, shear, t=3)
+    props = measure.regionprops_table(
+            grains, intensity_image=shear,
+            properties=('label', 'area', 'bbox', 'centroid',
+                        'intensity_mean', 'intensity_max'),
+            )
+    assert np.all(table['t'] == 3)
+    for column in ('label', 'area', 'bbox-0', 'bbox-1', 'bbox-2', 'bbox-3',
+                   'centroid-0', 'centroid-1'):
+        np.testing.assert_allclose(table[column], props[column])
+    np.testing.assert_allclose(table['mean_shear'], props['intensity_mean'])
+    np.testing.assert_allclose(table['max_shear'], props['intensity_max'])
+
+
+def test_shear_statistics_match_per_grain():
+    grains, shear = _random_grains((2, 40, 50))
+    grains[0, :5] = -1  # non-indexed pixels are ignored
+    table = shear_statistics(
+            grains, shear, percentiles=(0, 37.5, 90), thresholds=(0.5,)
+            )
+    assert list(table['t'].unique()) == [0, 1]
+    for row in table.itertuples(index=False):
+        values = shear[row.t][grains[row.t] == row.label]
+        expected = [values.size, values.mean(), values.std(), values.max(),
+                    *np.percentile(values, [0, 37.5, 90]),
+                    np.mean(values > 0.5)]
+        np.testing.assert_allclose(row[2:], expected)
+
+
+def test_grain_crop_matches_regionprops():
+    grains, shear = _random_grains((60, 50))
+    table = grain_table_timepoint(grains).set_index('label')
+    for prop in measure.regionprops(grains, intensity_image=shear)[:10]:
+        bbox = table.loc[prop.label, ['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']]
+        crop = GrainCrop.from_arrays(grains, shear, prop.label, bbox)
+        assert crop.bbox == prop.bbox
+        np.testing.assert_array_equal(crop.image, prop.image)
+        np.testing.assert_allclose(crop.intensity_image, prop.intensity_image)
+
+
+def test_points_from_seg_table():
+    stack = np.stack([_random_grains((40, 40), seed=i)[0] for i in range(3)])
+    stack[1] = 0  # a timepoint without grains
+    table = grain_table(stack)
+    assert [len(t) for t in split_by_timepoint(table, 3)] == [
+            len(np.unique(stack[i])) - 1 for i in range(3)
+            ]
+    points = points_from_seg(stack, table=table)
+    assert len(points) == 3
+    assert points[1].shape == (0, 2)
+    props = measure.regionprops_table(stack[2], properties=('centroid',))
+    np.testing.assert_allclose(points[2][:, 0], props['centroid-0'])
+    np.testing.assert_allclose(
+            points_from_seg(np.moveaxis(stack, 0, 2), time_axis=2)[2],
+            points[2],
+            )
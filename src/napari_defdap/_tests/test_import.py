@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+HEAVY = {'dask', 'defdap', 'magicgui', 'matplotlib', 'napari', 'numpy',
+         'pandas', 'qtpy', 'scipy', 'skimage', 'trackpy', 'yaml', 'zarr'}
+
+
+def _imported_packages(code):
+    """Top level packages imported by ``code`` in a fresh interpreter."""
+    result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            capture_output=True, text=True, check=True,
+            )
+    return {line.rsplit('|', 1)[-1].strip().split('.')[0]
+            for line in result.stderr.splitlines()
+            if line.startswith('import time:') and '|' in line}
+
+
+def test_reader_detection_is_light():
+    baseline = _imported_packages('pass')
+    imported = _imported_packages(
+            'import napari_defdap\n'
+            'from napari_defdap._get_reader import (\n'
+            '    napari_get_reader, napari_get_zarr_reader)\n'
+            'assert napari_get_reader("image.tif") is None\n'
+            'assert napari_get_zarr_reader(["a.zarr", "b.zarr"]) is None\n'
+            )
+    assert 'napari_defdap' in imported
+    assert not (imported - baseline) & HEAVY
+
+
+def test_lazy_attributes():
+    import napari_defdap
+    from napari_defdap._widget import GrainPlots
+
+    assert napari_defdap.GrainPlots is GrainPlots
+    assert 'make_sample_data' in dir(napari_defdap)
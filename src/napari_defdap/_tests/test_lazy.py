@@ -0,0 +1,53 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from napari_defdap._lazy import LazyMaps, LazyTimepoints, lazy_stack
+
+
+def test_lazy_stack_reads_on_demand():
+    reads = []
+
+    def read(i):
+        reads.append(i)
+        return f'map{i}', np.full((4, 5), i, dtype=np.uint16)
+
+    timepoints = LazyTimepoints(read, 3)
+    stack = lazy_stack(timepoints, 1, timepoints[0][1])
+    assert stack.shape == (3, 4, 5)
+    assert stack.dtype == np.uint16
+    assert stack.chunks[0] == (1, 1, 1)
+    assert reads == [0]
+    np.testing.assert_array_equal(stack[2].compute(), 2)
+    assert reads == [0, 2]
+    np.testing.assert_array_equal(stack[:, 0, 0].compute(), [0, 1, 2])
+    assert sorted(reads) == [0, 1, 2]
+
+    maps = LazyMaps(timepoints, 0)
+    assert maps[(1,)] == 'map1'
+    assert list(maps) == [(0,), (1,), (2,)]
+    assert maps.get((3,)) is None
+    assert sorted(reads) == [0, 1, 2]
+
+
+def test_lazy_timepoints_read_concurrently():
+    reads = []
+    # fails unless two different timepoints are read at the same time
+    barrier = threading.Barrier(2, timeout=10)
+
+    def read(i):
+        reads.append(i)
+        if i < 2:
+            barrier.wait()
+        else:
+            time.sleep(0.1)
+        return i
+
+    timepoints = LazyTimepoints(read, 3)
+    with ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(timepoints.__getitem__, [0, 1])) == [0, 1]
+        # duplicate reads of one timepoint wait for the first one
+        assert list(executor.map(timepoints.__getitem__, [2] * 4)) == [2] * 4
+    assert sorted(reads) == [0, 1, 2]
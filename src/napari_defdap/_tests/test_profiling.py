@@ -0,0 +1,99 @@
+import json
+import threading
+import tracemalloc
+
+import numpy as np
+
+from napari_defdap._profiling import StageProfiler, stage, timepoint
+from napari_defdap._reader import _profiler_from_config
+
+
+def test_stage_records_time_and_memory(tmp_path):
+    profiler = StageProfiler()
+    with timepoint(profiler, 3), stage(profiler, 'outer'):
+        with stage(profiler, 'inner'):
+            big = np.ones(2**20)  # 8MiB
+            del big
+        small = np.ones(2**10)
+        del small
+    assert not tracemalloc.is_tracing()
+    inner, outer = profiler.records
+    assert inner['stage'] == 'inner' and inner['depth'] == 1
+    assert outer['stage'] == 'outer' and outer['depth'] == 0
+    assert inner['t'] == outer['t'] == 3
+    assert inner['peak_memory'] >= 8 * 2**20
+    # the inner peak counts towards the outer stage
+    assert outer['peak_memory'] >= inner['peak_memory']
+    assert outer['wall_time'] >= inner['wall_time']
+    summary = profiler.summary()
+    assert list(summary.index) == ['inner', 'outer']
+    filename = tmp_path / 'profile.json'
+    profiler.report(filename)
+    with open(filename) as fin:
+        report = json.load(fin)
+    assert report['records'] == profiler.records
+    assert report['timepoints'] == [3] and not report['partial']
+
+
+def test_partial_report(tmp_path, caplog):
+    filename = tmp_path / 'profile.json'
+    profiler = StageProfiler(n_timepoints=3, filename=filename)
+    with timepoint(profiler, 0), stage(profiler, 'read_timepoint'):
+        pass
+    with caplog.at_level('INFO', logger='napari_defdap.profile'):
+        profiler.report()
+    assert 'partial: 1 of 3 timepoints read' in caplog.text
+    with open(filename) as fin:
+        assert json.load(fin)['partial']
+    for t in (1, 2):
+        with timepoint(profiler, t), stage(profiler, 'read_timepoint'):
+            pass
+    caplog.clear()
+    with caplog.at_level('INFO', logger='napari_defdap.profile'):
+        profiler.report()
+    assert 'partial' not in caplog.text
+    with open(filename) as fin:
+        report = json.load(fin)
+    assert report['timepoints'] == [0, 1, 2] and not report['partial']
+
+
+def test_stages_of_threads_do_not_interleave():
+    profiler = StageProfiler()
+
+    def read(t):
+        with timepoint(profiler, t), stage(profiler, 'outer'):
+            with stage(profiler, 'inner'):
+                np.ones(2**16)
+
+    threads = [threading.Thread(target=read, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not tracemalloc.is_tracing()
+    records = profiler.records
+    assert [r['depth'] for r in records] == [1, 0] * 4
+    for inner, outer in zip(records[::2], records[1::2]):
+        assert inner['t'] == outer['t']
+    assert sorted(r['t'] for r in records[::2]) == [0, 1, 2, 3]
+
+
+def test_disabled_profiler_is_null():
+    assert stage(None, 'a') is stage(None, 'b') is timepoint(None, 0)
+    with stage(None, 'a'):
+        pass
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_from_config(monkeypatch, tmp_path):
+    monkeypatch.delenv('NAPARI_DEFDAP_PROFILE', raising=False)
+    assert _profiler_from_config({}, tmp_path) == (None, None)
+    profiler, filename = _profiler_from_config({'profile': True}, tmp_path)
+    assert isinstance(profiler, StageProfiler) and filename is None
+    profiler, filename = _profiler_from_config(
+            {'profile': 'out.json', 'time': [{}, {}]}, tmp_path
+            )
+    assert filename == profiler.filename == str(tmp_path / 'out.json')
+    assert profiler.n_timepoints == 2
+    monkeypatch.setenv('NAPARI_DEFDAP_PROFILE', '0')
+    assert _profiler_from_config({'profile': True}, tmp_path) == (None, None)
@@ -0,0 +1,98 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from napari_defdap._pyramid import (
+        downsample_labels, downsample_mean, downsample_mode, empty_stack,
+        level_shape, multiscale, n_levels, pyramid,
+        )
+
+
+def test_n_levels():
+    assert n_levels((100, 100), min_size=512) == 1
+    assert n_levels((3, 1000, 600), min_size=512) == 2
+    assert n_levels((1025, 10), min_size=256) == 4
+    assert level_shape((3, 1025, 10), 2) == (3, 257, 3)
+
+
+def test_downsample_mean_edges():
+    image = np.arange(15, dtype=np.float32).reshape(3, 5)
+    down = downsample_mean(image)
+    assert down.dtype == np.float32
+    expected = [[(0 + 1 + 5 + 6) / 4, (2 + 3 + 7 + 8) / 4, (4 + 9) / 2],
+                [(10 + 11) / 2, (12 + 13) / 2, 14]]
+    np.testing.assert_allclose(down, expected)
+
+
+def test_pyramid_shapes():
+    rng = np.random.default_rng(0)
+    image = rng.random((2, 37, 50))
+    labels = rng.integers(0, 5, size=image.shape)
+    levels = pyramid(image, 3)
+    label_levels = pyramid(labels, 3, labels=True)
+    for level, (im, lab) in enumerate(zip(levels, label_levels)):
+        assert im.shape == lab.shape == level_shape(image.shape, level)
+    np.testing.assert_allclose(levels[1].mean(), image.mean(), rtol=0.05)
+    np.testing.assert_array_equal(label_levels[2], labels[:, ::4, ::4])
+    assert np.shares_memory(downsample_labels(labels), labels)
+
+
+def test_downsample_mode():
+    labels = np.array([
+        [1, 1, 2, 3, 5],
+        [1, 4, 3, 2, 5],
+        [6, 7, 0, 0, 5],
+        ])
+    np.testing.assert_array_equal(
+            downsample_mode(labels), [[1, 2, 5], [6, 0, 5]]
+            )
+    np.testing.assert_array_equal(
+            downsample_labels(labels, method='mode'), downsample_mode(labels)
+            )
+    with pytest.raises(ValueError):
+        downsample_labels(labels, method='max')
+
+
+def test_multiscale_dask():
+    da = pytest.importorskip('dask.array')
+    rng = np.random.default_rng(0)
+    image = rng.random((3, 37, 50))
+    labels = rng.integers(0, 5, size=image.shape)
+    for data, is_labels, method in [(image, False, 'nearest'),
+                                    (labels, True, 'nearest'),
+                                    (labels, True, 'mode')]:
+        lazy = da.from_array(data, chunks=(1,) + data.shape[1:])
+        levels = multiscale(lazy, 3, labels=is_labels, method=method)
+        expected = pyramid(data, 3, labels=is_labels, method=method)
+        for level, exp in zip(levels, expected):
+            assert isinstance(level, da.Array)
+            assert level.shape == exp.shape
+            np.testing.assert_allclose(level.compute(), exp)
+
+
+def test_multiscale_memmap(tmp_path):
+    rng = np.random.default_rng(0)
+    image = empty_stack((8, 128, 130), np.float64, tmp_path)
+    image[:] = rng.random(image.shape)
+    labels = empty_stack(image.shape, np.int32, tmp_path)
+    labels[:] = rng.integers(0, 5, size=image.shape)
+    for data, is_labels, method in [(image, False, 'nearest'),
+                                    (labels, True, 'nearest'),
+                                    (labels, True, 'mode')]:
+        levels = multiscale(data, 3, labels=is_labels, method=method,
+                            directory=tmp_path)
+        expected = pyramid(np.asarray(data), 3, labels=is_labels,
+                           method=method)
+        for level, exp in zip(levels[1:], expected[1:]):
+            # memory-mapped, or a view of the memory-mapped stack
+            assert isinstance(level, np.memmap)
+            np.testing.assert_array_equal(level, exp)
+    # the levels are computed one frame at a time
+    tracemalloc.start()
+    try:
+        multiscale(image, 3, directory=tmp_path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < image.nbytes / 2
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from napari_defdap._quantiles import HistogramQuantiles, contrast_limits
+from napari_defdap._reader import _contrast_limits
+
+
+def test_quantile_relative_error():
+    rng = np.random.default_rng(0)
+    frames = [rng.gamma(2, 0.01 * (t + 1), size=(100, 100)) for t in range(5)]
+    frames[3] -= 2  # extend the range downwards after the first update
+    histogram = HistogramQuantiles(relative_accuracy=0.01)
+    for frame in frames:
+        histogram.update(frame)
+    values = np.stack(frames)
+    q = [0, 0.01, 0.5, 0.99, 1]
+    expected = np.quantile(values, q, method='lower')
+    np.testing.assert_allclose(histogram.quantile(q), expected, rtol=0.01)
+    assert histogram.count == values.size
+
+
+def test_outliers_match_np_quantile():
+    rng = np.random.default_rng(2)
+    shear = rng.gamma(2, 0.01, size=(2, 100, 100))
+    for outlier in [50., 1000., np.finfo(float).max]:
+        shear[1, 0, 0] = outlier
+        shear[0, 0, 0] = np.inf
+        clim, clims = _contrast_limits({
+                (t,): HistogramQuantiles().update(frame)
+                for t, frame in enumerate(shear)
+                })
+        expected = np.quantile(shear[np.isfinite(shear)], [0.01, 0.99],
+                               method='lower')
+        np.testing.assert_allclose(clim, expected, rtol=0.005)
+        expected = np.quantile(shear[1], [0.01, 0.99], method='lower')
+        np.testing.assert_allclose(clims[(1,)], expected, rtol=0.005)
+
+
+def test_merge_is_exact():
+    rng = np.random.default_rng(1)
+    frames = [rng.normal(t, 1 + t, size=1000) for t in range(4)]
+    frames.append(np.array([np.nan, 1e3, 0., -np.inf]))
+    merged = HistogramQuantiles()
+    for frame in frames:
+        merged.merge(HistogramQuantiles().update(frame))
+    whole = HistogramQuantiles().update(np.concatenate(frames))
+    np.testing.assert_array_equal(merged.keys, whole.keys)
+    np.testing.assert_array_equal(merged.counts, whole.counts)
+    with pytest.raises(ValueError):
+        merged.merge(HistogramQuantiles(relative_accuracy=0.1))
+
+
+def test_empty_and_constant():
+    assert np.isnan(HistogramQuantiles().quantile(0.5))
+    histogram = HistogramQuantiles().update(np.full(10, 3.))
+    clim = contrast_limits(histogram)
+    assert clim[0] < clim[1]
+    np.testing.assert_allclose(clim[0], 3, rtol=0.005)
+    assert HistogramQuantiles().update(np.zeros(5)).quantile(0.5) == 0
+    with pytest.raises(ValueError):
+        HistogramQuantiles(relative_accuracy=1.5)
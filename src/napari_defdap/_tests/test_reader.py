@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import pytest
+
+from napari_defdap._reader import (
+        _add_non_indexed, _batches, _compact_dtype, _compact_result,
+        _ebsd_key, _FrameStack, _memmap_directory, _multiscale_levels,
+        _n_workers, _relabel_non_indexed,
+        )
+
+
+def test_n_workers(monkeypatch):
+    monkeypatch.delenv('NAPARI_DEFDAP_WORKERS', raising=False)
+    assert _n_workers({}, 10) == 1
+    assert _n_workers({'workers': 4}, 10) == 4
+    assert _n_workers({'workers': 4}, 3) == 3
+    assert _n_workers({'workers': 'auto'}, 1000) == min(os.cpu_count(), 1000)
+    monkeypatch.setenv('NAPARI_DEFDAP_WORKERS', '2')
+    assert _n_workers({'workers': 4}, 10) == 2
+
+
+def test_multiscale_levels():
+    shape = (3, 2000, 1000)
+    assert _multiscale_levels(False, shape) == 1
+    assert _multiscale_levels('false', shape) == 1
+    assert _multiscale_levels(True, shape) == 3
+    assert _multiscale_levels('1', shape) == 3
+    assert _multiscale_levels('yes', shape) == 3
+    assert _multiscale_levels(5, shape) == 5
+    assert _multiscale_levels('5', shape) == 5
+
+
+def test_compact_dtype(monkeypatch):
+    monkeypatch.delenv('NAPARI_DEFDAP_COMPACT', raising=False)
+    assert _compact_dtype({}) is None
+    assert _compact_dtype({'compact': 'off'}) is None
+    assert _compact_dtype({'compact': True}) == np.float64
+    assert _compact_dtype({'compact': 'float32'}) == np.float32
+    with pytest.raises(ValueError):
+        _compact_dtype({'compact': 'int8'})
+    monkeypatch.setenv('NAPARI_DEFDAP_COMPACT', '1')
+    assert _compact_dtype({'compact': False}) == np.float64
+
+
+def test_compact_result():
+    grains = np.array([[-1, 0, 3], [300, 2, -2]])
+    max_shear = np.linspace(0, 1, 6).reshape(2, 3)
+    phase = np.array([[0., 1., 2.], [1., 1., 0.]])
+    _, _, g, m, p = _compact_result(
+            (None, None, grains, max_shear, phase), np.float32
+            )
+    assert g.dtype == np.int16
+    np.testing.assert_array_equal(g, grains)
+    assert m.dtype == np.float32
+    np.testing.assert_allclose(m, max_shear, rtol=1e-6)
+    assert p.dtype == np.uint8
+    np.testing.assert_array_equal(p, phase)
+    # the compact grains relabel to the same labels as the original ones
+    np.testing.assert_array_equal(
+            _relabel_non_indexed(g), _relabel_non_indexed(grains)
+            )
+
+
+def test_memmap_directory(monkeypatch, tmp_path):
+    monkeypatch.delenv('NAPARI_DEFDAP_MEMMAP', raising=False)
+    assert _memmap_directory({}, 'project') is None
+    assert _memmap_directory({'memmap': 'no'}, 'project') is None
+    assert os.path.isdir(_memmap_directory({'memmap': True}, 'project'))
+    assert _memmap_directory({'memmap': 'scratch'}, 'project') == (
+            os.path.join('project', 'scratch')
+            )
+
+
+@pytest.mark.parametrize('memmap', [False, True])
+def test_frame_stack(memmap, tmp_path):
+    frames = [np.full((3, 4), 7, dtype=np.uint8),
+              np.full((3, 4), 300, dtype=np.uint16),
+              np.zeros((3, 4), dtype=np.uint8)]
+    stack = _FrameStack(3, str(tmp_path) if memmap else None)
+    for i, frame in enumerate(frames):
+        stack[i] = frame
+    assert isinstance(stack.array, np.memmap) == memmap
+    # the second frame needs a larger dtype than the first
+    assert stack.array.dtype == np.uint16
+    np.testing.assert_array_equal(stack.array, np.stack(frames))
+    # the temporary files are anonymous
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_batches_share_ebsd():
+    a = {'file': 'a', 'min_grain_size': 10, 'homolog_points': [[0, 0]]}
+    a2 = {**a, 'homolog_points': [[1, 1]]}
+    b = {**a, 'file': 'b'}
+    assert _ebsd_key(a) == _ebsd_key(a2) != _ebsd_key(b)
+    timepoints = [{'ebsd': e} for e in (a, b, a2, a, b)]
+    assert _batches(timepoints, 1) == [[0, 2, 3], [1, 4]]
+    batches = _batches(timepoints, 3)
+    assert sorted(i for batch in batches for i in batch) == list(range(5))
+    assert all(len({_ebsd_key(timepoints[i]['ebsd']) for i in batch}) == 1
+               for batch in batches)
+
+
+def test_relabel_non_indexed():
+    seg = np.array([
+        [1, 1, 0, 2, 2],
+        [1, 1, 0, 2, 2],
+        [-1, 1, 2, 2, 0],
+        [3, 3, 3, 3, 3],
+    ])
+    expected = np.array([
+        [1, 1, 4, 2, 2],
+        [1, 1, 4, 2, 2],
+        [5, 1, 2, 2, 6],
+        [3, 3, 3, 3, 3],
+    ])
+    relabeled = _relabel_non_indexed(seg)
+    np.testing.assert_array_equal(relabeled, expected)
+    assert relabeled.dtype == np.uint8
+    expected_min2 = np.where(expected > 4, 0, expected)
+    np.testing.assert_array_equal(
+            _relabel_non_indexed(seg, min_size=2), expected_min2
+            )
+    assert _relabel_non_indexed(seg, dtype=np.int64).dtype == np.int64
+
+
+def test_add_non_indexed_stack():
+    seg = np.zeros((3, 20, 20), dtype=np.int64)
+    seg[:, :10] = 1
+    seg[1, :10, :10] = 300
+    seg[:, 15, 15] = 0
+    relabeled = _add_non_indexed(seg)
+    assert relabeled.dtype == np.uint16
+    np.testing.assert_array_equal(relabeled[:, 19, 19], [2, 301, 2])
+    relabeled_t = _add_non_indexed(np.moveaxis(seg, 0, -1), time_axis=2)
+    np.testing.assert_array_equal(np.moveaxis(relabeled_t, -1, 0), relabeled)
@@ -0,0 +1,150 @@
+import copy
+import types
+
+import numpy as np
+import pytest
+from napari.layers import Image, Labels
+
+from napari_defdap import _reload
+from napari_defdap._cache import cache_from_config
+from napari_defdap._reload import (
+        _layers_by_role, _reload_timepoints, _update_layers, plan_reload,
+        timepoint_change,
+        )
+
+
+def _timepoint(i):
+    return {
+        'dic': {'file': f'dic{i}.txt', 'scale': 0.1,
+                'crop': {'x': [10, 10], 'y': [5, 5]},
+                'homolog_points': [[0, 0], [1, 1]]},
+        'ebsd': {'file': 'ebsd', 'min_grain_size': 10,
+                 'homolog_points': [[0, 0], [1, 1]],
+                 'transform_type': 'affine'},
+    }
+
+
+def test_timepoint_change():
+    old = _timepoint(0)
+    new = copy.deepcopy(old)
+    assert timepoint_change(None, new) == 'read'
+    assert timepoint_change(old, new) == 'same'
+    new['dic']['scale'] = 0.2
+    assert timepoint_change(old, new) == 'scale'
+    new['dic']['crop']['x'] = [20, 10]
+    assert timepoint_change(old, new) == 'crop'
+    new['dic']['homolog_points'] = [[1, 0], [1, 1]]
+    assert timepoint_change(old, new) == 'read'
+    new = copy.deepcopy(old)
+    new['ebsd']['transform_type'] = 'polynomial'
+    assert timepoint_change(old, new) == 'read'
+
+
+def test_plan_reload():
+    old = {'workers': 2, 'time': [_timepoint(i) for i in range(3)]}
+    new = copy.deepcopy(old)
+    new['time'][1]['dic']['crop']['y'] = [0, 0]
+    new['time'].append(_timepoint(3))
+    assert plan_reload(old, new) == ['same', 'crop', 'same', 'read']
+    new['workers'] = 4
+    assert plan_reload(old, new) is None
+    new = copy.deepcopy(old)
+    new['time'][0]['ebsd']['min_grain_size'] = 5
+    assert plan_reload(old, new) is None
+
+
+def test_update_layers_in_place():
+    shear = Image(np.zeros((2, 8, 8)), metadata={'defdap_layer': 'max_shear'})
+    grains = Labels(np.zeros((2, 8, 8), dtype=np.uint8),
+                    metadata={'defdap_layer': 'grains'})
+    phase = Labels(np.zeros((2, 8, 8), dtype=np.uint8),
+                   metadata={'defdap_layer': 'phase'})
+    other = Image(np.zeros((4, 4)))
+    with pytest.raises(ValueError, match='phase'):
+        _layers_by_role([shear, grains, other])
+    layers = _layers_by_role([shear, other, grains, phase])
+    rng = np.random.default_rng(0)
+    new_shear = rng.random((3, 6, 6))
+    layer_data = [
+        (new_shear, {'scale': (1, 0.5, 0.5), 'contrast_limits': (0, 2),
+                     'metadata': {'defdap_layer': 'max_shear', 'a': 1}},
+         'image'),
+        (np.ones((3, 6, 6), dtype=np.uint16),
+         {'scale': (1, 0.5, 0.5),
+          'metadata': {'defdap_layer': 'grains', 'a': 1}}, 'labels'),
+        (np.ones((3, 6, 6), dtype=np.uint8),
+         {'scale': (1, 0.5, 0.5),
+          'metadata': {'defdap_layer': 'phase', 'a': 1},
+          'features': {'index': [0, 1], 'names': ['not indexed', 'Ni']}},
+         'labels'),
+        ]
+    _update_layers(layers, layer_data)
+    np.testing.assert_array_equal(shear.data, new_shear)
+    assert shear.contrast_limits == [0, 2]
+    assert grains.data.shape == (3, 6, 6)
+    np.testing.assert_array_equal(grains.scale, [1, 0.5, 0.5])
+    assert phase.metadata['a'] == 1
+    assert list(phase.features['names']) == ['not indexed', 'Ni']
+
+
+class _FakeDicMap:
+    def __init__(self, scale):
+        self.scale = scale
+        self.crop = None
+
+    def set_scale(self, scale):
+        self.scale = scale
+
+    def set_crop(self, **crop):
+        self.crop = crop
+
+
+def _fake_crop_outputs(dicmap, ebsdmap, ebsd_params):
+    grains = np.ones((6, 6), dtype=np.int32)
+    return grains, np.full((6, 6), 0.5), np.ones((6, 6), dtype=np.uint8)
+
+
+def test_reload_crop_and_scale(tmp_path, monkeypatch):
+    monkeypatch.setattr(_reload, '_crop_outputs', _fake_crop_outputs)
+    monkeypatch.setenv('NAPARI_DEFDAP_CACHE', '1')
+    monkeypatch.setenv('NAPARI_DEFDAP_CACHE_DIR', str(tmp_path / 'cache'))
+    (tmp_path / 'dic0.txt').write_text('dic data')
+    (tmp_path / 'ebsd.cpr').write_text('ebsd data')
+    old = _timepoint(0)
+    dicmap = _FakeDicMap(old['dic']['scale'])
+    ebsdmap = types.SimpleNamespace(
+            phases=[types.SimpleNamespace(name='Ni')]
+            )
+    metadata = {'dicmap': {(): dicmap}, 'ebsdmap': {(): ebsdmap}}
+    layers = _layers_by_role([
+            Image(np.zeros((8, 8)),
+                  metadata={**metadata, 'defdap_layer': 'max_shear'}),
+            Labels(np.ones((8, 8), dtype=np.int32),
+                   metadata={**metadata, 'defdap_layer': 'grains'}),
+            Labels(np.ones((8, 8), dtype=np.uint8),
+                   metadata={**metadata, 'defdap_layer': 'phase'}),
+            ])
+    project = {'path': str(tmp_path / 'project.defdap.yml'), 'data': old}
+    # crop and scale change together
+    new = copy.deepcopy(old)
+    new['dic']['scale'] = 0.2
+    new['dic']['crop']['x'] = [11, 10]
+    assert plan_reload(old, new) == ['crop']
+    layer_data = _reload_timepoints(layers, project, new, ['crop'])
+    _update_layers(layers, layer_data)
+    assert dicmap.crop['left'] == 11
+    np.testing.assert_allclose(layers['grains'].scale, [0.2, 0.2])
+    assert layers['grains'].data.shape == (6, 6)
+    # a scale change refreshes the cache entry
+    project = {'path': project['path'], 'data': new}
+    newer = copy.deepcopy(new)
+    newer['dic']['scale'] = 0.3
+    layer_data = _reload_timepoints(
+            layers, project, newer, plan_reload(new, newer)
+            )
+    _update_layers(layers, layer_data)
+    np.testing.assert_allclose(layers['max_shear'].scale, [0.3, 0.3])
+    cache = cache_from_config(newer)
+    cached = cache.load(cache.key(newer, tmp_path))
+    assert cached[0].scale == 0.3
+    np.testing.assert_array_equal(cached[3], 0.5)
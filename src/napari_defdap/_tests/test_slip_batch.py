@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+from napari_defdap._slip_batch import (
+        _analyse_block, find_profile_peaks, load_results, slip_band_angles,
+        )
+
+
+def _striped_grains(n_timepoints=2):
+    """Square grains with slip bands at 0° or 90°."""
+    grains = np.zeros((n_timepoints, 64, 64), dtype=np.uint16)
+    shear = np.full(grains.shape, 0.01)
+    bands = np.arange(32) % 8 < 3
+    for i, (r, c) in enumerate([(0, 0), (0, 32), (32, 0), (32, 32)]):
+        grains[:, r:r + 32, c:c + 32] = i + 1
+        if i % 2:
+            shear[:, r:r + 32, c:c + 32][:, bands, :] = 0.1
+        else:
+            shear[:, r:r + 32, c:c + 32][:, :, bands] = 0.1
+    return grains, shear
+
+
+def test_find_profile_peaks_wraps_around():
+    angles = np.arange(180)
+    profile = np.exp(-((angles - 2) % 180 - 90.) ** 2 / 50) + 0.01
+    np.testing.assert_array_equal(find_profile_peaks(profile), [92])
+    profile = np.roll(profile, 90)
+    np.testing.assert_array_equal(find_profile_peaks(profile), [2])
+
+
+def test_slip_band_angles_resume(tmp_path):
+    grains, shear = _striped_grains()
+    table, profiles = slip_band_angles(
+            grains, shear, tmp_path, workers=2, block_size=3
+            )
+    assert len(table) == 8
+    assert profiles.shape == (8, 180)
+    np.testing.assert_array_equal(table['t'], [0] * 4 + [1] * 4)
+    np.testing.assert_array_equal(table['label'], [1, 2, 3, 4] * 2)
+    # the strongest peak is along the bands, up to the plateau of the
+    # profile of a square grain
+    main_angles = np.argmax(profiles, axis=1)
+    distance = np.abs((main_angles - [0, 90, 0, 90] * 2 + 90) % 180 - 90)
+    assert np.all(distance <= 5)
+    for angles, main in zip(table['peak_angles'], main_angles):
+        assert main in angles
+
+    # simulate an interrupted run: remove one block and resume
+    removed = os.path.join(tmp_path, 't00001_b00001.npz')
+    mtime = os.path.getmtime(os.path.join(tmp_path, 't00000_b00000.npz'))
+    os.remove(removed)
+    # ... and leave the temporary file of another block behind
+    stale = os.path.join(tmp_path, 'stale.tmp')
+    open(stale, 'wb').close()
+    table2, profiles2 = slip_band_angles(
+            grains, shear, tmp_path, workers=1, block_size=3
+            )
+    assert os.path.exists(removed)
+    assert not os.path.exists(stale)
+    assert os.path.getmtime(
+            os.path.join(tmp_path, 't00000_b00000.npz')
+            ) == mtime
+    np.testing.assert_allclose(profiles2, profiles)
+    pd_table, _ = load_results(tmp_path)
+    assert len(pd_table) == 8
+
+
+def test_slip_band_angles_checks_input(tmp_path):
+    grains, shear = _striped_grains()
+    slip_band_angles(grains, shear, tmp_path, workers=1)
+    with pytest.raises(ValueError, match='parameters'):
+        slip_band_angles(grains, shear, tmp_path, workers=1, block_size=2)
+    with pytest.raises(ValueError, match='input'):
+        slip_band_angles(grains[:1], shear[:1], tmp_path, workers=1)
+    with pytest.raises(ValueError, match='input'):
+        slip_band_angles(grains, shear.astype(np.float32), tmp_path,
+                         workers=1)
+    changed = shear.copy()
+    changed[1, 0, 0] = 1
+    with pytest.raises(ValueError, match='timepoint 1'):
+        slip_band_angles(grains, changed, tmp_path, workers=1)
+    grains[1, :32, :32] = 5
+    with pytest.raises(ValueError, match='timepoint 1'):
+        slip_band_angles(grains, shear, tmp_path, workers=1)
+
+
+def test_failed_block_leaves_no_files(tmp_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(np, 'savez', fail)
+    grains, shear = _striped_grains(1)
+    filename = os.path.join(tmp_path, 't00000_b00000.npz')
+    with pytest.raises(OSError):
+        _analyse_block(filename, 0, np.array([1]),
+                       [shear[0, :32, :32]], 'skimage', 0.1)
+    assert os.listdir(tmp_path) == []
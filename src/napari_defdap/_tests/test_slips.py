@@ -0,0 +1,185 @@
+import types
+
+import numpy as np
+import pytest
+from defdap.crystal import Phase
+from defdap.ebsd import Grain
+from defdap.quat import Quat
+from scipy import ndimage
+from skimage.transform import radon
+
+from napari_defdap._features import GrainCrop, grain_table_timepoint
+from napari_defdap._slips import (
+        ThresholdedFrame, compute_radon, get_slipsystem_info2,
+        grain_thresholds, projection_max, radon_timepoint, sb_angle,
+        slip_system_table,
+        )
+
+
+def _banded_image(shape=(120, 90), angle=0.5, seed=0):
+    rng = np.random.default_rng(seed)
+    rr, cc = np.indices(shape)
+    bands = (rr * np.cos(angle) + cc * np.sin(angle)) % 15 < 3
+    return rng.random(shape) * 0.02 + 0.05 * bands
+
+
+def test_projection_max_matches_skimage():
+    image = _banded_image() > 0.03
+    theta = np.arange(180.)
+    expected = radon(image.astype(float), theta=theta, circle=False).max(0)
+    profile = projection_max(image, theta)
+    assert np.argmax(profile) == np.argmax(expected)
+    np.testing.assert_allclose(profile, expected, rtol=0.1)
+    assert np.corrcoef(profile, expected)[0, 1] > 0.99
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'engine': 'projection'},
+    {'engine': 'projection', 'coarse_step': 4},
+])
+def test_sb_angle_engines(kwargs):
+    image = _banded_image()
+    expected = np.asarray(sb_angle(image, threshold=0.03, median_filter=3))
+    profile = np.asarray(
+            sb_angle(image, threshold=0.03, median_filter=3, **kwargs)
+            )
+    assert profile.shape == expected.shape == (180,)
+    assert np.argmax(profile) == np.argmax(expected)
+
+
+def test_sb_angle_resolution():
+    profile = sb_angle(_banded_image(), threshold=0.03, engine='projection',
+                       n_angles=360)
+    assert len(profile) == 360
+    with pytest.raises(ValueError):
+        sb_angle(_banded_image(), engine='fft')
+
+
+def _voronoi_grains(shape=(64, 80), n=12, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, shape, size=(n, 2))
+    coords = np.indices(shape).reshape(2, -1).T
+    distances = ((coords[:, None] - centres) ** 2).sum(axis=-1)
+    grains = (distances.argmin(axis=1) + 1).reshape(shape).astype(np.int32)
+    grains[:3, :5] = 0  # some unlabelled pixels
+    shear = rng.gamma(2, 0.01, size=shape) + _banded_image(shape)
+    shear[10, 10] = np.nan
+    return grains, shear
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'engine': 'projection'},
+    {'engine': 'skimage', 'threshold_multiplier': 1.2},
+])
+def test_radon_timepoint_matches_compute_radon(kwargs):
+    grains, shear = _voronoi_grains()
+    table = grain_table_timepoint(grains)
+    crops = [GrainCrop.from_arrays(grains, shear, row['label'],
+                                   row[['bbox-0', 'bbox-1', 'bbox-2',
+                                        'bbox-3']])
+             for _, row in table.iterrows()]
+    intensity = [crop.intensity_image.copy() for crop in crops]
+    expected = np.stack([compute_radon(crop, **kwargs) for crop in crops])
+    profiles = radon_timepoint(grains, shear, table, **kwargs)
+    np.testing.assert_allclose(profiles, expected)
+    # compute_radon leaves the crops unchanged
+    for crop, before in zip(crops, intensity):
+        np.testing.assert_array_equal(crop.intensity_image, before)
+
+
+@pytest.mark.parametrize('median_filter', [None, 3, 5])
+def test_thresholded_frame_crops(median_filter):
+    grains, shear = _voronoi_grains()
+    grains[20, 30:40] = 20  # a grain one pixel high
+    grains[40:44, 60] = 21  # and one pixel wide
+    table = grain_table_timepoint(grains)
+    bboxes = table[['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']].to_numpy()
+    thresholds = grain_thresholds(grains, shear, 1.2, 0.)
+    frame = ThresholdedFrame(grains, shear, 1.2, 0., median_filter)
+    crops = frame.crops(table['label'], bboxes)
+    for lab, (r0, c0, r1, c1), crop in zip(table['label'], bboxes, crops):
+        image = np.where(grains[r0:r1, c0:c1] == lab, shear[r0:r1, c0:c1],
+                         np.nan) > thresholds[lab]
+        if median_filter is not None:
+            image = ndimage.median_filter(image, size=median_filter)
+        np.testing.assert_array_equal(crop, image)
+    with pytest.raises(ValueError):
+        ThresholdedFrame(grains, shear, median_filter=4)
+
+
+@pytest.mark.parametrize('median_filter', [3, 5])
+def test_thresholded_frame_thin_and_corner_grains(median_filter):
+    # crops no wider than the filter radius reflect a pixel more than
+    # twice along an axis
+    rng = np.random.default_rng(3)
+    for _ in range(20):
+        grains = rng.integers(1, 4, size=(12, 12)).astype(np.int32)
+        for label in range(4, 10):
+            h, w = rng.integers(1, 4, size=2)
+            r, c = rng.choice([0, 12 - h]), rng.choice([0, 12 - w])
+            if label > 6:  # away from the frame corners too
+                r, c = rng.integers(0, 12 - h), rng.integers(0, 12 - w)
+            grains[r:r + h, c:c + w] = label
+        shear = rng.gamma(2, 0.01, size=grains.shape)
+        table = grain_table_timepoint(grains)
+        bboxes = table[['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']].to_numpy()
+        thresholds = grain_thresholds(grains, shear, 0.8, 0.)
+        frame = ThresholdedFrame(grains, shear, 0.8, 0., median_filter)
+        crops = frame.crops(table['label'], bboxes)
+        for lab, (r0, c0, r1, c1), crop in zip(
+                table['label'], bboxes, crops):
+            image = np.where(grains[r0:r1, c0:c1] == lab,
+                             shear[r0:r1, c0:c1], np.nan) > thresholds[lab]
+            image = ndimage.median_filter(image, size=median_filter)
+            np.testing.assert_array_equal(crop, image)
+
+
+class _FakeMap:
+    """Stands in for a DIC map: a list of grains with linked EBSD grains."""
+    def __init__(self, ebsd_grains):
+        self.grains = [types.SimpleNamespace(ebsd_grain=g)
+                       for g in ebsd_grains]
+
+    def __getitem__(self, i):
+        return self.grains[i]
+
+
+def _fake_map(seed=0):
+    rng = np.random.default_rng(seed)
+    fcc = Phase('Ni', 11, 225, (3.5, 3.5, 3.5) + (np.pi / 2,) * 3)
+    hcp = Phase('Ti', 9, 194, (2.95, 2.95, 4.68, np.pi / 2, np.pi / 2,
+                               2 * np.pi / 3))
+    ebsd_grains = []
+    for phase in [fcc, hcp, fcc, hcp]:
+        ori = Quat.from_euler_angles(*rng.uniform(0, [2 * np.pi, np.pi,
+                                                      2 * np.pi]))
+        sfs = [list(rng.random(len(group))) for group in phase.slip_systems]
+        ebsd_grains.append(types.SimpleNamespace(
+                phase=phase, ref_ori=ori, average_schmid_factors=sfs,
+                ))
+    return _FakeMap(ebsd_grains + [None])
+
+
+def test_slip_system_table():
+    dicmap = _fake_map()
+    table = slip_system_table(dicmap)
+    assert slip_system_table(dicmap) is table
+    assert table.sf.shape == (5, 10)  # hexagonal phases have 10 planes
+    for i, grain in enumerate(dicmap.grains[:4]):
+        ebsd_grain = grain.ebsd_grain
+        Grain.calc_slip_traces(ebsd_grain)
+        info = get_slipsystem_info2(i, dicmap)
+        assert len(info) == len(ebsd_grain.phase.slip_systems)
+        np.testing.assert_allclose(
+                info['angle_deg'],
+                np.rad2deg(ebsd_grain.slip_trace_angles) % 360,
+                )
+        np.testing.assert_allclose(
+                info['sf'], [max(s) for s in ebsd_grain.average_schmid_factors]
+                )
+    assert table.n_planes(4) == 0
+    assert len(table.grain(4)['angle_deg']) == 0
+    assert len(table.to_dataframe()) == 4 + 10 + 4 + 10
+    # finding the grains again replaces the grain list, and the table
+    dicmap.grains = list(dicmap.grains)
+    assert slip_system_table(dicmap) is not table
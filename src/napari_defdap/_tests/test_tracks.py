@@ -0,0 +1,78 @@
+import numpy as np
+from skimage import measure
+
+from napari_defdap._features import grain_table
+from napari_defdap._tracks import (
+        centroids_from_seg, link_by_overlap, tracks_from_seg,
+        tracks_with_shear,
+        )
+
+
+def _drifting_grains(n_timepoints=4, shape=(80, 80), seed=0):
+    """Random grains, shifted by one pixel per timepoint and relabelled."""
+    rng = np.random.default_rng(seed)
+    grains0 = measure.label(rng.random((shape[0] + 8, shape[1])) > 0.3)
+    stack = []
+    for t in range(n_timepoints):
+        frame = grains0[t:t + shape[0]]
+        # relabel with a random permutation, to exercise the linking
+        perm = np.concatenate([[0], rng.permutation(grains0.max()) + 1])
+        stack.append(perm[frame])
+    return np.stack(stack)
+
+
+def test_centroids_match_grain_table():
+    seg = _drifting_grains()
+    t, labels, coords = centroids_from_seg(seg)
+    table = grain_table(seg)
+    np.testing.assert_array_equal(t, table['t'])
+    np.testing.assert_array_equal(labels, table['label'])
+    np.testing.assert_allclose(coords[:, 0], table['centroid-0'])
+    np.testing.assert_allclose(coords[:, 1], table['centroid-1'])
+    t2, labels2, coords2 = centroids_from_seg(np.moveaxis(seg, 0, 2), 2)
+    np.testing.assert_array_equal(labels2, labels)
+    np.testing.assert_allclose(coords2, coords)
+
+
+def test_link_by_overlap():
+    seg = _drifting_grains()
+    track_ids = link_by_overlap(seg)
+    # a grain keeps its track id when it moves
+    for t in range(1, seg.shape[0]):
+        interior = (seg[t - 1, 1:] > 0) & (seg[t, :-1] > 0)
+        prev_ids = track_ids[t - 1][seg[t - 1, 1:][interior]]
+        ids = track_ids[t][seg[t, :-1][interior]]
+        assert np.mean(prev_ids == ids) > 0.95
+
+
+def test_tracks_from_seg_linkers_agree():
+    seg = _drifting_grains()
+    tracks_tp = tracks_from_seg(seg, linker='trackpy')
+    tracks_ov = tracks_from_seg(seg, linker='overlap')
+    assert tracks_tp.shape == tracks_ov.shape
+    np.testing.assert_allclose(tracks_tp[:, 1:], tracks_ov[:, 1:])
+    # same partition of points into tracks, up to track id renumbering
+    _, inv_tp = np.unique(tracks_tp[:, 0], return_inverse=True)
+    _, inv_ov = np.unique(tracks_ov[:, 0], return_inverse=True)
+    pairs = set(zip(inv_tp, inv_ov))
+    assert len(pairs) < 1.05 * len(set(inv_ov))
+
+
+def test_tracks_with_shear():
+    seg = _drifting_grains()
+    # each grain's shear grows with time
+    shear = seg / seg.max() + np.arange(seg.shape[0])[:, None, None]
+    tracks, features = tracks_with_shear(
+            seg, shear, linker='overlap', thresholds=(1,)
+            )
+    assert len(features) == len(tracks)
+    np.testing.assert_array_equal(features['track_id'], tracks[:, 0])
+    np.testing.assert_array_equal(features['t'], tracks[:, 1])
+    # the joined statistics are those of the point's grain
+    for row in features.itertuples():
+        values = shear[row.t][seg[row.t] == row.label]
+        assert row.area == values.size
+        np.testing.assert_allclose(row.mean_shear, values.mean())
+    np.testing.assert_array_equal(
+            features['fraction_above_1'], features['t'] > 0
+            )
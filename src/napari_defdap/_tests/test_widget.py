@@ -1,7 +1,19 @@
+import threading
+
 import numpy as np
 import pandas as pd
+import pytest
+from qtpy.QtCore import QCoreApplication, QEvent
+
+from napari.components import ViewerModel
+from napari.layers import Tracks
 
-from napari_defdap._track_focus import set_track_focus
+from napari_defdap import _widget
+from napari_defdap._reader import _stack_timepoints
+from napari_defdap._track_focus import (
+        _track_index, _track_indices, invalidate_track_index,
+        set_track_focus,
+        )
 
 
 def test_track_focus(make_napari_viewer, qtbot):
@@ -23,3 +35,223 @@ def test_track_focus(make_napari_viewer, qtbot):
     qtbot.addWidget(widget.native)
     widget(viewer, tracks_layer, 1)
     assert viewer.camera.center[-2:] == (25, 25)
+
+
+def test_track_index():
+    tracks = np.array([
+        [2, 1, 5, 5],
+        [1, 0, 12, 12],
+        [2, 0, 4, 4],
+        [1, 2, 25, 25],
+        [1, 1, 15, 15],
+    ])
+    columns = ['track_id', 't', 'y', 'x']
+    layer = Tracks(tracks, features=pd.DataFrame(tracks, columns=columns))
+    index = _track_index(layer)
+    assert _track_index(layer) is index
+    np.testing.assert_array_equal(index.locate(1, 1.0), [1, 15, 15])
+    np.testing.assert_array_equal(index.locate(2, 0), [0, 4, 4])
+    # absent timepoint: last point of the track
+    np.testing.assert_array_equal(index.locate(2, 4.0), [1, 5, 5])
+    assert index.locate(3, 0) is None
+    # the index is rebuilt when the features change
+    layer.features = pd.DataFrame(tracks + [1, 0, 0, 0], columns=columns)
+    new_index = _track_index(layer)
+    assert new_index is not index
+    assert new_index.locate(1, 0) is None
+    assert _track_index(layer) is new_index
+    # ... or the data
+    layer.data = tracks
+    assert layer not in _track_indices
+    layer.features = pd.DataFrame(tracks, columns=columns)
+    assert _track_index(layer) is not new_index
+    # in place edits need an explicit invalidation
+    index = _track_index(layer)
+    layer.features['t'] -= 1
+    assert _track_index(layer) is index
+    invalidate_track_index(layer)
+    edited_index = _track_index(layer)
+    assert edited_index is not index
+    np.testing.assert_array_equal(edited_index.locate(1, 0), [0, 15, 15])
+
+
+def _shifting_grains(n_timepoints=3, shape=(40, 48)):
+    """Four grains whose boundaries move with time, and their shear."""
+    grains = np.empty((n_timepoints,) + shape, dtype=np.int32)
+    rows, cols = np.indices(shape)
+    for t in range(n_timepoints):
+        grains[t] = 1 + (rows >= 15 + 2 * t) * 2 + (cols >= 20 + 3 * t)
+    shear = np.random.default_rng(0).gamma(2, 0.01, size=grains.shape)
+    return grains, shear
+
+
+def _grain_plots(qtbot, grains, shear, metadata=None, **kwargs):
+    """A `GrainPlots` widget on a viewer model, which needs no OpenGL."""
+    viewer = ViewerModel()
+    viewer.add_image(shear)
+    viewer.add_labels(grains, metadata=metadata or {})
+    widget = _widget.GrainPlots(viewer, **kwargs)
+    qtbot.addWidget(widget)
+    _wait_drawn(qtbot, widget)
+    return viewer, widget
+
+
+def _wait_drawn(qtbot, widget):
+    qtbot.waitUntil(lambda: widget._worker is None, timeout=10000)
+
+
+def _record_plots(monkeypatch):
+    """Record the label of each grain plotted."""
+    drawn = []
+    monkeypatch.setattr(
+            _widget, 'plot_shear', lambda prop, ax: drawn.append(prop.label)
+            )
+    return drawn
+
+
+def test_grain_plots_draw_only_latest_selection(qtbot, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_radon(prop, **kwargs):
+        if prop.label == 1:
+            started.set()
+            release.wait(10)
+        return np.zeros(180)
+
+    monkeypatch.setattr(_widget, 'compute_radon', slow_radon)
+    drawn = _record_plots(monkeypatch)
+    grains, shear = _shifting_grains()
+    viewer = ViewerModel()
+    viewer.add_image(shear)
+    layer = viewer.add_labels(grains)
+    layer.selected_label = 3
+    widget = _widget.GrainPlots(viewer, prefetch=False)
+    qtbot.addWidget(widget)
+    _wait_drawn(qtbot, widget)
+    assert drawn == [3]
+    slip_systems = []
+    widget._slip_systems = lambda idx, grain_id: slip_systems.append(grain_id)
+
+    layer.selected_label = 1
+    first = widget._worker
+    assert started.wait(10)
+    layer.selected_label = 2
+    with qtbot.waitSignal(first.finished, timeout=10000):
+        release.set()
+    _wait_drawn(qtbot, widget)
+    # the first worker quit before computing its slip systems
+    assert drawn == [3, 2]
+    assert slip_systems == [1]
+    # results of superseded selections are never drawn
+    plot_data = widget._grain((1,), 1), np.zeros(180), None
+    widget._draw(widget._request - 1, (1,), 1, plot_data)
+    assert drawn == [3, 2]
+
+
+def _wait_prefetched(widget):
+    for future in widget._prefetching:
+        future.result(timeout=10)
+
+
+def test_grain_plots_cache_and_prefetch(qtbot, monkeypatch):
+    computed = []
+
+    def radon(prop, **kwargs):
+        computed.append((prop.label, prop.bbox))
+        return np.zeros(180)
+
+    monkeypatch.setattr(_widget, 'compute_radon', radon)
+    grains, shear = _shifting_grains()
+    viewer, widget = _grain_plots(qtbot, grains, shear)
+    assert viewer.dims.current_step[0] == 1
+    # grain 1 at t=1, then prefetched at t=0 and t=2
+    _wait_prefetched(widget)
+    assert widget._grain_radon.cache_info().currsize == 3
+    assert len(computed) == 3
+    viewer.dims.set_current_step(0, 0)
+    _wait_drawn(qtbot, widget)
+    _wait_prefetched(widget)
+    layer = viewer.layers[1]
+    layer.selected_label = 2
+    _wait_drawn(qtbot, widget)
+    layer.selected_label = 1
+    _wait_drawn(qtbot, widget)
+    _wait_prefetched(widget)
+    info = widget._grain_radon.cache_info()
+    assert info.misses == 3 + 2  # grain 2 at t=0, and prefetched at t=1
+    assert info.hits >= 3
+    assert len(computed) == 5
+
+    # new layer data clears the cache
+    computed.clear()
+    flipped = grains[:, ::-1].copy()
+    layer.data = flipped
+    _wait_drawn(qtbot, widget)
+    _wait_prefetched(widget)
+    assert widget._grain_radon.cache_info().hits == 0
+    assert len(computed) == widget._grain_radon.cache_info().currsize == 2
+    rows, cols = np.nonzero(flipped[0] == 1)
+    bbox = rows.min(), cols.min(), rows.max() + 1, cols.max() + 1
+    assert computed[0] == (1, bbox)
+
+
+@pytest.mark.parametrize('how', ['close', 'destroy'])
+def test_grain_plots_shut_down_prefetcher(qtbot, how):
+    grains, shear = _shifting_grains()
+    viewer = ViewerModel()
+    viewer.add_image(shear)
+    viewer.add_labels(grains)
+    widget = _widget.GrainPlots(viewer)
+    _wait_drawn(qtbot, widget)
+    prefetcher = widget._prefetcher
+    if how == 'close':
+        widget.close()
+    else:
+        widget.deleteLater()
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    with pytest.raises(RuntimeError):
+        prefetcher.submit(print)
+
+
+def test_grain_plots_reader_table_matches_computed(qtbot, monkeypatch):
+    drawn = []
+    monkeypatch.setattr(
+            _widget, 'plot_shear', lambda prop, ax: drawn.append(prop)
+            )
+    grains, shear = _shifting_grains()
+    results = [(None, None, g, m, np.ones(g.shape, dtype=np.uint8))
+               for g, m in zip(grains, shear)]
+    _, _, stacked, stacked_shear, _, table, _ = _stack_timepoints(
+            results, len(results), 10
+            )
+    viewer, reader = _grain_plots(
+            qtbot, stacked, stacked_shear, metadata={'grain_table': table},
+            prefetch=False,
+            )
+    # the reader's table is split per timepoint up front
+    assert sorted(reader.tables) == [(0,), (1,), (2,)]
+    other_viewer, computed = _grain_plots(
+            qtbot, grains, shear, prefetch=False
+            )
+    # without one, tables are computed for the timepoints visited
+    assert list(computed.tables) == [(1,)]
+    for widget_viewer in (viewer, other_viewer):
+        widget_viewer.layers[1].selected_label = 4
+        widget_viewer.dims.set_current_step(0, 2)
+    _wait_drawn(qtbot, reader)
+    _wait_drawn(qtbot, computed)
+    assert sorted(computed.tables) == [(1,), (2,)]
+    *_, from_reader, from_computed = drawn
+    for prop in (from_reader, from_computed):
+        assert prop.label == 4
+        assert prop.bbox == (19, 26, 40, 48)
+    np.testing.assert_array_equal(from_reader.image, from_computed.image)
+    for t in range(3):
+        for lab in range(1, 5):
+            a, b = reader._grain((t,), lab), computed._grain((t,), lab)
+            assert a.bbox == b.bbox
+            np.testing.assert_array_equal(a.image, b.image)
+            np.testing.assert_array_equal(
+                    a.intensity_image, b.intensity_image
+                    )
+        assert reader._grain((t,), 5) is computed._grain((t,), 5) is None
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from napari_defdap._features import grain_table
+
+zarr = pytest.importorskip('zarr')
+
+from napari_defdap._zarr import (  # noqa: E402
+        napari_get_reader, read_zarr, write_zarr,
+        )
+
+
+def _layer_data(shape=(3, 70, 90)):
+    rng = np.random.default_rng(0)
+    max_shear = rng.random(shape)
+    grains = rng.integers(0, 20, size=shape).astype(np.uint16)
+    phase = rng.integers(0, 3, size=shape).astype(np.uint8)
+    metadata = {'grain_table': grain_table(grains, max_shear),
+                'dicmap': {}, 'ebsdmap': {}}
+    joint = {'scale': (1, 0.5, 0.5), 'metadata': metadata}
+    return [
+            (max_shear, {**joint, 'name': 'max_shear',
+                         'contrast_limits': [0.01, 0.99],
+                         'colormap': 'viridis'}, 'image'),
+            (grains, {**joint, 'name': 'grains'}, 'labels'),
+            (phase, {**joint, 'name': 'phase', 'features': {
+                    'index': np.arange(3),
+                    'names': ['not indexed', 'Ni', 'Fe'],
+                    }}, 'labels'),
+            ]
+
+
+def test_roundtrip(tmp_path):
+    layer_data = _layer_data()
+    path = str(tmp_path / 'test.defdap.zarr')
+    write_zarr(layer_data, path, chunk_size=32)
+    assert napari_get_reader(path + '/') is read_zarr
+    assert napari_get_reader(str(tmp_path / 'test.zarr')) is None
+    (shear, shear_kw, _), (grains, _, _), (phase, phase_kw, _) = (
+            read_zarr(path)
+            )
+    assert len(shear) == len(grains) == 3
+    np.testing.assert_allclose(shear[0][:], layer_data[0][0])
+    np.testing.assert_array_equal(grains[0][:], layer_data[1][0])
+    np.testing.assert_array_equal(grains[2][:], layer_data[1][0][:, ::4, ::4])
+    assert grains[0].chunks == (1, 32, 32)
+    assert shear_kw['scale'] == (1, 0.5, 0.5)
+    assert shear_kw['contrast_limits'] == [0.01, 0.99]
+    assert phase_kw['features']['names'] == ['not indexed', 'Ni', 'Fe']
+    table = shear_kw['metadata']['grain_table']
+    expected = layer_data[0][1]['metadata']['grain_table']
+    np.testing.assert_array_equal(table.columns, expected.columns)
+    np.testing.assert_allclose(table.to_numpy(), expected.to_numpy())
+    with pytest.raises(FileExistsError):
+        write_zarr(layer_data, path)  # don't overwrite by default
+    write_zarr(layer_data, path, levels=1, overwrite=True)
+    assert read_zarr(path)[0][0].shape == (3, 70, 90)
@@ -1,7 +1,77 @@
+import weakref
 from typing import Annotated
 
+import numpy as np
 from magicgui import magic_factory
 
+# tracks layer -> TrackIndex, dropped when the layer's tracks change
+_track_indices = weakref.WeakKeyDictionary()
+
+
+class TrackIndex:
+    """Index of the rows of a tracks features table by track id and time.
+
+    The rows are sorted by track id, then time, once. Each track is then a
+    contiguous range of rows, found with a dictionary lookup, and the row
+    at a given timepoint is found by binary search within that range.
+
+    Parameters
+    ----------
+    features : pandas.DataFrame
+        The features table of a tracks layer, with columns 'track_id',
+        't', 'y' and 'x'.
+    """
+    def __init__(self, features):
+        track_id = features['track_id'].to_numpy()
+        t = features['t'].to_numpy()
+        order = np.lexsort((t, track_id))
+        self.t = t[order]
+        self.coords = features[['t', 'y', 'x']].to_numpy()[order]
+        ids, starts = np.unique(track_id[order], return_index=True)
+        stops = np.append(starts[1:], len(order))
+        self.ranges = dict(zip(ids.tolist(), zip(starts, stops)))
+
+    def locate(self, track_id, t):
+        """Return the (t, y, x) of a track at time ``t``, or None.
+
+        If the track is not present at ``t``, its last point is returned.
+        """
+        if track_id not in self.ranges:
+            return None
+        start, stop = self.ranges[track_id]
+        i = start + np.searchsorted(self.t[start:stop], t)
+        if i == stop or self.t[i] != t:
+            i = stop - 1
+        return self.coords[i]
+
+
+def invalidate_track_index(layer):
+    """Drop the cached `TrackIndex` of ``layer``.
+
+    The index is rebuilt automatically when the data, features or
+    properties of the layer are set, but napari sends no event when the
+    features table is edited in place, e.g. with
+    ``layer.features['t'] = ...``: call this after such edits.
+    """
+    _track_indices.pop(layer, None)
+
+
+def _invalidate_track_index(event):
+    invalidate_track_index(event.source)
+
+
+def _track_index(layer):
+    """Return the `TrackIndex` of ``layer``, building it if needed."""
+    index = _track_indices.get(layer)
+    if index is None:
+        index = TrackIndex(layer.features)
+        _track_indices[layer] = index
+        for name in ('data', 'features', 'properties'):
+            emitter = getattr(layer.events, name, None)
+            if emitter is not None:
+                emitter.connect(_invalidate_track_index)
+    return index
+
 
 @magic_factory(auto_call=True)
 def set_track_focus(
@@ -10,18 +80,13 @@ def set_track_focus(
         track_id: Annotated[int, {'max': 1_000_000, 'step': 1}],
         ):
     """Given a tracks layer and a track id, set camera focus on that track."""
-    df = layer.features  # make sure to add the dataframe to the tracks layer
-    track_locations = df.loc[df['track_id'] == track_id, ['t', 'y', 'x']]
-    if track_locations.shape[0] == 0:
+    # make sure to add the dataframe to the tracks layer
+    location = _track_index(layer).locate(track_id, viewer.dims.point[0])
+    if location is None:
         return
-    current_timepoint = float(viewer.dims.point[0])
-    if current_timepoint not in list(track_locations.t):
-        current_timepoint = track_locations.t.iloc[-1]
-    new_point = track_locations[
-            track_locations.t == current_timepoint
-            ].to_numpy()[0] * layer.scale
+    new_point = location * layer.scale
     viewer.dims.point = tuple(new_point)
     if viewer.dims.ndisplay == 2:
         viewer.camera.center = new_point[1:]
     else:
-        viewer.camera.center = new_point
\ No newline at end of file
+        viewer.camera.center = new_point
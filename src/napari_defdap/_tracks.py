@@ -1,34 +1,292 @@
 import numpy as np
+import pandas as pd
 import trackpy as tpy
-from skimage import measure
+from scipy import sparse
 
+from ._features import _flat_labels, shear_statistics, split_by_timepoint
 
-def _slice(ndim, ax, i):
-    output = [slice(None),] * ndim
-    output[ax] = i
-    return tuple(output)
 
+def centroids_from_seg(seg, time_axis=0):
+    """Compute the centroid of every label in every timepoint in one pass.
 
-def points_from_seg(seg, time_axis=0, include_non_indexed=True):
-    coords_iter = []
-    for i in range(seg.shape[time_axis]):
-        seg_t = seg[_slice(seg.ndim, time_axis, i)]
-        seg_clipped = np.clip(seg_t, 0, None)
-        props = measure.regionprops_table(
-                seg_clipped, properties=('centroid',)
-                )
-        coords = np.column_stack(
-                [props[f'centroid-{i}'] for i in range(seg_t.ndim)]
+    Each pixel is assigned a combined (timepoint, label) index, and the
+    coordinate sums and pixel counts of all grains in the stack are then
+    computed with one `np.bincount` per axis.
+
+    Parameters
+    ----------
+    seg : np.ndarray of int
+        The grains stack. Labels <= 0 are ignored.
+    time_axis : int
+        The axis of ``seg`` indexing time.
+
+    Returns
+    -------
+    t : np.ndarray of int
+        The timepoint of each grain.
+    labels : np.ndarray of int
+        The label of each grain.
+    coords : np.ndarray of float, shape (n_grains, seg.ndim - 1)
+        The centroid of each grain, with grains sorted by timepoint, then
+        label.
+    """
+    seg = np.moveaxis(seg, time_axis, 0)
+    n_labels = int(seg.max(initial=0)) + 1
+    index = _flat_labels(seg).reshape(seg.shape[0], -1)
+    index = (index + n_labels * np.arange(seg.shape[0])[:, np.newaxis])
+    index = index.ravel()
+    counts = np.bincount(index, minlength=n_labels * seg.shape[0])
+    present = np.flatnonzero(counts)
+    present = present[present % n_labels != 0]
+    coords = []
+    for ax in range(1, seg.ndim):
+        shape = [1] * seg.ndim
+        shape[ax] = -1
+        weights = np.broadcast_to(
+                np.arange(seg.shape[ax], dtype=float).reshape(shape),
+                seg.shape,
                 )
-        coords_iter.append(coords)
-    return coords_iter
+        sums = np.bincount(index, weights=weights.ravel())
+        coords.append(sums[present] / counts[present])
+    t, labels = np.divmod(present, n_labels)
+    return t, labels, np.column_stack(coords)
+
+
+def points_from_seg(seg, time_axis=0, include_non_indexed=True, table=None):
+    """Return the grain centroids in each timepoint of a segmentation.
+
+    Parameters
+    ----------
+    seg : np.ndarray of int
+        The grains stack.
+    time_axis : int
+        The axis of ``seg`` indexing time.
+    include_non_indexed : bool
+        Unused.
+    table : pandas.DataFrame, optional
+        The grain table of ``seg``, as computed by
+        `napari_defdap._features.grain_table`, for example from the grains
+        layer metadata. If not given, the centroids are computed with
+        `centroids_from_seg`.
+
+    Returns
+    -------
+    coords_iter : list of np.ndarray of float
+        The centroid coordinates of the grains in each timepoint, in label
+        order.
+    """
+    return _points_and_labels(seg, time_axis, table)[0]
+
+
+def _points_and_labels(seg, time_axis=0, table=None):
+    """`points_from_seg`, and the labels of the points in each timepoint."""
+    n_timepoints = seg.shape[time_axis]
+    if table is None:
+        t, labels, coords = centroids_from_seg(seg, time_axis)
+        bounds = np.searchsorted(t, np.arange(1, n_timepoints))
+        return np.split(coords, bounds), np.split(labels, bounds)
+    ndim = seg.ndim - 1
+    columns = [f'centroid-{i}' for i in range(ndim)]
+    tables = split_by_timepoint(table, n_timepoints)
+    return ([table_t[columns].to_numpy() for table_t in tables],
+            [table_t['label'].to_numpy() for table_t in tables])
+
+
+def _overlap_matches(labels0, labels1, min_overlap):
+    """Match labels in consecutive frames by their shared pixels.
+
+    Builds the sparse contingency matrix of the two frames and keeps the
+    pairs of labels that are each other's best match and whose overlap
+    covers at least ``min_overlap`` of the later grain.
+
+    Returns
+    -------
+    matches : np.ndarray of int, shape (n_labels1,)
+        For each label in ``labels1`` (indexed by label), the matching label
+        in ``labels0``, or 0 if there is none.
+    """
+    a = _flat_labels(labels0)
+    b = _flat_labels(labels1)
+    both = (a > 0) & (b > 0)
+    shape = (int(a.max(initial=0)) + 1, int(b.max(initial=0)) + 1)
+    contingency = sparse.coo_matrix(
+            (np.ones(np.count_nonzero(both)), (a[both], b[both])),
+            shape=shape,
+            ).tocsr()
+    best_prev = np.asarray(contingency.argmax(axis=0)).ravel()
+    best_next = np.asarray(contingency.argmax(axis=1)).ravel()
+    overlap = np.asarray(contingency.max(axis=0).todense()).ravel()
+    area = np.bincount(b, minlength=shape[1])
+    mutual = best_next[best_prev] == np.arange(shape[1])
+    enough = overlap >= min_overlap * np.maximum(area, 1)
+    matches = np.where(mutual & enough & (overlap > 0), best_prev, 0)
+    matches[0] = 0
+    return matches
+
+
+def link_by_overlap(seg, time_axis=0, min_overlap=0.5):
+    """Link grains across timepoints by the pixels they share.
 
+    Parameters
+    ----------
+    seg : np.ndarray of int
+        The grains stack.
+    time_axis : int
+        The axis of ``seg`` indexing time.
+    min_overlap : float
+        The minimum fraction of a grain's area that must overlap its match
+        in the previous timepoint.
 
-def tracks_from_seg(seg, time_axis=0):
-    coords_iter = points_from_seg(seg, time_axis)
-    linked = tpy.link_iter(coords_iter, 8., adaptive_stop=0.5, adaptive_step=0.5)
+    Returns
+    -------
+    track_ids : list of np.ndarray of int
+        For each timepoint, the track id of each label (indexed by label),
+        or -1 for labels not present.
+    """
+    seg = np.moveaxis(seg, time_axis, 0)
+    track_ids = []
+    next_id = 0
+    for t in range(seg.shape[0]):
+        present = np.bincount(_flat_labels(seg[t])) > 0
+        present[0] = False
+        ids = np.full(len(present), -1, dtype=np.intp)
+        if t > 0:
+            matches = _overlap_matches(seg[t - 1], seg[t], min_overlap)
+            matched = present & (matches > 0)
+            ids[matched] = track_ids[-1][matches[matched]]
+        new = present & (ids < 0)
+        n_new = np.count_nonzero(new)
+        ids[new] = np.arange(next_id, next_id + n_new)
+        next_id += n_new
+        track_ids.append(ids)
+    return track_ids
+
+
+def tracks_from_seg(
+        seg, time_axis=0, table=None, linker='trackpy', search_range=8.,
+        min_overlap=0.5, return_labels=False,
+        ):
+    """Track grains across the timepoints of a segmentation.
+
+    Parameters
+    ----------
+    seg : np.ndarray of int
+        The grains stack.
+    time_axis : int
+        The axis of ``seg`` indexing time.
+    table : pandas.DataFrame, optional
+        The grain table of ``seg``, used for the centroids if given.
+    linker : {'trackpy', 'overlap'}
+        Link grain centroids with `trackpy.link_iter`, or link grains that
+        share pixels in consecutive timepoints with `link_by_overlap`,
+        which scales to many more grains per frame.
+    search_range : float
+        The trackpy search range, in pixels.
+    min_overlap : float
+        The minimum overlap for the 'overlap' linker.
+    return_labels : bool
+        Whether to also return the grain label of each point.
+
+    Returns
+    -------
+    tracks : np.ndarray of float, shape (n_points, 2 + seg.ndim - 1)
+        The tracks, with columns (track_id, t, y, x), in napari's format.
+    labels : np.ndarray of int, shape (n_points,)
+        The label of each point in its timepoint, if ``return_labels`` is
+        True.
+    """
+    coords_iter, labels_iter = _points_and_labels(seg, time_axis, table)
+    if linker == 'trackpy':
+        linked = tpy.link_iter(
+                coords_iter, search_range, adaptive_stop=0.5,
+                adaptive_step=0.5,
+                )
+    elif linker == 'overlap':
+        track_ids = link_by_overlap(seg, time_axis, min_overlap=min_overlap)
+        linked = ((t, ids[ids >= 0]) for t, ids in enumerate(track_ids))
+    else:
+        raise ValueError(
+                f"linker must be 'trackpy' or 'overlap', got {linker!r}"
+                )
     linked_arrays = []
     for coords, (t, ids) in zip(coords_iter, linked):
         tarr, idsarr = np.broadcast_arrays(t, ids)
         linked_arrays.append(np.column_stack((idsarr, tarr, coords)))
-    return np.concatenate(linked_arrays, axis=0)
\ No newline at end of file
+    tracks = np.concatenate(linked_arrays, axis=0)
+    if return_labels:
+        return tracks, np.concatenate(labels_iter)
+    return tracks
+
+
+def join_track_statistics(tracks, labels, statistics):
+    """Join per-(timepoint, label) statistics onto the points of tracks.
+
+    Parameters
+    ----------
+    tracks : np.ndarray of float, shape (n_points, D + 2)
+        Tracks in napari's format, as returned by `tracks_from_seg`.
+    labels : np.ndarray of int, shape (n_points,)
+        The grain label of each point.
+    statistics : pandas.DataFrame
+        A table with 't' and 'label' columns, such as that of
+        `napari_defdap._features.shear_statistics`.
+
+    Returns
+    -------
+    features : pandas.DataFrame
+        One row per point, in the order of ``tracks``, with columns
+        'track_id', 't', the coordinates ('y', 'x'), 'label', and the other
+        columns of ``statistics``. It can be used as the features of a
+        napari Tracks layer of ``tracks``.
+    """
+    axes = ['z', 'y', 'x'][-(tracks.shape[1] - 2):]
+    features = pd.DataFrame(tracks, columns=['track_id', 't'] + axes)
+    features = features.astype({'track_id': int, 't': int})
+    features['label'] = labels
+    statistics = statistics.astype(
+            {'t': int, 'label': features['label'].dtype}
+            )
+    return features.merge(
+            statistics, how='left', on=['t', 'label'], validate='m:1',
+            )
+
+
+def tracks_with_shear(
+        seg, shear, time_axis=0, table=None, percentiles=(50, 90, 99),
+        thresholds=(), **link_kwargs,
+        ):
+    """Track grains and compute the evolution of their shear statistics.
+
+    Parameters
+    ----------
+    seg : np.ndarray of int
+        The grains stack.
+    shear : np.ndarray of float
+        The max shear stack.
+    time_axis : int
+        The axis of ``seg`` and ``shear`` indexing time.
+    table : pandas.DataFrame, optional
+        The grain table of ``seg``, used for the centroids if given.
+    percentiles, thresholds
+        The shear statistics to compute, see
+        `napari_defdap._features.shear_statistics_timepoint`.
+    **link_kwargs
+        Passed on to `tracks_from_seg`, such as ``linker``.
+
+    Returns
+    -------
+    tracks : np.ndarray of float
+        The tracks, as returned by `tracks_from_seg`.
+    features : pandas.DataFrame
+        The shear statistics of each point of the tracks, see
+        `join_track_statistics`. Add both to napari with
+        ``viewer.add_tracks(tracks, features=features)``.
+    """
+    tracks, labels = tracks_from_seg(
+            seg, time_axis, table=table, return_labels=True, **link_kwargs
+            )
+    statistics = shear_statistics(
+            seg, shear, time_axis, percentiles=percentiles,
+            thresholds=thresholds,
+            )
+    return tracks, join_track_statistics(tracks, labels, statistics)
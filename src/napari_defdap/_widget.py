@@ -1,29 +1,79 @@
 """
 see: https://napari.org/stable/plugins/guides.html?#widgets
 """
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import TYPE_CHECKING
 
 import numpy as np
 import matplotlib.pyplot as plt
-from skimage import measure
 try:
     from napari_matplotlib.base import NapariMPLWidget
     napari_mpl_available = True
 except ImportError:
     napari_mpl_available = False
+from napari.qt.threading import create_worker
 from qtpy.QtWidgets import QHBoxLayout, QWidget
 
+from ._features import GrainCrop, grain_table_timepoint, split_by_timepoint
 from ._plot_functions import plot_slip_detection_plot, plot_shear
-from ._slips import compute_radon
+from ._pyramid import full_resolution
+from ._slips import compute_radon, slip_system_table
 
 if TYPE_CHECKING:
     import napari
 
 
+def _shutdown(executor):
+    """Shut down ``executor`` without waiting for the running task."""
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
 class GrainPlots(QWidget):
-    def __init__(self, napari_viewer: 'napari.viewer.Viewer', parent=None):
+    """Plot the shear and slip band angles of the selected grain.
+
+    Radon profiles are memoised in an LRU cache of ``cache_size`` entries,
+    keyed by timepoint, label, threshold parameters and radon engine (see
+    `sb_angle`). If ``prefetch`` is True, the profiles of the selected
+    grain in the neighbouring timepoints are computed in a background
+    thread. The slip systems of all the grains of a timepoint are computed
+    together, the first time one of them is selected (see
+    `slip_system_table`).
+
+    Multiscale layers, such as those read from .defdap.zarr stores, are
+    analysed at full resolution. If the layers have no DefDAP maps in their
+    metadata, the slip systems are not plotted. When the layer data
+    changes, for example when the project is reloaded, the caches are
+    cleared.
+
+    The plots are computed in a napari worker thread so that the viewer
+    stays responsive. When the selection changes, the running worker is
+    asked to quit, and results from superseded selections are discarded.
+    The prefetching thread is shut down when the widget is closed or
+    destroyed.
+    """
+    def __init__(
+            self, napari_viewer: 'napari.viewer.Viewer', parent=None,
+            cache_size=256, prefetch=True,
+            ):
         super().__init__(parent=parent)
         self.viewer = napari_viewer
+        self.threshold_multiplier = 1.6
+        self.minimum_threshold = 0.013
+        self.radon_engine = 'skimage'
+        self._grain_radon = functools.lru_cache(maxsize=cache_size)(
+                self._compute_grain_radon
+                )
+        self._prefetcher = (
+                ThreadPoolExecutor(max_workers=1) if prefetch else None
+                )
+        self._prefetching = []
+        if self._prefetcher is not None:
+            # a bound method would not be called once self is destroyed
+            prefetcher = self._prefetcher
+            self.destroyed.connect(lambda *args: _shutdown(prefetcher))
+        self._worker = None
+        self._request = 0
         if not napari_mpl_available:
             raise RuntimeError('napari-matplotlib is not installed.')
         with plt.style.context('dark_background'):
@@ -38,23 +88,9 @@ class GrainPlots(QWidget):
                                  type(layer).__name__ == 'Labels')
         self.intensity_layer = next(layer for layer in napari_viewer.layers
                                     if type(layer).__name__ == 'Image')
-        grains, shear = np.broadcast_arrays(
-                self.grains_layer.data, self.intensity_layer.data
-                )
-        self.grains = grains
-        self.shear = shear
-        self.ndim = grains.ndim
-        self.props = {}
-        self.props_dict = {}
-        for idx in np.ndindex(grains.shape[:-2]):
-            self.props[idx] = measure.regionprops(
-                    np.clip(grains[idx], 0, None), intensity_image=shear[idx]
-                    )
-            self.props_dict.update(
-                    {idx + (prop.label,): prop for prop in self.props[idx]}
-                    )
-        self.dic = self.grains_layer.metadata['dicmap']
-        self.ebsd = self.grains_layer.metadata['ebsdmap']
+        self._set_data()
+        self.grains_layer.events.data.connect(self._data_changed)
+        self.intensity_layer.events.data.connect(self._data_changed)
         self._sel_callback = self.grains_layer.events.selected_label.connect(
                 self._update_plots
                 )
@@ -63,20 +99,145 @@ class GrainPlots(QWidget):
                 )
         self.grains_layer.events.selected_label()
 
+    def closeEvent(self, event):
+        if self._prefetcher is not None:
+            _shutdown(self._prefetcher)
+            self._prefetcher = None
+        self._prefetching = []
+        if self._worker is not None:
+            self._worker.quit()
+        super().closeEvent(event)
+
+    def _set_data(self):
+        grains = full_resolution(self.grains_layer)
+        shear = full_resolution(self.intensity_layer)
+        if grains.shape != shear.shape:
+            grains, shear = np.broadcast_arrays(grains, shear)
+        self.grains = grains
+        self.shear = shear
+        self.ndim = grains.ndim
+        # per-timepoint grain tables, indexed by label. The reader provides
+        # them precomputed; otherwise they are computed on first use.
+        self.tables = {}
+        table = self.grains_layer.metadata.get('grain_table')
+        if table is not None and self.ndim <= 3:
+            n = grains.shape[0] if self.ndim == 3 else 1
+            for t, table_t in enumerate(split_by_timepoint(table, n)):
+                idx = (t,) * (self.ndim == 3)
+                self.tables[idx] = table_t.set_index('label')
+        self.dic = self.grains_layer.metadata.get('dicmap')
+        self.ebsd = self.grains_layer.metadata.get('ebsdmap')
+
+    def _data_changed(self, event):
+        """Forget cached results when the layers are updated, e.g. reloaded."""
+        for future in self._prefetching:
+            future.cancel()
+        self._set_data()
+        self._grain_radon.cache_clear()
+        self._update_plots(event)
+
+    def _table(self, idx):
+        if idx not in self.tables:
+            self.tables[idx] = grain_table_timepoint(
+                    self.grains[idx], t=idx[0] if idx else 0
+                    ).set_index('label')
+        return self.tables[idx]
+
+    def _grain(self, idx, lab):
+        """Crop grain ``lab`` at timepoint ``idx``, or return None."""
+        table = self._table(idx)
+        if lab not in table.index:
+            return None
+        bbox = table.loc[lab, ['bbox-0', 'bbox-1', 'bbox-2', 'bbox-3']]
+        return GrainCrop.from_arrays(
+                self.grains[idx], self.shear[idx], lab, bbox
+                )
+
+    def _compute_grain_radon(
+            self, idx, lab, threshold_multiplier, minimum_threshold, engine
+            ):
+        prop = self._grain(idx, lab)
+        if prop is None:
+            return None, None
+        radon_values = compute_radon(
+                prop,
+                threshold_multiplier=threshold_multiplier,
+                minimum_threshold=minimum_threshold,
+                engine=engine,
+                )
+        return prop, radon_values
+
+    def _slip_systems(self, idx, grain_id):
+        if self.dic is None:
+            return None
+        return slip_system_table(self.dic[idx]).grain(grain_id)
+
+    def _radon(self, idx, lab):
+        return self._grain_radon(
+                idx, lab, self.threshold_multiplier, self.minimum_threshold,
+                self.radon_engine,
+                )
+
+    def _prefetch(self, idx, lab):
+        """Compute the grain's profiles at neighbouring timepoints."""
+        for future in self._prefetching:
+            future.cancel()
+        self._prefetching = []
+        if self._prefetcher is None or not idx:
+            return
+        for dt in (1, -1):
+            t = idx[0] + dt
+            if 0 <= t < self.grains.shape[0]:
+                neighbour = (t,) + idx[1:]
+                self._prefetching.append(
+                        self._prefetcher.submit(self._radon, neighbour, lab)
+                        )
+
+    def _plot_data(self, d, lab):
+        """Compute the data to plot, in a worker thread.
+
+        This is a generator so that the worker can be aborted between the
+        radon and slip system computations.
+        """
+        prop, radon_values = self._radon(d, lab)
+        if prop is None:
+            return None
+        yield
+        slip_systems = self._slip_systems(d, lab - 1)
+        return prop, radon_values, slip_systems
+
     def _update_plots(self, event):
+        lab = self.grains_layer.selected_label
+        d = self.viewer.dims.current_step[:-2]
+        self._request += 1
+        if self._worker is not None:
+            self._worker.quit()
+        self._worker = create_worker(
+                self._plot_data, d, lab, _start_thread=False
+                )
+        self._worker.returned.connect(
+                functools.partial(self._draw, self._request, d, lab)
+                )
+        self._worker.start()
+
+    def _draw(self, request, d, lab, plot_data):
+        if request != self._request:
+            return  # a newer selection has been made since
+        self._worker = None
         with plt.style.context('dark_background'):
             self.ax0.clear()
             self.ax1.clear()
             self.ax1.set_theta_zero_location('S')
-        lab = self.grains_layer.selected_label
-        k = lab - 1
-        d = self.viewer.dims.current_step[:-2]
-        try:
-            prop = self.props_dict[d + (lab,)]
-        except KeyError:
+        if plot_data is None:
             return
-        radon_values = compute_radon(prop)
+        prop, radon_values, slip_systems = plot_data
+        k = lab - 1
         with plt.style.context('dark_background'):
             plot_shear(prop, ax=self.ax0)
-            plot_slip_detection_plot(self.dic[d], k, radon_values, ax=self.ax1)
+            plot_slip_detection_plot(
+                    None if self.dic is None else self.dic[d],
+                    k, radon_values, ax=self.ax1,
+                    slip_system_df=slip_systems,
+                    )
             self.ax1.figure.canvas.draw_idle()
+        self._prefetch(d, lab)
@@ -0,0 +1,306 @@
+"""Convert DefDAP projects to OME-Zarr stores, and read them back.
+
+Processing a project takes minutes to hours, and needs DefDAP and the raw
+DIC and EBSD files. `convert` runs the `read_defdap` pipeline without a
+viewer and writes its output to a chunked, compressed, multiscale
+OME-Zarr (NGFF 0.4) store, which napari can then open directly::
+
+    napari-defdap-convert project.defdap.yml  # -> project.defdap.zarr
+
+The store is laid out as follows::
+
+    project.defdap.zarr/
+        0/, 1/, ...         max_shear, one array per pyramid level
+        labels/grains/      the grains, with the same levels
+        labels/phase/       the phases, with the phase names as properties
+        grain_table/        one array per column of the grain table
+
+The DefDAP map objects are not stored, so layers read from a store have no
+'dicmap' or 'ebsdmap' metadata.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from ._get_reader import (  # noqa: F401
+        ZARR_SUFFIX as SUFFIX, napari_get_zarr_reader as napari_get_reader,
+        )
+from ._pyramid import level_shape, n_levels, pyramid
+
+try:
+    import zarr
+    from numcodecs import Blosc
+    zarr_available = True
+except ImportError:
+    zarr_available = False
+
+_NGFF_VERSION = '0.4'
+
+
+def _check_zarr():
+    if not zarr_available:
+        raise ImportError(
+                'Reading and writing .defdap.zarr stores requires zarr to be '
+                'installed: pip install "napari-defdap[zarr]".'
+                )
+
+
+def _axes(ndim):
+    axes = [{'name': 't', 'type': 'time'},
+            {'name': 'y', 'type': 'space'},
+            {'name': 'x', 'type': 'space'}]
+    return axes[-ndim:]
+
+
+def _write_multiscale(
+        group, data, name, scale, levels, chunk_size, labels=False,
+        ):
+    """Write ``data`` and its pyramid to ``group``, one timepoint at a time.
+
+    Writing timepoints separately means that lazy (dask) stacks from
+    `read_defdap` are never loaded into memory all at once.
+    """
+    ndim = data.ndim
+    dtype = np.dtype(data.dtype)
+    if not labels and dtype.kind != 'f':
+        dtype = np.dtype(np.float64)
+    arrays = []
+    datasets = []
+    for level in range(levels):
+        shape = level_shape(data.shape, level)
+        chunks = (1,) * (ndim - 2) + tuple(min(chunk_size, s)
+                                           for s in shape[-2:])
+        arrays.append(group.create_array(
+                str(level), shape=shape, chunks=chunks, dtype=dtype,
+                compressors=Blosc(cname='zstd', clevel=5,
+                                  shuffle=Blosc.SHUFFLE),
+                fill_value=0,
+                ))
+        level_scale = list(scale[:-2]) + [s * 2**level for s in scale[-2:]]
+        datasets.append({
+                'path': str(level),
+                'coordinateTransformations': [
+                        {'type': 'scale', 'scale': level_scale}
+                        ],
+                })
+    frames = ([((), data)] if ndim == 2
+              else [((t,), data[t]) for t in range(data.shape[0])])
+    for index, frame in frames:
+        frame = np.asarray(frame)
+        for array, level in zip(arrays, pyramid(frame, levels, labels)):
+            array[index] = level
+    group.attrs['multiscales'] = [{
+            'version': _NGFF_VERSION,
+            'name': name,
+            'axes': _axes(ndim),
+            'datasets': datasets,
+            'type': 'nearest' if labels else 'mean',
+            }]
+
+
+def _write_table(group, table):
+    for column in table.columns:
+        group.create_array(column, data=table[column].to_numpy())
+    group.attrs['columns'] = list(table.columns)
+
+
+def _read_table(group):
+    columns = group.attrs['columns']
+    return pd.DataFrame({column: group[column][:] for column in columns})
+
+
+def write_zarr(
+        layer_data, path, *, chunk_size=512, levels=None, overwrite=False,
+        ):
+    """Write the output of `read_defdap` to an OME-Zarr store.
+
+    Parameters
+    ----------
+    layer_data : list of tuples
+        The LayerData tuples returned by `read_defdap`.
+    path : str
+        The path of the store. By convention, it ends in '.defdap.zarr'.
+    chunk_size : int
+        The chunk size along each spatial axis. Chunks always contain a
+        single timepoint.
+    levels : int, optional
+        The number of pyramid levels, including the full resolution. By
+        default, levels are added until the image fits in one chunk.
+    overwrite : bool
+        Whether to overwrite an existing store at ``path``.
+    """
+    _check_zarr()
+    layers = {kwargs['name']: (data, kwargs) for data, kwargs, _ in layer_data}
+    max_shear, shear_kwargs = layers['max_shear']
+    grains, _ = layers['grains']
+    phase, phase_kwargs = layers['phase']
+    if levels is None:
+        levels = n_levels(max_shear.shape, min_size=chunk_size)
+    scale = [float(s) for s in shear_kwargs['scale']]
+    root = zarr.open_group(
+            path, mode='w' if overwrite else 'w-', zarr_format=2
+            )
+    _write_multiscale(root, max_shear, 'max_shear', scale, levels, chunk_size)
+    root.attrs['napari-defdap'] = {
+            'contrast_limits': [float(c)
+                                for c in shear_kwargs['contrast_limits']],
+            'colormap': shear_kwargs['colormap'],
+            }
+    features = phase_kwargs['features']
+    phase_properties = [{'label-value': int(i), 'name': str(n)}
+                        for i, n in zip(features['index'], features['names'])]
+    labels_group = root.create_group('labels')
+    labels_group.attrs['labels'] = ['grains', 'phase']
+    for name, data, properties in [('grains', grains, None),
+                                   ('phase', phase, phase_properties)]:
+        group = labels_group.create_group(name)
+        _write_multiscale(
+                group, data, name, scale, levels, chunk_size, labels=True,
+                )
+        image_label = {'version': _NGFF_VERSION, 'source': {'image': '../../'}}
+        if properties is not None:
+            image_label['properties'] = properties
+        group.attrs['image-label'] = image_label
+    table = shear_kwargs['metadata'].get('grain_table')
+    if table is not None:
+        _write_table(root.create_group('grain_table'), table)
+
+
+def _read_multiscale(group):
+    multiscales = group.attrs['multiscales'][0]
+    datasets = multiscales['datasets']
+    data = [group[d['path']] for d in datasets]
+    scale = datasets[0]['coordinateTransformations'][0]['scale']
+    return (data if len(data) > 1 else data[0]), tuple(scale)
+
+
+def read_zarr(path):
+    """Read a store written by `write_zarr` as a list of LayerData tuples.
+
+    The layers are the same as those of `read_defdap`, but multiscale, and
+    backed by the (lazily loaded) zarr arrays.
+
+    Parameters
+    ----------
+    path : str or list of str
+        Path to the store, or a list whose first element is the path.
+
+    Returns
+    -------
+    layer_data : list of tuples
+        The (data, kwargs, layer_type) tuples for the max shear, grains and
+        phase layers.
+    """
+    _check_zarr()
+    path = path[0] if type(path) is list else path
+    root = zarr.open_group(path, mode='r')
+    metadata = {}
+    if 'grain_table' in root:
+        metadata['grain_table'] = _read_table(root['grain_table'])
+    max_shear, scale = _read_multiscale(root)
+    settings = root.attrs.get('napari-defdap', {})
+    joint_kwargs = {'scale': scale, 'metadata': metadata}
+    max_shear_kwargs = {
+            **joint_kwargs,
+            'contrast_limits': settings.get('contrast_limits'),
+            'colormap': settings.get('colormap', 'viridis'),
+            'name': 'max_shear',
+            }
+    grains, _ = _read_multiscale(root['labels/grains'])
+    label_kwargs = {
+            **joint_kwargs,
+            'name': 'grains',
+            'blending': 'translucent_no_depth',
+            }
+    phase_group = root['labels/phase']
+    phase, _ = _read_multiscale(phase_group)
+    properties = phase_group.attrs['image-label'].get('properties', [])
+    phase_kwargs = {
+            **joint_kwargs,
+            'name': 'phase',
+            'blending': 'translucent_no_depth',
+            'features': {
+                    'index': np.array([p['label-value'] for p in properties]),
+                    'names': [p['name'] for p in properties],
+                    },
+            }
+    return [(max_shear, max_shear_kwargs, 'image'),
+            (grains, label_kwargs, 'labels'),
+            (phase, phase_kwargs, 'labels'),]
+
+
+def convert(
+        project, output=None, *, chunk_size=512, levels=None,
+        overwrite=False,
+        ):
+    """Process a .defdap.yml project and write it to an OME-Zarr store.
+
+    Parameters
+    ----------
+    project : str
+        Path to the .defdap.yml project file.
+    output : str, optional
+        Path of the store. Defaults to the project path with '.defdap.yml'
+        replaced by '.defdap.zarr'.
+    chunk_size, levels, overwrite
+        Passed on to `write_zarr`.
+
+    Returns
+    -------
+    output : str
+        The path of the store.
+    """
+    # imported here so that reading stores doesn't require DefDAP
+    from ._reader import read_defdap
+
+    _check_zarr()
+    if output is None:
+        output = project.removesuffix('.yml').removesuffix('.defdap')
+        output += SUFFIX
+    layer_data = read_defdap(project, multiscale_output=False)
+    write_zarr(
+            layer_data, output, chunk_size=chunk_size, levels=levels,
+            overwrite=overwrite,
+            )
+    return output
+
+
+def main(argv=None):
+    """Command line entry point for `convert`."""
+    parser = argparse.ArgumentParser(
+            description='Process DefDAP projects and save the results as '
+                        'multiscale OME-Zarr stores.'
+            )
+    parser.add_argument(
+            'projects', nargs='+', help='The .defdap.yml project files.'
+            )
+    parser.add_argument(
+            '-o', '--output',
+            help='The output store. Only valid with a single project. '
+                 'Defaults to the project name with a .defdap.zarr suffix.',
+            )
+    parser.add_argument('--chunk-size', type=int, default=512)
+    parser.add_argument('--levels', type=int, default=None)
+    parser.add_argument(
+            '--workers', default=None,
+            help='The number of processes used to read each project '
+                 '(overrides the project and NAPARI_DEFDAP_WORKERS).',
+            )
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args(argv)
+    if args.output is not None and len(args.projects) > 1:
+        parser.error('--output can only be used with a single project')
+    if args.workers is not None:
+        os.environ['NAPARI_DEFDAP_WORKERS'] = args.workers
+    for project in args.projects:
+        output = convert(
+                project, args.output, chunk_size=args.chunk_size,
+                levels=args.levels, overwrite=args.overwrite,
+                )
+        print(f'{project} -> {output}')
+
+
+if __name__ == '__main__':
+    main()